@@ -0,0 +1,310 @@
+import hashlib
+import json
+import os
+import re
+import sys
+import urllib.request
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urljoin
+
+import folium
+import numpy as np
+import pandas as pd
+
+from data_loader import CACHE_DIR, DATA_DIR
+from dataset import StoreDataset, load_partitions
+from density_grid import DensityGrid
+from filter_index import ALL, FilterIndex
+from map_builder import auto_render_mode, create_folium_map, heat_levels
+
+# 离线地图的默认输出目录
+OUTPUT_DIR = DATA_DIR / "maps"
+MANIFEST_NAME = "manifest.json"
+
+# 内嵌到HTML中的Leaflet等前端资源的下载缓存
+ASSET_DIR = CACHE_DIR / "map_assets"
+ASSET_TIMEOUT = 10
+
+# 影响地图输出的源文件，内容变化时全部地图重新生成
+RENDERER_FILES = ["map_builder.py", "map_layers.py", "density_grid.py"]
+
+# 文件名中不允许出现的字符
+UNSAFE_CHARS = re.compile(r'[\\/:*?"<>|\s]+')
+
+SCRIPT_TAG = re.compile(r'<script src="(https?://[^"]+)"></script>')
+STYLE_TAG = re.compile(r'<link rel="stylesheet" href="(https?://[^"]+)"\s*/>')
+CSS_URL = re.compile(r'url\((["\']?)(?!data:|https?:|#)([^"\')]+)\1\)')
+
+
+def renderer_version():
+    """
+    地图生成代码和folium版本的指纹
+    """
+    digest = hashlib.sha1(folium.__version__.encode("utf-8"))
+    for name in RENDERER_FILES:
+        digest.update((DATA_DIR / name).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def row_hashes(df):
+    """
+    每家门店全部字段的64位哈希，用于判断某个组合的门店数据是否变化
+    """
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def fingerprint(hashes, rows, settings):
+    """
+    组合的指纹：门店哈希（与顺序无关）加上渲染设置
+    """
+    digest = hashlib.sha1(json.dumps(settings, sort_keys=True).encode("utf-8"))
+    digest.update(np.sort(hashes[rows]).tobytes())
+    return digest.hexdigest()
+
+
+def map_file_name(city, channel):
+    return f"{UNSAFE_CHARS.sub('_', str(city))}_{UNSAFE_CHARS.sub('_', str(channel))}.html"
+
+
+def fetch_assets(html, asset_dir=ASSET_DIR):
+    """
+    下载页面引用的脚本和样式表（已下载的直接读取磁盘缓存），返回 {URL: 内容}；
+    无法下载的资源不返回，页面中保留原来的CDN链接
+    """
+    assets = {}
+    failed = []
+    for url in SCRIPT_TAG.findall(html) + STYLE_TAG.findall(html):
+        suffix = Path(url.split("?")[0]).suffix or ".txt"
+        cache_file = Path(asset_dir) / (hashlib.sha1(url.encode("utf-8")).hexdigest()[:16] + suffix)
+        if not cache_file.exists():
+            # 一次下载失败后（通常是没有网络）不再尝试其余资源
+            if failed:
+                failed.append(url)
+                continue
+            try:
+                with urllib.request.urlopen(url, timeout=ASSET_TIMEOUT) as response:
+                    content = response.read()
+            except OSError:
+                failed.append(url)
+                continue
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            cache_file.write_bytes(content)
+        text = cache_file.read_text(encoding="utf-8", errors="replace")
+        if suffix == ".css":
+            # 样式表中相对路径的图片和字体改为绝对地址
+            text = CSS_URL.sub(lambda m: f"url({m.group(1)}{urljoin(url, m.group(2))}{m.group(1)})", text)
+        assets[url] = text
+    if failed:
+        warnings.warn(f"{len(failed)} 个前端资源无法下载，页面中保留CDN链接: {', '.join(failed)}")
+    return assets
+
+
+def inline_assets(html, assets):
+    """
+    将页面引用的脚本和样式表替换为内嵌内容
+    """
+    def script(match):
+        content = assets.get(match.group(1))
+        if content is None:
+            return match.group(0)
+        return "<script>" + content.replace("</script", "<\\/script") + "</script>"
+
+    def style(match):
+        content = assets.get(match.group(1))
+        if content is None:
+            return match.group(0)
+        return "<style>" + content.replace("</style", "<\\/style") + "</style>"
+
+    return STYLE_TAG.sub(style, SCRIPT_TAG.sub(script, html))
+
+
+# 工作进程中的门店数据和索引，由_init_worker初始化
+_worker = {}
+
+
+def _init_worker(source, settings, assets):
+    """
+    初始化工作进程：读取分区文件（或直接使用传入的数据表）并建立索引
+    """
+    df = source if isinstance(source, pd.DataFrame) else load_partitions(source)
+    index = FilterIndex(df)
+    _worker.update(
+        index=index,
+        grid=DensityGrid(df) if settings["heat"] else None,
+        settings=settings,
+        assets=assets,
+    )
+    warnings.filterwarnings("ignore", category=UserWarning, module="folium")
+
+
+def _render_task(task):
+    """
+    生成一个 (市, 渠道) 组合的地图并写入HTML文件，返回门店数和文件大小
+    """
+    city, channel, target = task
+    index, grid, settings = _worker["index"], _worker["grid"], _worker["settings"]
+    rows = index.select(city, channel)
+    heat = heat_levels(grid, (city, channel), rows) if grid is not None else None
+    folium_map = create_folium_map(index.take(rows), auto_render_mode(settings["mode"], len(rows)), heat=heat)
+    html = inline_assets(folium_map.get_root().render(), _worker["assets"])
+    target = Path(target)
+    tmp_file = target.with_suffix(".tmp")
+    tmp_file.write_text(html, encoding="utf-8")
+    os.replace(tmp_file, target)
+    return len(rows), target.stat().st_size
+
+
+class BatchRenderer:
+    """
+    离线地图批量生成：每个 市 × 一级渠道 组合生成一个独立的HTML文件，并记录清单（manifest.json）。
+    组合的指纹由其中门店的全部字段、渲染设置和地图代码版本决定，
+    指纹未变且文件仍存在的组合直接跳过，数据更新后只重新生成门店有变化的组合
+    """
+
+    def __init__(self, output_dir=OUTPUT_DIR, mode="vectorized", heat=True, inline=True, jobs=1):
+        self.output_dir = Path(output_dir)
+        self.manifest_file = self.output_dir / MANIFEST_NAME
+        self.settings = {"mode": mode, "heat": heat, "inline": inline, "renderer": renderer_version()}
+        self.jobs = jobs
+        self.manifest = {"maps": {}}
+        if self.manifest_file.exists():
+            try:
+                self.manifest = json.loads(self.manifest_file.read_text(encoding="utf-8"))
+            except ValueError:
+                pass
+
+    def plan(self, df, cities=None, channels=None):
+        """
+        列出需要生成的组合 [(键, 市, 渠道, 门店数, 指纹)]，省略cities/channels时为全部取值
+        """
+        index = FilterIndex(df)
+        hashes = row_hashes(df)
+        combos = []
+        for city in cities or index.values('市'):
+            for channel in channels or index.values('一级渠道'):
+                rows = index.select(city, channel)
+                if rows is None or not len(rows):
+                    continue
+                combos.append((f"{city}/{channel}", city, channel, len(rows), fingerprint(hashes, rows, self.settings)))
+        return combos
+
+    def _prepare_assets(self, df):
+        """
+        用少量门店生成一张样例地图，取得需要内嵌的前端资源
+        """
+        if not self.settings["inline"]:
+            return {}
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore", category=UserWarning, module="folium")
+            sample = df.head(50)
+            heat = DensityGrid(sample).levels((ALL,), None) if self.settings["heat"] else None
+            html = create_folium_map(sample, self.settings["mode"], heat=heat).get_root().render()
+        return fetch_assets(html)
+
+    def run(self, df, source=None, cities=None, channels=None, force=False, prune=True, log=print):
+        """
+        生成有变化的组合；source为分区文件列表时工作进程自行读取，否则把df传给工作进程。
+        prune且未指定cities/channels时，删除清单中已不存在的组合的文件。返回 (生成数, 跳过数, 删除数)
+        """
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        maps = self.manifest.setdefault("maps", {})
+        combos = self.plan(df, cities, channels)
+        pending = [
+            combo for combo in combos
+            if force
+            or maps.get(combo[0], {}).get("fingerprint") != combo[4]
+            or not (self.output_dir / maps[combo[0]]["file"]).exists()
+        ]
+        skipped = len(combos) - len(pending)
+        log(f"共 {len(combos)} 个组合，{len(pending)} 个需要生成，{skipped} 个未变化")
+
+        removed = 0
+        if prune and not cities and not channels:
+            current = {combo[0] for combo in combos}
+            for key in [key for key in maps if key not in current]:
+                (self.output_dir / maps.pop(key)["file"]).unlink(missing_ok=True)
+                removed += 1
+
+        rendered = 0
+        try:
+            if pending:
+                assets = self._prepare_assets(df)
+                tasks = {
+                    combo[0]: (combo[1], combo[2], str(self.output_dir / map_file_name(combo[1], combo[2])))
+                    for combo in pending
+                }
+                details = {combo[0]: combo for combo in pending}
+                if self.jobs > 1 and len(pending) > 1:
+                    init_source = source if source is not None else df
+                    with ProcessPoolExecutor(max_workers=min(self.jobs, len(pending)), initializer=_init_worker,
+                                             initargs=(init_source, self.settings, assets)) as pool:
+                        futures = {pool.submit(_render_task, task): key for key, task in tasks.items()}
+                        for future in as_completed(futures):
+                            key = futures[future]
+                            rendered += 1
+                            self._record(key, details[key], *future.result(), log, rendered, len(pending))
+                else:
+                    _init_worker(df, self.settings, assets)
+                    for key, task in tasks.items():
+                        rendered += 1
+                        self._record(key, details[key], *_render_task(task), log, rendered, len(pending))
+        finally:
+            self._write_manifest()
+        return rendered, skipped, removed
+
+    def _record(self, key, combo, rows, size, log, done, total):
+        _, city, channel, _, digest = combo
+        file_name = map_file_name(city, channel)
+        self.manifest["maps"][key] = {
+            "市": city,
+            "一级渠道": channel,
+            "file": file_name,
+            "rows": int(rows),
+            "bytes": int(size),
+            "fingerprint": digest,
+            "rendered": datetime.now().isoformat(timespec="seconds"),
+        }
+        log(f"[{done}/{total}] {city} {channel}: {rows:,} 家门店 → {file_name} ({size / 1024 / 1024:.1f} MB)")
+
+    def _write_manifest(self):
+        self.manifest["settings"] = self.settings
+        self.manifest["updated"] = datetime.now().isoformat(timespec="seconds")
+        self.manifest["maps"] = dict(sorted(self.manifest["maps"].items()))
+        tmp_file = self.manifest_file.with_suffix(".tmp")
+        tmp_file.write_text(json.dumps(self.manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp_file, self.manifest_file)
+
+
+def parse_args():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="按 市 × 一级渠道 批量生成离线HTML地图，只重新生成门店有变化的组合")
+    parser.add_argument("--output", type=Path, default=OUTPUT_DIR, help="输出目录（默认 maps/）")
+    parser.add_argument("--region", default=ALL, help="只读取该大区的分区")
+    parser.add_argument("--province", default=ALL, help="只读取该省份的分区")
+    parser.add_argument("--city", nargs="+", help="只生成这些市（默认全部）")
+    parser.add_argument("--channel", nargs="+", help="只生成这些渠道（默认全部）")
+    parser.add_argument("--mode", choices=["vectorized", "canvas", "markers"], default="vectorized", help="地图渲染模式")
+    parser.add_argument("--no-heat", action="store_true", help="不添加卖力值热力图")
+    parser.add_argument("--no-inline", action="store_true", help="不内嵌Leaflet等前端资源，保留CDN链接")
+    parser.add_argument("--force", action="store_true", help="忽略清单，全部重新生成")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="并行进程数")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    dataset = StoreDataset()
+    dataset.refresh()
+    paths = dataset.files(dataset.select(args.region, args.province))
+    df = load_partitions(paths)
+    if df is None:
+        sys.exit("没有可用的门店数据")
+    renderer = BatchRenderer(args.output, args.mode, not args.no_heat, not args.no_inline, args.jobs)
+    # 只读取部分分区时清单中其他大区/省的地图保留不动
+    prune = args.region == ALL and args.province == ALL
+    rendered, skipped, removed = renderer.run(df, paths, args.city, args.channel, args.force, prune)
+    print(f"生成 {rendered} 个，跳过 {skipped} 个，删除 {removed} 个；清单: {renderer.manifest_file}")
@@ -0,0 +1,291 @@
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from data_cube import StoreCube, rollup
+from data_loader import CACHE_DIR, DATA_DIR
+from dataset import StoreDataset, load_partitions, write_partitions
+from density_grid import DensityGrid
+from exporter import write_csv, write_xlsx
+from filter_index import ALL, FilterIndex
+from map_builder import create_folium_map, heat_levels
+from store_schema import memory_mb
+from synthetic import generate_stores
+
+# 默认测量的数据规模（门店数）
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+# 只对不超过该行数的数据集测量Excel解析（openpyxl逐行读写，百万行需要数分钟），
+# 更大的数据集直接写入分区文件，只测量分区加载
+EXCEL_ROWS = 10_000
+
+# 逐点标记模式只测量到该行数（每家门店一个folium对象）
+MARKER_ROWS = 10_000
+
+# 基准结果保存目录
+RESULT_DIR = CACHE_DIR / "benchmarks"
+
+# 与基线比较时，耗时超过基线的该倍数视为性能回退
+REGRESSION_RATIO = 1.2
+
+# 耗时低于该值（秒）的测量不参与回退判断，避免计时抖动造成误报
+MIN_SECONDS = 0.01
+
+
+def timed(func, repeat=1):
+    """
+    执行func并返回 (结果, 最短耗时秒数)；repeat大于1时重复执行取最短耗时
+    """
+    best = None
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def _filters(df):
+    """
+    代表性的筛选条件：全部、门店最多的城市、主要渠道、城市级别、卖力值范围，以及组合条件
+    """
+    city = df['市'].value_counts().index[0]
+    channel = df['一级渠道'].value_counts().index[0]
+    level = int(df['城市级别'].value_counts().index[0])
+    low, high = np.percentile(df['卖力值'], [25, 75])
+    value_range = (round(float(low), 2), round(float(high), 2))
+    return {
+        "全部": {},
+        "城市": {"city": city},
+        "渠道": {"channel": channel},
+        "城市级别": {"level": level},
+        "卖力值范围": {"value_range": value_range},
+        "组合": {"city": city, "channel": channel, "value_range": value_range},
+    }
+
+
+def _charts(cube, cells):
+    """
+    与应用相同的三张统计图：渠道饼图、城市级别柱状图、卖力值直方图，返回序列化后的总字节数
+    """
+    import plotly.express as px
+
+    channel_counts = rollup(cells, '一级渠道')
+    level_counts = rollup(cells, '城市级别').sort_index()
+    bin_starts, bin_width, bin_counts = cube.score_histogram(cells, nbins=20)
+    figures = [
+        px.pie(values=channel_counts.values, names=channel_counts.index, title="渠道分布"),
+        px.bar(x=level_counts.index, y=level_counts.values, title="城市级别分布"),
+        px.bar(x=bin_starts + bin_width / 2, y=bin_counts, title="卖力值分布"),
+    ]
+    return sum(len(fig.to_json()) for fig in figures)
+
+
+def _file_size(path):
+    return Path(path).stat().st_size
+
+
+class BenchmarkRun:
+    """
+    一次基准测量：依次对每个数据规模生成合成门店并测量各阶段，结果记录为
+    {"size", "stage", "seconds", 以及可选的 "rows", "bytes"} 列表
+    """
+
+    def __init__(self, sizes=DEFAULT_SIZES, seed=0, repeat=3, excel_rows=EXCEL_ROWS, marker_rows=MARKER_ROWS):
+        self.sizes = sizes
+        self.seed = seed
+        self.repeat = repeat
+        self.excel_rows = excel_rows
+        self.marker_rows = marker_rows
+        self.results = []
+
+    def record(self, size, stage, seconds, **extra):
+        entry = {"size": size, "stage": stage, "seconds": round(seconds, 6), **extra}
+        self.results.append(entry)
+        detail = "".join(f"  {key}={value:,}" for key, value in extra.items())
+        print(f"{size:>10,}  {stage:<28}{seconds * 1000:>12.1f} ms{detail}", flush=True)
+        return entry
+
+    def run(self):
+        # 基准中不访问在线瓦片，忽略folium关于瓦片服务API key的提示
+        warnings.filterwarnings("ignore", category=UserWarning, module="folium")
+        for size in self.sizes:
+            with tempfile.TemporaryDirectory(prefix="store-bench-") as workdir:
+                self._run_size(size, Path(workdir))
+        return self.results
+
+    def _run_size(self, size, workdir):
+        df, seconds = timed(lambda: generate_stores(size, self.seed))
+        self.record(size, "generate", seconds, rows=len(df), bytes=int(memory_mb(df) * 1024 * 1024))
+
+        # 数据加载：与应用的load_data相同，读取分区文件并合并
+        parts = workdir / "partitions"
+        if size <= self.excel_rows:
+            source = workdir / "source"
+            source.mkdir()
+            workbook = source / "合成数据V20250101.xlsx"
+            with open(workbook, "wb") as fileobj:
+                write_xlsx(df, fileobj)
+            dataset = StoreDataset(source, parts, jobs=1)
+            _, seconds = timed(dataset.refresh)
+            self.record(size, "ingest_excel", seconds, bytes=_file_size(workbook))
+            paths = dataset.files()
+        else:
+            partitions = write_partitions(df, "合成数据V20250101.xlsx", "bench", parts)
+            paths = [parts / relative for _, _, _, relative in partitions]
+        loaded, seconds = timed(lambda: load_partitions(paths), self.repeat)
+        self.record(size, "load_data", seconds, rows=len(loaded), bytes=sum(_file_size(p) for p in paths))
+
+        # 筛选：建立索引，再对每组代表性条件求行号并取出子表
+        filter_index, seconds = timed(lambda: FilterIndex(loaded))
+        self.record(size, "filter_index", seconds)
+        for name, kwargs in _filters(loaded).items():
+            selected, seconds = timed(lambda: filter_index.take(filter_index.select(**kwargs)), self.repeat)
+            self.record(size, f"filter:{name}", seconds, rows=len(selected))
+
+        # 统计图表：由数据立方体汇总后作图
+        cube, seconds = timed(lambda: StoreCube(loaded, filter_index))
+        self.record(size, "cube", seconds)
+        cells, seconds = timed(lambda: cube.select(), self.repeat)
+        self.record(size, "cube_select", seconds, rows=len(cells))
+        chart_bytes, seconds = timed(lambda: _charts(cube, cells), self.repeat)
+        self.record(size, "charts", seconds, bytes=chart_bytes)
+
+        # 地图：全部门店视图，分别测量创建folium地图和序列化为HTML
+        density_grid, seconds = timed(lambda: DensityGrid(loaded))
+        self.record(size, "density_grid", seconds)
+        heat, seconds = timed(lambda: heat_levels(density_grid, (ALL,), None))
+        self.record(size, "heat_levels", seconds, rows=sum(len(level["w"]) for level in heat.values()))
+        modes = [("vectorized", loaded, heat), ("canvas", loaded, None)]
+        if size <= self.marker_rows:
+            modes.append(("markers", loaded, None))
+        for mode, data, mode_heat in modes:
+            folium_map, seconds = timed(lambda: create_folium_map(data, mode, heat=mode_heat))
+            self.record(size, f"map:{mode}", seconds)
+            html, seconds = timed(folium_map._repr_html_)
+            self.record(size, f"map_html:{mode}", seconds, bytes=len(html.encode("utf-8")))
+            del folium_map, html
+
+        # 导出：与下载按钮相同的分块CSV
+        csv_file = workdir / "export.csv"
+
+        def export():
+            with open(csv_file, "wb") as fileobj:
+                write_csv(loaded, fileobj)
+
+        _, seconds = timed(export)
+        self.record(size, "export_csv", seconds, bytes=_file_size(csv_file))
+        self.record(size, "peak_rss", 0.0, bytes=_peak_rss_bytes())
+
+
+def _peak_rss_bytes():
+    """
+    进程的内存占用峰值（Linux上ru_maxrss单位为KB，macOS上为字节）
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return int(peak if sys.platform == "darwin" else peak * 1024)
+
+
+def git_commit():
+    """
+    返回当前提交号及工作区是否有未提交的修改，不在git仓库中时返回 (None, None)
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=DATA_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=DATA_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(status)
+
+
+def environment():
+    import folium
+
+    return {
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "folium": folium.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def write_results(run, output=None):
+    """
+    将结果与提交号、运行环境一起写成JSON，默认保存为 .cache/benchmarks/<时间>_<提交号>.json
+    """
+    commit, dirty = git_commit()
+    timestamp = datetime.now()
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": timestamp.isoformat(timespec="seconds"),
+        "seed": run.seed,
+        "repeat": run.repeat,
+        "environment": environment(),
+        "results": run.results,
+    }
+    if output is None:
+        output = RESULT_DIR / f"{timestamp:%Y%m%d-%H%M%S}_{commit or 'nogit'}{'-dirty' if dirty else ''}.json"
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    return output
+
+
+def compare(results, baseline, ratio=REGRESSION_RATIO):
+    """
+    按 (规模, 阶段) 与基线结果比较耗时，返回比较表（含耗时比值和是否回退）
+    """
+    current = pd.DataFrame(results).set_index(["size", "stage"])["seconds"]
+    previous = pd.DataFrame(baseline["results"]).set_index(["size", "stage"])["seconds"]
+    table = pd.DataFrame({"基线": previous, "本次": current}).dropna()
+    table = table[(table["基线"] > 0) | (table["本次"] > 0)]
+    table["比值"] = (table["本次"] / table["基线"].where(table["基线"] > 0)).round(2)
+    table["回退"] = (table["比值"] > ratio) & (table["本次"] >= MIN_SECONDS)
+    return table
+
+
+def parse_args():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="用合成门店数据测量加载、筛选、地图、图表和导出的耗时")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="数据规模（门店数），可指定多个")
+    parser.add_argument("--seed", type=int, default=0, help="合成数据的随机种子")
+    parser.add_argument("--repeat", type=int, default=3, help="快速阶段重复测量的次数（取最短耗时）")
+    parser.add_argument("--excel-rows", type=int, default=EXCEL_ROWS, help="测量Excel解析的最大行数")
+    parser.add_argument("--marker-rows", type=int, default=MARKER_ROWS, help="测量逐点标记模式的最大行数")
+    parser.add_argument("--output", type=Path, help="结果文件路径（默认保存到 .cache/benchmarks/）")
+    parser.add_argument("--compare", type=Path, help="基线结果文件，给出时输出耗时比值，有回退时返回非零退出码")
+    parser.add_argument("--ratio", type=float, default=REGRESSION_RATIO, help="判定为回退的耗时比值")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run = BenchmarkRun(args.sizes, args.seed, args.repeat, args.excel_rows, args.marker_rows)
+    print(f"{'门店数':>8}  {'阶段':<26}{'耗时':>14}")
+    run.run()
+    print(f"\n结果已保存: {write_results(run, args.output)}")
+    if args.compare:
+        table = compare(run.results, json.loads(args.compare.read_text(encoding="utf-8")), args.ratio)
+        print(table.to_string())
+        if table["回退"].any():
+            print(f"\n{int(table['回退'].sum())} 项耗时超过基线的 {args.ratio} 倍")
+            sys.exit(1)
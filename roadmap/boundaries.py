@@ -0,0 +1,256 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from data_loader import CACHE_DIR, DATA_DIR, dataset_version
+from map_layers import has_pg_seq
+
+# 行政区划边界（GeoJSON，如DataV格式的 <行政区划代码>_full.json）所在目录，
+# 可通过环境变量 BOUNDARY_DATA_DIR 指定
+BOUNDARY_DIR = Path(os.environ.get("BOUNDARY_DATA_DIR", DATA_DIR / "data" / "boundaries"))
+
+# 简化后边界的磁盘缓存目录
+BOUNDARY_CACHE_DIR = CACHE_DIR / "boundaries"
+
+# 门店字段与边界要素 properties.level 的对应关系
+LEVELS = {'区县': 'district', '市': 'city'}
+
+# 区域分布图可选的指标
+AREA_METRICS = ['门店数', '平均卖力值', 'SEQ渗透率']
+
+# 简化容差为该缩放级别下的像素宽度（度）乘以此系数
+SIMPLIFY_PIXELS = 1.0
+
+# 点在多边形内判断时每批计算的 (边, 点) 配对数上限
+BATCH_ELEMENTS = 2_000_000
+
+
+def find_boundary_files(boundary_dir=BOUNDARY_DIR):
+    """
+    返回目录下的全部GeoJSON边界文件
+    """
+    boundary_dir = Path(boundary_dir)
+    return sorted(list(boundary_dir.glob("*.json")) + list(boundary_dir.glob("*.geojson")))
+
+
+def _polygons(geometry):
+    """
+    将Polygon/MultiPolygon统一为多边形列表，每个多边形为环（外环及内环）的列表
+    """
+    if geometry is None:
+        return []
+    if geometry['type'] == 'Polygon':
+        return [geometry['coordinates']]
+    if geometry['type'] == 'MultiPolygon':
+        return geometry['coordinates']
+    return []
+
+
+def simplify_ring(ring, tolerance):
+    """
+    Douglas-Peucker简化闭合环（坐标为 [经度, 纬度]），至少保留4个点
+    """
+    points = np.asarray(ring, dtype=float)
+    if len(points) <= 4 or tolerance <= 0:
+        return points
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    # 闭合环首尾重合，先以离起点最远的点把环分成两段
+    far = int(np.argmax(np.hypot(*(points - points[0]).T)))
+    keep[far] = True
+    stack = [(0, far), (far, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = points[end] - points[start]
+        offsets = points[start + 1:end] - points[start]
+        length = np.hypot(*segment)
+        if length == 0:
+            distance = np.hypot(*offsets.T)
+        else:
+            distance = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / length
+        i = int(np.argmax(distance))
+        if distance[i] > tolerance:
+            split = start + 1 + i
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    if keep.sum() < 4:
+        keep[np.linspace(0, len(points) - 1, 4).astype(int)] = True
+    return points[keep]
+
+
+def zoom_tolerance(zoom):
+    """
+    缩放级别下一个像素对应的经度宽度
+    """
+    return 360.0 / (256 * 2 ** zoom) * SIMPLIFY_PIXELS
+
+
+class Boundaries:
+    """
+    行政区划边界：按 properties.level 取出某一级的区域，
+    支持按缩放级别简化（结果缓存在磁盘上）和批量判断门店落在哪个区域内
+    """
+
+    def __init__(self, features, level, key=None):
+        self.level = level
+        self.key = key
+        self.names = []
+        self.properties = []
+        self.polygons = []
+        for feature in features:
+            props = feature.get('properties') or {}
+            polygons = _polygons(feature.get('geometry'))
+            if props.get('level') != LEVELS[level] or not polygons:
+                continue
+            self.names.append(str(props.get('name', '')))
+            self.properties.append({k: v for k, v in props.items() if isinstance(v, (str, int, float))})
+            self.polygons.append([[np.asarray(ring, dtype=float)[:, :2] for ring in polygon] for polygon in polygons])
+
+        self.bounds = np.array([
+            [min(r[:, 0].min() for p in polys for r in p), min(r[:, 1].min() for p in polys for r in p),
+             max(r[:, 0].max() for p in polys for r in p), max(r[:, 1].max() for p in polys for r in p)]
+            for polys in self.polygons
+        ]).reshape(-1, 4)
+
+    @classmethod
+    def from_files(cls, files, level):
+        features = []
+        for path in files:
+            data = json.loads(Path(path).read_text(encoding="utf-8"))
+            features.extend(data.get('features', []))
+        key = "_".join(f"{Path(p).stem}-{dataset_version(p)}" for p in files)
+        return cls(features, level, key)
+
+    def __len__(self):
+        return len(self.names)
+
+    def simplified(self, zoom, cache_dir=BOUNDARY_CACHE_DIR):
+        """
+        返回按缩放级别简化后的GeoJSON（要素id为区域序号），首次计算后缓存在磁盘上
+        """
+        cache_file = None
+        if self.key is not None:
+            digest = hashlib.sha1(self.key.encode("utf-8")).hexdigest()[:16]
+            cache_file = Path(cache_dir) / f"{LEVELS[self.level]}_{digest}_z{zoom}.json"
+            if cache_file.exists():
+                return json.loads(cache_file.read_text(encoding="utf-8"))
+
+        tolerance = zoom_tolerance(zoom)
+        features = []
+        for i, (name, polygons) in enumerate(zip(self.names, self.polygons)):
+            coordinates = [
+                [np.round(simplify_ring(ring, tolerance), 5).tolist() for ring in polygon]
+                for polygon in polygons
+            ]
+            features.append({
+                "type": "Feature",
+                "id": str(i),
+                "properties": {"name": name},
+                "geometry": {"type": "MultiPolygon", "coordinates": coordinates},
+            })
+        collection = {"type": "FeatureCollection", "features": features}
+
+        if cache_file is not None:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = cache_file.with_suffix(".tmp")
+            tmp_file.write_text(json.dumps(collection, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+            os.replace(tmp_file, cache_file)
+        return collection
+
+    def locate(self, lat, lon):
+        """
+        返回每个点所在区域的序号（不在任何区域内为-1）。
+        点按经度排序，每个区域先用外接矩形二分取出候选点，再按射线法统计穿过边界的次数
+        """
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        located = np.full(len(lat), -1, dtype=np.int64)
+        valid = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+        order = valid[np.argsort(lon[valid], kind="stable")]
+        sorted_lon = lon[order]
+
+        for i, polygons in enumerate(self.polygons):
+            west, south, east, north = self.bounds[i]
+            lo = np.searchsorted(sorted_lon, west, side="left")
+            hi = np.searchsorted(sorted_lon, east, side="right")
+            rows = order[lo:hi]
+            rows = rows[(lat[rows] >= south) & (lat[rows] <= north) & (located[rows] < 0)]
+            if not len(rows):
+                continue
+            # 奇偶规则：穿过所有环（外环和内环）的次数为奇数即在区域内
+            crossings = np.zeros(len(rows), dtype=np.int64)
+            for polygon in polygons:
+                for ring in polygon:
+                    crossings += _ray_crossings(lon[rows], lat[rows], ring)
+            located[rows[crossings % 2 == 1]] = i
+        return located
+
+
+def _ray_crossings(px, py, ring):
+    """
+    统计每个点向东的水平射线与环的交点个数。
+    点按纬度排序，每条边只与纬度落在 [边的最低点, 最高点) 内的点配对，
+    计算量与实际配对数成正比，而不是 点数 × 边数
+    """
+    order = np.argsort(py, kind="stable")
+    sorted_y = py[order]
+    x1, y1 = ring[:-1, 0], ring[:-1, 1]
+    x2, y2 = ring[1:, 0], ring[1:, 1]
+    # (y1 > y) != (y2 > y) 等价于 min(y1, y2) <= y < max(y1, y2)
+    start = np.searchsorted(sorted_y, np.minimum(y1, y2), side="left")
+    end = np.searchsorted(sorted_y, np.maximum(y1, y2), side="left")
+    lengths = end - start
+    counts = np.zeros(len(px), dtype=np.int64)
+    cumulative = np.cumsum(lengths)
+    if not len(cumulative) or cumulative[-1] == 0:
+        return counts
+    # 分批生成 (边, 点) 配对，控制内存
+    splits = np.searchsorted(cumulative, np.arange(BATCH_ELEMENTS, cumulative[-1], BATCH_ELEMENTS), side="right")
+    for edges in np.split(np.arange(len(lengths)), splits):
+        batch = lengths[edges]
+        edge = np.repeat(edges, batch)
+        point = order[np.repeat(start[edges] - np.cumsum(batch) + batch, batch) + np.arange(int(batch.sum()))]
+        x_cross = x1[edge] + (py[point] - y1[edge]) * (x2[edge] - x1[edge]) / (y2[edge] - y1[edge])
+        counts += np.bincount(point[px[point] < x_cross], minlength=len(px))
+    return counts
+
+
+def area_stats(df, boundaries, located, rows=None):
+    """
+    按区域汇总门店数、平均卖力值、宝洁SEQ渗透率，以及区域标签与坐标不符的门店数
+    """
+    if rows is not None:
+        df, located = df.iloc[rows], located[rows]
+    inside = located >= 0
+    area = located[inside]
+    size = len(boundaries)
+    count = np.bincount(area, minlength=size)
+    score = np.bincount(area, weights=df['卖力值'].to_numpy(dtype=float)[inside], minlength=size)
+    seq = np.bincount(area, weights=has_pg_seq(df).to_numpy()[inside].astype(float), minlength=size)
+    mismatch = np.bincount(area, weights=label_mismatches(df, boundaries, located)[inside].astype(float), minlength=size)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return pd.DataFrame({
+            'id': [str(i) for i in range(size)],
+            '区域': boundaries.names,
+            '门店数': count,
+            '平均卖力值': np.round(np.where(count > 0, score / np.maximum(count, 1), np.nan), 2),
+            'SEQ渗透率': np.round(np.where(count > 0, seq / np.maximum(count, 1) * 100, np.nan), 1),
+            '标签不符门店数': mismatch.astype(np.int64),
+        })
+
+
+def label_mismatches(df, boundaries, located):
+    """
+    返回门店的区县/市标签与坐标所在区域名称不一致的掩码（坐标不在任何区域内的门店不计）
+    """
+    names = np.array(boundaries.names + [''], dtype=object)
+    actual = names[located]
+    labels = df[boundaries.level].astype("string").fillna("").to_numpy(dtype=object)
+    return (located >= 0) & (actual != labels)
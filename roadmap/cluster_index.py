@@ -0,0 +1,142 @@
+import numpy as np
+
+from map_layers import has_pg_seq
+
+# 聚合索引的最高缩放级别，更高级别沿用该级别的排序
+MAX_ZOOM = 16
+# 每个瓦片在每个方向划分为 2**CELL_BITS 个聚合单元（256像素瓦片对应64像素单元）
+CELL_BITS = 2
+# 该缩放级别及以上不再聚合，直接返回单个门店
+SINGLE_ZOOM = 14
+
+
+def _spread_bits(v):
+    """
+    将整数的二进制位间隔展开（用于生成Morton编码）
+    """
+    v = np.asarray(v, dtype=np.uint64) & np.uint64(0x00000000FFFFFFFF)
+    v = (v | (v << np.uint64(16))) & np.uint64(0x0000FFFF0000FFFF)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x00FF00FF00FF00FF)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x3333333333333333)
+    v = (v | (v << np.uint64(1))) & np.uint64(0x5555555555555555)
+    return v
+
+
+def morton_code(ix, iy):
+    """
+    按位交错x、y网格坐标，同一瓦片内的点在编码上连续
+    """
+    return _spread_bits(ix) | (_spread_bits(iy) << np.uint64(1))
+
+
+def mercator_xy(lon, lat):
+    """
+    经纬度转换为归一化的Web墨卡托坐标（0~1）
+    """
+    lat = np.clip(np.asarray(lat, dtype=float), -85.05112878, 85.05112878)
+    x = (np.asarray(lon, dtype=float) + 180.0) / 360.0
+    y = (1.0 - np.log(np.tan(np.radians(lat)) + 1.0 / np.cos(np.radians(lat))) / np.pi) / 2.0
+    return x, y
+
+
+class ClusterIndex:
+    """
+    层级聚合索引：门店按最高级别网格的Morton编码排序，
+    任意瓦片对应编码上的一个连续区间，编码右移即得到低级别的聚合单元；
+    各聚合级别的单元表预先算好，查询瓦片时不再逐门店分组
+    """
+
+    def __init__(self, df):
+        level = MAX_ZOOM + CELL_BITS
+        size = 1 << level
+        mx, my = mercator_xy(df['经度'].to_numpy(), df['纬度'].to_numpy())
+        ix = np.clip(np.floor(mx * size), 0, size - 1).astype(np.uint64)
+        iy = np.clip(np.floor(my * size), 0, size - 1).astype(np.uint64)
+        codes = morton_code(ix, iy)
+
+        order = np.argsort(codes, kind="stable")
+        self.df = df.iloc[order].reset_index(drop=True)
+        self.codes = codes[order]
+        self.mx = mx[order]
+        self.my = my[order]
+        self.lat = self.df['纬度'].to_numpy(dtype=float)
+        self.lon = self.df['经度'].to_numpy(dtype=float)
+        self.score = self.df['卖力值'].to_numpy(dtype=float)
+        self.seq = has_pg_seq(self.df).to_numpy()
+        # 不筛选时各级别的聚合单元表在建索引时一次算好
+        self.all_levels = self.levels()
+
+    def tile_rows(self, z, x, y, mask=None):
+        """
+        返回瓦片 z/x/y 内（且满足mask）的门店行号
+        """
+        zoom = min(z, MAX_ZOOM)
+        shift = z - zoom
+        prefix = int(morton_code(x >> shift, y >> shift))
+        bits = 2 * (MAX_ZOOM + CELL_BITS - zoom)
+        lo, hi = np.searchsorted(self.codes, np.array([prefix << bits, (prefix + 1) << bits], dtype=np.uint64))
+        rows = np.arange(lo, hi)
+
+        if mask is not None:
+            rows = rows[mask[lo:hi]]
+        if shift > 0:
+            # 超过索引级别时按瓦片精确范围再过滤一次
+            n = 1 << z
+            inside = (np.floor(self.mx[rows] * n) == x) & (np.floor(self.my[rows] * n) == y)
+            rows = rows[inside]
+        return rows
+
+    def levels(self, mask=None):
+        """
+        计算各聚合级别（0 ~ SINGLE_ZOOM-1）的聚合单元表：单元编码（升序）、门店数、
+        经纬度合计、卖力值合计、SEQ门店数和单元内第一家门店的行号；
+        mask给出时只统计满足条件的门店。高一级的单元编码右移两位即得到低一级的单元，逐级合并
+        """
+        rows = np.arange(len(self.codes)) if mask is None else np.flatnonzero(mask)
+        keys = self.codes[rows] >> np.uint64(2 * (MAX_ZOOM - SINGLE_ZOOM + 1))
+        sums = {
+            "count": np.ones(len(rows), dtype=np.int64),
+            "lat": self.lat[rows],
+            "lon": self.lon[rows],
+            "score_sum": self.score[rows],
+            "seq_count": self.seq[rows].astype(np.int64),
+        }
+        tables = {}
+        for z in range(SINGLE_ZOOM - 1, -1, -1):
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.arange(0)
+            keys, rows = keys[starts], rows[starts]
+            sums = {name: np.add.reduceat(values, starts) if len(starts) else values for name, values in sums.items()}
+            tables[z] = {"keys": keys, "row": rows, **sums}
+            keys = keys >> np.uint64(2)
+        return tables
+
+    def clusters(self, z, x, y, mask=None, levels=None):
+        """
+        返回瓦片内的聚合结果 (clusters, single_rows)：
+        clusters 为各聚合点的质心、门店数、卖力值合计和SEQ门店数；
+        single_rows 为不需要聚合的单个门店行号。
+        levels 为 levels(mask) 预先计算的聚合单元表（未给出时不筛选用建索引时算好的表，
+        有mask时现算），瓦片只需在该级别的单元表上二分查找
+        """
+        empty = {"lat": [], "lon": [], "count": [], "score_sum": [], "seq_count": []}
+        if z >= SINGLE_ZOOM:
+            return empty, self.tile_rows(z, x, y, mask)
+        if levels is None:
+            levels = self.all_levels if mask is None else self.levels(mask)
+
+        # 第z级的单元编码比瓦片编码多CELL_BITS位，瓦片内的单元在编码上连续
+        table = levels[z]
+        prefix = int(morton_code(x, y))
+        bits = 2 * CELL_BITS
+        lo, hi = np.searchsorted(table["keys"], np.array([prefix << bits, (prefix + 1) << bits], dtype=np.uint64))
+        counts = table["count"][lo:hi]
+        multi = counts > 1
+        clusters = {
+            "lat": (table["lat"][lo:hi][multi] / counts[multi]).round(6).tolist(),
+            "lon": (table["lon"][lo:hi][multi] / counts[multi]).round(6).tolist(),
+            "count": counts[multi].tolist(),
+            "score_sum": table["score_sum"][lo:hi][multi].round(2).tolist(),
+            "seq_count": table["seq_count"][lo:hi][multi].tolist(),
+        }
+        return clusters, table["row"][lo:hi][~multi]
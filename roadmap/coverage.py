@@ -0,0 +1,231 @@
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from data_loader import DATA_DIR
+from spatial_index import haversine_km
+
+# Hub主数据所在目录，可通过环境变量 HUB_DATA_DIR 指定
+HUB_DIR = Path(os.environ.get("HUB_DATA_DIR", DATA_DIR / "data"))
+
+# 各类Hub的文件名模式（同一类型有多个文件时取文件名最大的一个）
+HUB_FILES = {
+    'HQ': '*HQ_Hub*.xlsx',
+    'SBO': '*SBO_Hub*.xlsx',
+    'DCP': '*DCP Master Data*.xlsx',
+}
+
+# Hub文件中的列名统一为以下名称
+HUB_COLUMNS = {
+    'Hub Name': 'Hub名称',
+    'DCP名称': 'Hub名称',
+    'Hub Address': 'Hub地址',
+    '详细地址': 'Hub地址',
+    'Latitude': '纬度',
+    'Longitude': '经度',
+}
+
+# Hub类型在地图上的颜色
+HUB_COLORS = {'HQ': 'green', 'SBO': 'darkgreen', 'DCP': 'blue'}
+
+# 默认覆盖半径（千米）
+DEFAULT_RADIUS_KM = 30.0
+
+# 分配最近Hub时的网格单元边长（度）
+ASSIGN_CELL_DEGREES = 0.25
+
+# 每批计算的 门店数 × 候选Hub数 上限
+BATCH_ELEMENTS = 4_000_000
+
+
+def find_hub_files(hub_dir=HUB_DIR):
+    """
+    返回目录下各类Hub的主数据文件 {Hub类型: 路径}，缺少的类型不返回
+    """
+    found = {}
+    for hub_type, pattern in HUB_FILES.items():
+        paths = sorted(p for p in Path(hub_dir).glob(pattern) if not p.name.startswith("~$"))
+        if paths:
+            found[hub_type] = paths[-1]
+    return found
+
+
+def load_hubs(hub_files):
+    """
+    读取并合并各类Hub，返回包含 Hub类型、Hub名称、Hub地址、纬度、经度 的表（坐标缺失的Hub被丢弃）
+    """
+    frames = []
+    for hub_type, path in hub_files.items():
+        hubs = pd.read_excel(path).rename(columns=HUB_COLUMNS)
+        if 'Hub地址' not in hubs.columns:
+            hubs['Hub地址'] = ''
+        hubs = hubs[['Hub名称', 'Hub地址', '纬度', '经度']].assign(Hub类型=hub_type)
+        frames.append(hubs)
+    if not frames:
+        return pd.DataFrame(columns=['Hub类型', 'Hub名称', 'Hub地址', '纬度', '经度'])
+    hubs = pd.concat(frames, ignore_index=True)
+    hubs['纬度'] = pd.to_numeric(hubs['纬度'], errors='coerce')
+    hubs['经度'] = pd.to_numeric(hubs['经度'], errors='coerce')
+    hubs['Hub名称'] = hubs['Hub名称'].astype(str)
+    hubs['Hub地址'] = hubs['Hub地址'].fillna('').astype(str)
+    hubs = hubs.dropna(subset=['纬度', '经度'])
+    return hubs[['Hub类型', 'Hub名称', 'Hub地址', '纬度', '经度']].reset_index(drop=True)
+
+
+def _cell_radius_km(cell_lat, cell_lon, cell_degrees):
+    """
+    网格单元中心到单元内任意一点的最大距离（取四个角点的最大值并留出余量）
+    """
+    half = cell_degrees / 2
+    corners = [
+        haversine_km(cell_lat, cell_lon, cell_lat + dy, cell_lon + dx)
+        for dy in (-half, half) for dx in (-half, half)
+    ]
+    return np.max(corners, axis=0) * 1.001 + 1e-6
+
+
+def _unit_vectors(lat, lon):
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def nearest_hubs(lat, lon, hub_lat, hub_lon, cell_degrees=ASSIGN_CELL_DEGREES):
+    """
+    为每家门店找出最近的Hub，返回 (Hub位置, 距离千米)；坐标缺失的门店Hub位置为-1、距离为inf。
+    门店按网格单元分组，先用单元中心到各Hub的距离和单元半径排除不可能最近的Hub，
+    再只对剩余的候选Hub批量计算球面距离，结果与逐对计算完全一致
+    """
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    hub_lat = np.asarray(hub_lat, dtype=float)
+    hub_lon = np.asarray(hub_lon, dtype=float)
+    hub = np.full(len(lat), -1, dtype=np.int64)
+    distance = np.full(len(lat), np.inf)
+    valid = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+    if not len(valid) or not len(hub_lat):
+        return hub, distance
+
+    iy = np.floor(lat[valid] / cell_degrees).astype(np.int64)
+    ix = np.floor(lon[valid] / cell_degrees).astype(np.int64)
+    columns = int(ix.max() - ix.min()) + 1
+    cells, cell_of = np.unique((iy - iy.min()) * columns + (ix - ix.min()), return_inverse=True)
+    cell_lat = (cells // columns + iy.min() + 0.5) * cell_degrees
+    cell_lon = (cells % columns + ix.min() + 0.5) * cell_degrees
+    cell_radius = _cell_radius_km(cell_lat, cell_lon, cell_degrees)
+
+    # 单元内任意门店到Hub的距离在 [中心距离-半径, 中心距离+半径] 之间，
+    # 下界超过所有Hub上界最小值的Hub不可能是最近的
+    candidates = []
+    step = max(1, BATCH_ELEMENTS // len(hub_lat))
+    for start in range(0, len(cells), step):
+        block = slice(start, start + step)
+        center = haversine_km(cell_lat[block, None], cell_lon[block, None], hub_lat[None, :], hub_lon[None, :])
+        radius = cell_radius[block, None]
+        bound = (center + radius).min(axis=1, keepdims=True)
+        candidates.append(center - radius <= bound)
+    candidates = np.concatenate(candidates)
+
+    # 各单元的候选Hub补齐为等宽矩阵，不足处填-1
+    cell_rows, hub_cols = np.nonzero(candidates)
+    counts = np.bincount(cell_rows, minlength=len(cells))
+    width = int(counts.max())
+    slots = np.arange(len(cell_rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+    table = np.full((len(cells), width), -1, dtype=np.int64)
+    table[cell_rows, slots] = hub_cols
+
+    # 球面距离随单位向量点积单调递减，候选比较只需点积，最后只对选中的Hub计算距离
+    hub_xyz = _unit_vectors(hub_lat, hub_lon)
+    hub_xyz = np.vstack([hub_xyz, np.zeros((1, 3))])
+    step = max(1, BATCH_ELEMENTS // width)
+    for start in range(0, len(valid), step):
+        rows = valid[start:start + step]
+        choice = table[cell_of[start:start + step]]
+        xyz = _unit_vectors(lat[rows], lon[rows])
+        candidate = hub_xyz[choice]
+        dot = np.einsum('ijk,ik->ij', candidate, xyz)
+        dot[choice < 0] = -np.inf
+        best = choice[np.arange(len(rows)), np.argmax(dot, axis=1)]
+        hub[rows] = best
+        distance[rows] = haversine_km(lat[rows], lon[rows], hub_lat[best], hub_lon[best])
+    return hub, distance
+
+
+class HubCoverage:
+    """
+    Hub覆盖分析：为每家门店分别找出每种类型中最近的Hub及距离，
+    按Hub汇总门店数、平均距离、最大距离，并按覆盖半径划分已覆盖/未覆盖门店
+    """
+
+    def __init__(self, df, hubs):
+        self.df = df
+        self.hubs = hubs.reset_index(drop=True)
+        self.types = [t for t in pd.unique(self.hubs['Hub类型'])]
+        lat = df['纬度'].to_numpy(dtype=float)
+        lon = df['经度'].to_numpy(dtype=float)
+        self.assigned = {}
+        for hub_type in self.types:
+            positions = np.flatnonzero((self.hubs['Hub类型'] == hub_type).to_numpy())
+            hub, distance = nearest_hubs(
+                lat, lon,
+                self.hubs['纬度'].to_numpy(dtype=float)[positions],
+                self.hubs['经度'].to_numpy(dtype=float)[positions])
+            # Hub位置转换为self.hubs中的行号
+            self.assigned[hub_type] = (np.where(hub >= 0, positions[np.maximum(hub, 0)], -1), distance)
+
+    def nearest(self, hub_type, rows=None):
+        """
+        返回门店 (行号rows，None为全部) 最近的该类型Hub的行号和距离
+        """
+        hub, distance = self.assigned[hub_type]
+        if rows is None:
+            return hub, distance
+        return hub[rows], distance[rows]
+
+    def covered(self, hub_type, radius_km=DEFAULT_RADIUS_KM, rows=None):
+        """
+        返回门店是否在最近Hub的覆盖半径内（布尔数组，与rows对应）
+        """
+        _, distance = self.nearest(hub_type, rows)
+        return distance <= radius_km
+
+    def hub_stats(self, hub_type, radius_km=DEFAULT_RADIUS_KM, rows=None):
+        """
+        按Hub汇总最近Hub为该Hub的门店：门店数、平均距离、最大距离、覆盖半径内门店数
+        """
+        hub, distance = self.nearest(hub_type, rows)
+        positions = np.flatnonzero((self.hubs['Hub类型'] == hub_type).to_numpy())
+        valid = hub >= 0
+        hub, distance = hub[valid], distance[valid]
+        size = len(self.hubs)
+        count = np.bincount(hub, minlength=size)[positions]
+        total = np.bincount(hub, weights=distance, minlength=size)[positions]
+        farthest = np.zeros(size)
+        np.maximum.at(farthest, hub, distance)
+        within = np.bincount(hub, weights=(distance <= radius_km), minlength=size)[positions]
+        stats = self.hubs.iloc[positions].copy()
+        stats['门店数'] = count
+        stats['平均距离'] = np.round(np.divide(total, count, out=np.zeros(len(positions)), where=count > 0), 2)
+        stats['最大距离'] = np.round(farthest[positions], 2)
+        stats['覆盖门店数'] = within.astype(np.int64)
+        return stats
+
+    def links(self, hub_type, radius_km=DEFAULT_RADIUS_KM, rows=None):
+        """
+        返回门店与最近Hub的连线数据：门店名称、门店与Hub的坐标、Hub名称、距离和是否已覆盖
+        """
+        hub, distance = self.nearest(hub_type, rows)
+        stores = self.df if rows is None else self.df.iloc[rows]
+        valid = hub >= 0
+        hubs = self.hubs.iloc[hub[valid]]
+        return pd.DataFrame({
+            '门店名称': stores['门店名称'].to_numpy()[valid],
+            '纬度': stores['纬度'].to_numpy(dtype=float)[valid],
+            '经度': stores['经度'].to_numpy(dtype=float)[valid],
+            'Hub名称': hubs['Hub名称'].to_numpy(),
+            'Hub纬度': hubs['纬度'].to_numpy(dtype=float),
+            'Hub经度': hubs['经度'].to_numpy(dtype=float),
+            '距离': distance[valid],
+            '已覆盖': distance[valid] <= radius_km,
+        })
@@ -1,63 +1,76 @@
 import pandas as pd
 import numpy as np
+from pathlib import Path
 
-def generate_detailed_report(file_path):
+from profiler import parse_args, profile_files
+
+def _approx(column):
+    return "" if column.distinct_exact else "（估算）"
+
+def _lower_bound(column):
+    # 取值太多时高频值只保留计数最高的一部分，计数为下界
+    return "" if column.heavy.exact else "（下界）"
+
+def generate_detailed_report(file_path, jobs=1):
     """
-    生成详细的数据分析报告
+    生成详细的数据分析报告（一次流式遍历生成全部统计）；
+    file_path可以是多个文件，jobs大于1时并行画像后合并为一份报告
     """
+    file_paths = file_path if isinstance(file_path, (list, tuple)) else [file_path]
     print("=" * 80)
-    print("黑龙江数据V20250609.xlsx 数据质量分析报告")
+    print(f"{'、'.join(Path(p).name for p in file_paths)} 数据质量分析报告")
     print("=" * 80)
     
     try:
-        df = pd.read_excel(file_path)
+        profile = profile_files(file_path, jobs)
+        columns = profile.columns
+        total = profile.rows
         
         print("\n📊 数据概览")
         print("-" * 40)
-        print(f"• 总记录数: {len(df):,} 条")
-        print(f"• 总字段数: {len(df.columns)} 个")
-        print(f"• 数据文件大小: {df.memory_usage(deep=True).sum() / 1024 / 1024:.2f} MB")
+        print(f"• 总记录数: {total:,} 条")
+        print(f"• 总字段数: {len(columns)} 个")
+        print(f"• 数据文件大小: {profile.typed_bytes / 1024 / 1024:.2f} MB")
         
         print("\n🏢 业务数据范围")
         print("-" * 40)
-        print(f"• 覆盖大区: {', '.join(df['大区'].unique())}")
-        print(f"• 覆盖省份: {', '.join(df['省'].unique())}")
-        print(f"• 涉及城市: {len(df['市'].unique())} 个")
-        print(f"• 覆盖区县: {len(df['区县'].unique())} 个")
-        print(f"• 独特门店: {df['门店编码'].nunique():,} 家")
+        print(f"• 覆盖大区: {', '.join(str(v) for v, _ in columns['大区'].top())}")
+        print(f"• 覆盖省份: {', '.join(str(v) for v, _ in columns['省'].top())}")
+        print(f"• 涉及城市{_approx(columns['市'])}: {columns['市'].distinct} 个")
+        print(f"• 覆盖区县{_approx(columns['区县'])}: {columns['区县'].distinct} 个")
+        print(f"• 独特门店: {profile.distinct_keys():,} 家")
         
         print("\n📍 地理分布")
         print("-" * 40)
-        city_distribution = df['市'].value_counts().head(10)
-        for city, count in city_distribution.items():
-            percentage = count / len(df) * 100
-            print(f"• {city}: {count:,} 家 ({percentage:.1f}%)")
+        city_distribution = columns['市'].top(10)
+        for city, count in city_distribution:
+            percentage = count / total * 100
+            print(f"• {city}: {count:,} 家{_lower_bound(columns['市'])} ({percentage:.1f}%)")
         
         print("\n🛍️ 渠道分析")
         print("-" * 40)
-        channel_distribution = df['一级渠道'].value_counts()
-        for channel, count in channel_distribution.items():
-            percentage = count / len(df) * 100
-            print(f"• {channel}: {count:,} 家 ({percentage:.1f}%)")
+        channel_distribution = columns['一级渠道'].top()
+        for channel, count in channel_distribution:
+            percentage = count / total * 100
+            print(f"• {channel}: {count:,} 家{_lower_bound(columns['一级渠道'])} ({percentage:.1f}%)")
         
         print("\n🏙️ 城市级别分布")
         print("-" * 40)
-        city_level_distribution = df['城市级别'].value_counts().sort_index()
-        for level, count in city_level_distribution.items():
-            percentage = count / len(df) * 100
-            print(f"• {level}级城市: {count:,} 家 ({percentage:.1f}%)")
+        city_level_distribution = sorted(columns['城市级别'].top())
+        for level, count in city_level_distribution:
+            percentage = count / total * 100
+            print(f"• {level}级城市: {count:,} 家{_lower_bound(columns['城市级别'])} ({percentage:.1f}%)")
         
         print("\n⚠️ 数据质量问题")
         print("-" * 40)
         
         # 检查空值情况
-        null_columns = df.isnull().sum()
-        problematic_columns = null_columns[null_columns > 0]
+        problematic_columns = {col: column.nulls for col, column in columns.items() if column.nulls > 0}
         
         if len(problematic_columns) > 0:
             print("存在空值的字段:")
             for col, null_count in problematic_columns.items():
-                percentage = null_count / len(df) * 100
+                percentage = null_count / total * 100
                 print(f"  • {col}: {null_count:,} 个空值 ({percentage:.1f}%)")
         else:
             print("✅ 核心字段无空值问题")
@@ -66,7 +79,7 @@ def generate_detailed_report(file_path):
         print("\n数据一致性检查:")
         
         # 检查门店编码是否唯一
-        duplicate_stores = df['门店编码'].duplicated().sum()
+        duplicate_stores = profile.duplicate_keys()
         if duplicate_stores > 0:
             print(f"  ⚠️ 发现 {duplicate_stores} 个重复的门店编码")
         else:
@@ -74,15 +87,16 @@ def generate_detailed_report(file_path):
         
         # 检查经纬度范围
         invalid_coords = 0
-        if df['经度'].min() < 73 or df['经度'].max() > 135:
+        lon, lat = columns['经度'], columns['纬度']
+        if lon.min < 73 or lon.max > 135:
             invalid_coords += 1
-        if df['纬度'].min() < 18 or df['纬度'].max() > 54:
+        if lat.min < 18 or lat.max > 54:
             invalid_coords += 1
             
         if invalid_coords > 0:
             print(f"  ⚠️ 发现可能异常的地理坐标")
-            print(f"    经度范围: {df['经度'].min():.2f} ~ {df['经度'].max():.2f}")
-            print(f"    纬度范围: {df['纬度'].min():.2f} ~ {df['纬度'].max():.2f}")
+            print(f"    经度范围: {lon.min:.2f} ~ {lon.max:.2f}")
+            print(f"    纬度范围: {lat.min:.2f} ~ {lat.max:.2f}")
         else:
             print("  ✅ 地理坐标范围正常")
         
@@ -91,13 +105,14 @@ def generate_detailed_report(file_path):
         numeric_cols = ['经度', '纬度', '城市级别', '渠道高潜排名', '卖力值']
         
         for col in numeric_cols:
-            if col in df.columns:
+            if col in columns:
+                column = columns[col]
                 print(f"\n{col}:")
-                print(f"  • 最小值: {df[col].min():.2f}")
-                print(f"  • 最大值: {df[col].max():.2f}")
-                print(f"  • 平均值: {df[col].mean():.2f}")
-                print(f"  • 中位数: {df[col].median():.2f}")
-                print(f"  • 标准差: {df[col].std():.2f}")
+                print(f"  • 最小值: {column.min:.2f}")
+                print(f"  • 最大值: {column.max:.2f}")
+                print(f"  • 平均值: {column.mean:.2f}")
+                print(f"  • 中位数{'' if column.sketch.exact else '（近似）'}: {column.median:.2f}")
+                print(f"  • 标准差: {column.std:.2f}")
         
         print("\n💡 建议和下一步行动")
         print("-" * 40)
@@ -107,21 +122,21 @@ def generate_detailed_report(file_path):
         # 基于空值情况给出建议
         if '所属连锁系统' in problematic_columns:
             missing_chain = problematic_columns['所属连锁系统']
-            percentage = missing_chain / len(df) * 100
+            percentage = missing_chain / total * 100
             suggestions.append(f"• 所属连锁系统字段缺失率高达 {percentage:.1f}%，建议补充连锁信息以便更好地进行渠道分析")
         
         if '宝洁SEQ' in problematic_columns:
             missing_seq = problematic_columns['宝洁SEQ']
-            percentage = missing_seq / len(df) * 100
+            percentage = missing_seq / total * 100
             suggestions.append(f"• 宝洁SEQ字段缺失率 {percentage:.1f}%，建议确认是否所有门店都应该有此标识")
         
         # 基于数据分布给出建议
-        if len(df['市'].unique()) > 10:
+        if columns['市'].distinct > 10:
             suggestions.append("• 数据覆盖城市较多，建议按城市或大区进行分层分析")
         
         # 基于渠道分布给出建议
-        dominant_channel = df['一级渠道'].value_counts().index[0]
-        dominant_pct = df['一级渠道'].value_counts().iloc[0] / len(df) * 100
+        dominant_channel, dominant_count = columns['一级渠道'].top(1)[0]
+        dominant_pct = dominant_count / total * 100
         if dominant_pct > 40:
             suggestions.append(f"• {dominant_channel} 渠道占比 {dominant_pct:.1f}%，建议重点关注此渠道的表现")
         
@@ -141,12 +156,12 @@ def generate_detailed_report(file_path):
         print("• 业务分类字段 (城市级别、一级渠道、连锁系统) ✅")
         print("• 状态和评估字段 (网点状态、渠道排名、卖力值、宝洁SEQ) ✅")
         
-        return df
+        return profile
         
     except Exception as e:
         print(f"❌ 分析过程中出错: {e}")
         return None
 
 if __name__ == "__main__":
-    file_path = "黑龙江数据V20250609.xlsx"
-    df = generate_detailed_report(file_path) 
\ No newline at end of file
+    args = parse_args("生成门店数据质量分析报告")
+    profile = generate_detailed_report(args.files, args.jobs) 
\ No newline at end of file
@@ -0,0 +1,162 @@
+import numpy as np
+import pandas as pd
+
+from filter_index import ALL, FilterIndex
+from map_layers import has_pg_seq
+
+# 卖力值分箱宽度（以0.01为单位，与侧边栏滑块步长0.1一致）
+BIN_CENTS = 10
+
+# 数据立方体的维度
+CUBE_DIMENSIONS = ['市', '区县', '一级渠道', '城市级别', 'score_bin', 'on_edge']
+
+
+class StoreCube:
+    """
+    门店数据立方体：按 (市, 区县, 一级渠道, 城市级别, 卖力值分箱) 预聚合门店数、
+    卖力值合计和宝洁SEQ门店数，指标卡片和统计图表只需对小表做汇总。
+    分箱边界与滑块刻度对齐，并单独标记恰好落在边界上的门店，
+    因此滑块范围查询结果与逐行筛选完全一致
+    """
+
+    def __init__(self, df, filter_index=None):
+        self.df = df
+        self.filter_index = filter_index if filter_index is not None else FilterIndex(df)
+        cents = np.round(df['卖力值'].to_numpy(dtype=float) * 100).astype(np.int64)
+        self.min_cents = int(cents.min())
+        self.score_min = float(df['卖力值'].min())
+        self.score_max = float(df['卖力值'].max())
+        # 卖力值超过两位小数时无法按分箱精确回答范围查询
+        self.exact = bool(np.allclose(cents / 100, df['卖力值'].to_numpy(dtype=float), rtol=0, atol=1e-9))
+        self.cells = self._aggregate(df, cents)
+        self.total = summarize(self.cells)
+
+    def _aggregate(self, df, cents=None):
+        if cents is None:
+            cents = np.round(df['卖力值'].to_numpy(dtype=float) * 100).astype(np.int64)
+        offset = cents - self.min_cents
+        keys = pd.DataFrame({
+            '市': df['市'].to_numpy(),
+            '区县': df['区县'].to_numpy(),
+            '一级渠道': df['一级渠道'].to_numpy(),
+            '城市级别': df['城市级别'].to_numpy(),
+            'score_bin': offset // BIN_CENTS,
+            'on_edge': offset % BIN_CENTS == 0,
+            'count': 1,
+            'score_sum': df['卖力值'].to_numpy(dtype=float),
+            'seq_count': has_pg_seq(df).to_numpy().astype(np.int64),
+        })
+        # 市/区县缺失的门店单独成组，立方体合计与逐行筛选的行数一致
+        return keys.groupby(CUBE_DIMENSIONS, sort=True, observed=True, dropna=False).sum().reset_index()
+
+    def updated(self, df, removed_rows, added_rows, filter_index=None):
+        """
+        基于上一版本的立方体增量构建新版本：减去删除/变更前门店的聚合，加上新增/变更后门店的聚合。
+        卖力值最小值变化时分箱边界随滑块刻度移动，需要完整重建
+        """
+        cents = np.round(df['卖力值'].to_numpy(dtype=float) * 100).astype(np.int64)
+        if not len(cents) or int(cents.min()) != self.min_cents:
+            return StoreCube(df, filter_index)
+
+        cube = StoreCube.__new__(StoreCube)
+        cube.df = df
+        cube.filter_index = filter_index if filter_index is not None else FilterIndex(df)
+        cube.min_cents = self.min_cents
+        cube.score_min = float(df['卖力值'].min())
+        cube.score_max = float(df['卖力值'].max())
+        added_scores = added_rows['卖力值'].to_numpy(dtype=float)
+        cube.exact = self.exact and bool(np.allclose(np.round(added_scores * 100) / 100, added_scores, rtol=0, atol=1e-9))
+
+        removed = self._aggregate(removed_rows)
+        measures = ['count', 'score_sum', 'seq_count']
+        removed[measures] = -removed[measures]
+        cells = pd.concat([self.cells, self._aggregate(added_rows), removed], ignore_index=True)
+        cells = cells.groupby(CUBE_DIMENSIONS, sort=True, observed=True, dropna=False).sum().reset_index()
+        cells = cells[cells['count'] > 0].reset_index(drop=True)
+        # 加减抵消后的浮点误差按卖力值精度取整
+        cells['score_sum'] = cells['score_sum'].round(2)
+        cube.cells = cells
+        cube.total = summarize(cells)
+        return cube
+
+    def bin_start(self, score_bin):
+        """
+        返回分箱的起始卖力值
+        """
+        return (self.min_cents + np.asarray(score_bin) * BIN_CENTS) / 100
+
+    def select(self, city=ALL, channel=ALL, level=ALL, value_range=None):
+        """
+        返回满足筛选条件的立方体单元；范围端点不在分箱边界上时，
+        通过筛选索引取出对应行重新聚合，结果同样精确。
+        端点超出全部门店的卖力值范围时该端不设限（与FilterIndex.select一致），
+        因此默认的全范围滑块不必落在分箱边界上
+        """
+        cells = self.cells
+        mask = np.ones(len(cells), dtype=bool)
+        for col, value in (('市', city), ('一级渠道', channel), ('城市级别', level)):
+            if value != ALL:
+                mask &= (cells[col] == value).to_numpy()
+
+        if value_range is not None:
+            low = None if value_range[0] <= self.score_min else round(value_range[0] * 100) - self.min_cents
+            high = None if value_range[1] >= self.score_max else round(value_range[1] * 100) - self.min_cents
+            bounds = [bound for bound in (low, high) if bound is not None]
+            if bounds and (not self.exact or any(bound % BIN_CENTS for bound in bounds)):
+                return self._aggregate(self.filter_index.apply(city, channel, level, value_range))
+
+            score_bin = cells['score_bin'].to_numpy()
+            if low is not None:
+                mask &= score_bin >= low // BIN_CENTS
+            if high is not None:
+                # 不超过 high = 完整分箱 ..high_bin-1 + 恰好等于 high 的门店
+                high_bin = high // BIN_CENTS
+                mask &= (score_bin < high_bin) | ((score_bin == high_bin) & cells['on_edge'].to_numpy())
+        return cells[mask]
+
+    def select_rows(self, rows):
+        """
+        返回指定行号（如周边查询结果）的立方体单元；rows为None表示全部门店
+        """
+        if rows is None:
+            return self.cells
+        return self._aggregate(self.filter_index.take(rows))
+
+    def score_histogram(self, cells, nbins=20):
+        """
+        将分箱计数合并为不超过nbins个等宽区间，返回 (区间起点, 区间宽度, 门店数)
+        """
+        if cells.empty:
+            return np.empty(0), 0.0, np.empty(0, dtype=np.int64)
+        counts = cells.groupby('score_bin')['count'].sum()
+        first, last = int(counts.index.min()), int(counts.index.max())
+        dense = np.zeros(last - first + 1, dtype=np.int64)
+        dense[counts.index.to_numpy() - first] = counts.to_numpy()
+
+        group = max(1, int(np.ceil(len(dense) / nbins)))
+        padded = np.pad(dense, (0, (-len(dense)) % group))
+        merged = padded.reshape(-1, group).sum(axis=1)
+        starts = self.bin_start(first + np.arange(len(merged)) * group)
+        return starts, group * BIN_CENTS / 100, merged
+
+
+def summarize(cells):
+    """
+    汇总立方体单元，返回指标卡片所需的数值
+    """
+    count = int(cells['count'].sum())
+    return {
+        "count": count,
+        "score_sum": float(cells['score_sum'].sum()),
+        "avg_score": float(cells['score_sum'].sum()) / count if count else 0.0,
+        "seq_count": int(cells['seq_count'].sum()),
+        "cities": int(cells['市'].nunique()),
+        "districts": int(cells['区县'].nunique()),
+    }
+
+
+def rollup(cells, column):
+    """
+    按单个维度汇总门店数（按门店数降序）
+    """
+    return cells.groupby(column, observed=True)['count'].sum().sort_values(ascending=False)
@@ -0,0 +1,88 @@
+import hashlib
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from store_schema import SCHEMA_VERSION, apply_schema
+
+# 数据文件与列式缓存目录（相对本文件定位，与启动目录无关）
+DATA_DIR = Path(__file__).resolve().parent
+DATA_FILE = DATA_DIR / "黑龙江数据V20250609.xlsx"
+CACHE_DIR = DATA_DIR / ".cache"
+
+
+def dataset_version(file_path=DATA_FILE):
+    """
+    根据源文件的路径、大小、修改时间和表结构版本生成数据版本号
+    """
+    path = Path(file_path).resolve()
+    stat = path.stat()
+    key = f"{path}|{stat.st_size}|{stat.st_mtime_ns}|{SCHEMA_VERSION}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def cache_path(file_path=DATA_FILE, version=None):
+    """
+    返回源文件对应版本的Parquet缓存路径
+    """
+    path = Path(file_path)
+    if version is None:
+        version = dataset_version(path)
+    return CACHE_DIR / f"{path.stem}_{version}.parquet"
+
+
+def _normalize_types(df):
+    """
+    将混合类型的object列统一为可空字符串，保证可以写入列式文件
+    """
+    for col in df.columns:
+        if df[col].dtype == 'object':
+            df[col] = df[col].map(lambda v: v if pd.isna(v) else str(v)).astype("string")
+    return df
+
+
+def _write_cache(df, file_path, target):
+    """
+    原子写入缓存文件，并清理同一源文件的旧版本缓存
+    """
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_file = target.with_suffix(".tmp")
+    df.to_parquet(tmp_file, index=False)
+    os.replace(tmp_file, target)
+
+    for old_file in CACHE_DIR.glob(f"{Path(file_path).stem}_*.parquet"):
+        if old_file != target:
+            old_file.unlink(missing_ok=True)
+
+
+def read_workbook(file_path=DATA_FILE):
+    """
+    解析Excel工作簿并转换为紧凑类型
+    """
+    return apply_schema(_normalize_types(pd.read_excel(file_path)))
+
+
+def load_store_data(file_path=DATA_FILE):
+    """
+    加载门店数据：首次解析Excel、按紧凑类型转换后写入Parquet缓存，之后直接读取缓存
+    （列类型随缓存一起保存）；源文件的路径、大小或修改时间变化时自动重建缓存
+    """
+    path = Path(file_path)
+    target = cache_path(path)
+
+    if target.exists():
+        try:
+            return pd.read_parquet(target)
+        except Exception:
+            # 缓存损坏时回退到重新解析Excel
+            target.unlink(missing_ok=True)
+
+    df = read_workbook(path)
+
+    try:
+        _write_cache(df, path, target)
+    except (ImportError, OSError) as e:
+        print(f"写入数据缓存失败，将直接使用Excel数据: {e}")
+
+    return df
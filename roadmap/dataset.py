@@ -0,0 +1,343 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from data_loader import CACHE_DIR, DATA_DIR, dataset_version, read_workbook
+from filter_index import ALL
+from release_diff import ReleaseDiff, diff_releases, parse_release
+from store_schema import SCHEMA_VERSION, apply_schema
+
+# 省级工作簿所在目录，可通过环境变量 STORE_DATA_DIR 指定
+SOURCE_DIR = Path(os.environ.get("STORE_DATA_DIR", DATA_DIR))
+
+# 分区存储目录：partitions/大区=<大区>/省=<省>/<工作簿>_<版本>.parquet，
+# 与上一版本的变更明细存放在 partitions/changes/<系列名>_<版本>.parquet
+PARTITION_DIR = CACHE_DIR / "partitions"
+MANIFEST_FILE = PARTITION_DIR / "manifest.json"
+
+# 分区字段
+PARTITION_COLUMNS = ['大区', '省']
+
+# 大区/省为空时使用的分区名
+UNKNOWN = '未知'
+
+# 清单中与上一版本比较的字段（上一版本的数据版本号和发布日期、变更明细路径、变更统计）
+CHANGE_FIELDS = ("previous_version", "previous_release", "changes", "summary")
+
+
+def find_workbooks(source_dir=SOURCE_DIR):
+    """
+    返回目录下的全部Excel工作簿（忽略Excel打开时生成的临时文件）
+    """
+    return sorted(p for p in Path(source_dir).glob("*.xlsx") if not p.name.startswith("~$"))
+
+
+def latest_releases(workbooks):
+    """
+    按系列名（文件名去掉V<日期>）分组，每个系列只保留发布日期最新的工作簿，返回 {系列名: 路径}
+    """
+    latest = {}
+    for path in workbooks:
+        series, release = parse_release(path)
+        current = latest.get(series)
+        if current is None or (release or date.min, path.name) > (current[0] or date.min, current[1].name):
+            latest[series] = (release, path)
+    return {series: path for series, (_, path) in sorted(latest.items())}
+
+
+def _partition_file(region, province, source, version):
+    return Path(f"大区={region}") / f"省={province}" / f"{source.stem}_{version}.parquet"
+
+
+def _write_parquet(df, target):
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = target.with_suffix(".tmp")
+    df.to_parquet(tmp_file, index=False)
+    os.replace(tmp_file, target)
+
+
+def ingest_workbook(source, version, partition_dir=PARTITION_DIR, previous=None):
+    """
+    解析一个工作簿并按 (大区, 省) 写入分区文件；previous为同一系列上一版本的分区文件，
+    给出时按门店编码比较两个版本并写入变更明细。
+    返回 {"partitions": [[大区, 省, 行数, 相对路径], ...], "changes": 变更明细路径, "summary": 变更统计}
+    """
+    source = Path(source)
+    df = read_workbook(source)
+    result = {"partitions": [], "changes": None, "summary": None}
+    if previous:
+        old = pd.concat([pd.read_parquet(partition_dir / path) for path in previous], ignore_index=True)
+        diff = diff_releases(apply_schema(old), df)
+        relative = Path("changes") / f"{parse_release(source)[0]}_{version}.parquet"
+        _write_parquet(diff.to_frame(), partition_dir / relative)
+        result["changes"] = relative.as_posix()
+        result["summary"] = diff.summary()
+
+    result["partitions"] = write_partitions(df, source, version, partition_dir)
+    return result
+
+
+def write_partitions(df, source, version, partition_dir=PARTITION_DIR):
+    """
+    将门店表按 (大区, 省) 写入分区文件，返回 [[大区, 省, 行数, 相对路径], ...]
+    """
+    keys = df[PARTITION_COLUMNS].astype("string").fillna(UNKNOWN)
+    partitions = []
+    for (region, province), rows in keys.groupby(PARTITION_COLUMNS, sort=True).indices.items():
+        relative = _partition_file(region, province, Path(source), version)
+        _write_parquet(df.iloc[rows], Path(partition_dir) / relative)
+        partitions.append([region, province, len(rows), relative.as_posix()])
+    return partitions
+
+
+def load_partitions(paths):
+    """
+    读取分区文件并合并为一张表，没有文件时返回None
+    """
+    frames = [pd.read_parquet(path) for path in paths]
+    if not frames:
+        return None
+    if len(frames) == 1:
+        return frames[0]
+    # 各分区的分类类型取值不同，合并后重新统一类型
+    return apply_schema(pd.concat(frames, ignore_index=True))
+
+
+def _ingest_task(args):
+    return ingest_workbook(*args)
+
+
+class StoreDataset:
+    """
+    多省门店数据集：目录下每个省级工作簿解析一次，按 (大区, 省) 分区存为Parquet，
+    只有新增或修改过的工作簿才会重新解析（多个工作簿在进程池中并行解析）；
+    加载时只读取选中的分区。同一系列（如 黑龙江数据V20250609 → 黑龙江数据V20250716）
+    出现发布日期更新的版本时与上一版本按门店编码比较，记录新增/删除/变更的门店；
+    同一版本重新解析时沿用已有的变更记录
+    """
+
+    def __init__(self, source_dir=SOURCE_DIR, partition_dir=PARTITION_DIR, jobs=None):
+        self.source_dir = Path(source_dir)
+        self.partition_dir = Path(partition_dir)
+        self.manifest_file = self.partition_dir / MANIFEST_FILE.name
+        self.jobs = jobs or os.cpu_count() or 1
+        self.sources = {}
+        self._lock = threading.Lock()
+        if self.manifest_file.exists():
+            try:
+                self.sources = json.loads(self.manifest_file.read_text(encoding="utf-8"))["sources"]
+            except (ValueError, KeyError):
+                self.sources = {}
+
+    def refresh(self):
+        """
+        同步目录中的工作簿：解析新增/修改的工作簿，删除已移除工作簿的分区，返回是否有变化
+        """
+        with self._lock:
+            workbooks = latest_releases(find_workbooks(self.source_dir))
+            versions = {name: dataset_version(path) for name, path in workbooks.items()}
+            pending = [
+                name for name in workbooks
+                if self.sources.get(name, {}).get("version") != versions[name]
+                # 旧清单未记录表结构版本（可能含有同一版本自身比较得到的变更记录），重新解析一次
+                or self.sources[name].get("schema") != SCHEMA_VERSION
+                or not all((self.partition_dir / part[3]).exists() for part in self.sources[name]["partitions"])
+            ]
+            removed = [name for name in self.sources if name not in workbooks]
+            if not pending and not removed:
+                return False
+
+            tasks = [
+                (workbooks[name], versions[name], self.partition_dir, self._previous_files(name, workbooks[name]))
+                for name in pending
+            ]
+            if len(tasks) > 1 and self.jobs > 1:
+                with ProcessPoolExecutor(max_workers=min(self.jobs, len(tasks))) as pool:
+                    results = list(pool.map(_ingest_task, tasks))
+            else:
+                results = [_ingest_task(task) for task in tasks]
+
+            stale = [path for name in pending + removed for path in self._files_of(name)]
+            for name, result in zip(pending, results):
+                old = self.sources.get(name, {})
+                release = parse_release(workbooks[name])[1]
+                release = release.isoformat() if release else None
+                if result["changes"]:
+                    changes = {
+                        "previous_version": old.get("version"),
+                        "previous_release": old.get("release"),
+                        "changes": result["changes"],
+                        "summary": result["summary"],
+                    }
+                elif old.get("previous_release") and old.get("release") == release:
+                    # 同一版本重新解析（重新保存、表结构升级）时保留与上一版本的变更记录
+                    changes = {key: old.get(key) for key in CHANGE_FIELDS}
+                else:
+                    changes = dict.fromkeys(CHANGE_FIELDS)
+                self.sources[name] = {
+                    "file": workbooks[name].name,
+                    "release": release,
+                    "schema": SCHEMA_VERSION,
+                    "version": versions[name],
+                    "partitions": result["partitions"],
+                    **changes,
+                }
+            for name in removed:
+                del self.sources[name]
+            self._write_manifest()
+            self._remove_files(stale)
+            return True
+
+    def _previous_files(self, name, workbook):
+        """
+        需要与之比较的上一版本分区文件：只有工作簿的发布日期晚于已有版本，
+        且已有分区按当前表结构写入时才比较，否则返回None
+        """
+        source = self.sources.get(name)
+        if source is None or source.get("schema") != SCHEMA_VERSION or not source.get("release"):
+            return None
+        release = parse_release(workbook)[1]
+        if release is None or release <= date.fromisoformat(source["release"]):
+            return None
+        if not all((self.partition_dir / part[3]).exists() for part in source["partitions"]):
+            return None
+        return [part[3] for part in source["partitions"]]
+
+    def _files_of(self, name):
+        source = self.sources.get(name, {})
+        files = [part[3] for part in source.get("partitions", [])]
+        if source.get("changes"):
+            files.append(source["changes"])
+        return files
+
+    def _remove_files(self, paths):
+        current = {path for name in self.sources for path in self._files_of(name)}
+        for path in paths:
+            target = self.partition_dir / path
+            if path in current or not target.exists():
+                continue
+            target.unlink()
+            # 删除空的分区目录
+            for parent in (target.parent, target.parent.parent):
+                if parent.exists() and not any(parent.iterdir()):
+                    parent.rmdir()
+
+    def _write_manifest(self):
+        self.partition_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.manifest_file.with_suffix(".tmp")
+        tmp_file.write_text(json.dumps({"sources": self.sources}, ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(tmp_file, self.manifest_file)
+
+    def partitions(self):
+        """
+        返回全部分区 {(大区, 省): 行数}，按大区、省排序
+        """
+        counts = {}
+        for source in self.sources.values():
+            for region, province, rows, _ in source["partitions"]:
+                counts[(region, province)] = counts.get((region, province), 0) + rows
+        return dict(sorted(counts.items()))
+
+    def regions(self):
+        return sorted({region for region, _ in self.partitions()})
+
+    def provinces(self, region=ALL):
+        return sorted({p for r, p in self.partitions() if region == ALL or r == region})
+
+    def select(self, region=ALL, province=ALL):
+        """
+        返回满足大区/省选择的分区列表（可作为缓存键）
+        """
+        return tuple(
+            key for key in self.partitions()
+            if (region == ALL or key[0] == region) and (province == ALL or key[1] == province)
+        )
+
+    def _selected_sources(self, partitions):
+        if partitions is None:
+            partitions = tuple(self.partitions())
+        wanted = set(partitions)
+        names = [
+            name for name, source in sorted(self.sources.items())
+            if any((part[0], part[1]) in wanted for part in source["partitions"])
+        ]
+        return partitions, names
+
+    def _version(self, partitions, versions):
+        key = json.dumps([sorted(versions.items()), [list(p) for p in partitions]], ensure_ascii=False)
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+    def version(self, partitions=None):
+        """
+        返回所选分区的数据版本号：任一相关工作簿变化或分区选择不同时都会改变
+        """
+        partitions, names = self._selected_sources(partitions)
+        return self._version(partitions, {name: self.sources[name]["version"] for name in names})
+
+    def previous_version(self, partitions=None):
+        """
+        返回所选分区在最近一次版本更新之前的数据版本号；相关工作簿都没有上一版本时返回None
+        """
+        partitions, names = self._selected_sources(partitions)
+        if not any(self.sources[name].get("previous_version") for name in names):
+            return None
+        return self._version(partitions, {
+            name: self.sources[name].get("previous_version") or self.sources[name]["version"]
+            for name in names
+        })
+
+    def changes(self, partitions=None):
+        """
+        返回所选分区与上一版本相比的变更（ReleaseDiff），没有变更记录时返回None
+        """
+        partitions, names = self._selected_sources(partitions)
+        wanted = set(partitions)
+        diffs = []
+        for name in names:
+            relative = self.sources[name].get("changes")
+            if relative and (self.partition_dir / relative).exists():
+                diff = ReleaseDiff.from_frame(pd.read_parquet(self.partition_dir / relative))
+                diffs.append(diff.select(lambda df: np.array([
+                    key in wanted for key in zip(*(df[col].astype("string").fillna(UNKNOWN) for col in PARTITION_COLUMNS))
+                ], dtype=bool)))
+        return ReleaseDiff.concat(diffs)
+
+    def release_date(self, partitions=None):
+        """
+        返回所选分区中最新的发布日期（取自文件名V<日期>，没有时取文件修改日期）
+        """
+        _, names = self._selected_sources(partitions)
+        dates = []
+        for name in names:
+            source = self.sources[name]
+            if source.get("release"):
+                dates.append(date.fromisoformat(source["release"]))
+            elif (self.source_dir / source.get("file", "")).is_file():
+                dates.append(date.fromtimestamp((self.source_dir / source["file"]).stat().st_mtime))
+        return max(dates) if dates else None
+
+    def files(self, partitions=None):
+        """
+        返回所选分区的Parquet文件（按分区、工作簿排序）
+        """
+        wanted = set(self.partitions() if partitions is None else partitions)
+        found = [
+            ((region, province), name, self.partition_dir / relative)
+            for name, source in sorted(self.sources.items())
+            for region, province, _, relative in source["partitions"]
+            if (region, province) in wanted
+        ]
+        return [path for _, _, path in sorted(found)]
+
+    def load(self, partitions=None):
+        """
+        只读取所选分区并合并为一张表
+        """
+        return load_partitions(self.files(partitions))
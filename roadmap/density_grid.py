@@ -0,0 +1,95 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from cluster_index import mercator_xy
+
+# 热力图网格覆盖的缩放级别，超过最高级别时沿用最高级别的网格
+HEAT_MIN_ZOOM = 4
+HEAT_MAX_ZOOM = 12
+
+# 每个256像素瓦片在每个方向划分为 2**CELL_BITS 个网格（8像素一格）
+CELL_BITS = 5
+
+# 单个缩放级别最多输出的网格数，超过时该级别改用低一级的网格显示
+MAX_CELLS = 20_000
+
+
+def cell_centers(ix, iy, level):
+    """
+    返回墨卡托网格单元中心的 (纬度, 经度)
+    """
+    size = float(1 << level)
+    x = (ix + 0.5) / size
+    y = (iy + 0.5) / size
+    lon = x * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1.0 - 2.0 * y))))
+    return lat, lon
+
+
+class DensityGrid:
+    """
+    卖力值加权的多级密度网格：门店预先换算为最高级别的墨卡托网格坐标，
+    每组筛选条件只做一次二维直方图（按网格编号求和），低级别由高级别逐级合并得到；
+    输出的网格数只与覆盖范围有关，与门店数无关
+    """
+
+    def __init__(self, df, cache_size=32, max_cells=MAX_CELLS):
+        lat = df['纬度'].to_numpy(dtype=float)
+        lon = df['经度'].to_numpy(dtype=float)
+        self.valid = np.isfinite(lat) & np.isfinite(lon)
+        size = 1 << (HEAT_MAX_ZOOM + CELL_BITS)
+        mx, my = mercator_xy(np.where(self.valid, lon, 0.0), np.where(self.valid, lat, 0.0))
+        self.ix = np.clip(np.floor(mx * size), 0, size - 1).astype(np.int64)
+        self.iy = np.clip(np.floor(my * size), 0, size - 1).astype(np.int64)
+        self.weight = np.nan_to_num(df['卖力值'].to_numpy(dtype=float))
+        self.max_cells = max_cells
+        self._levels = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    def _build(self, rows):
+        if rows is None:
+            rows = np.flatnonzero(self.valid)
+        else:
+            rows = rows[self.valid[rows]]
+        ix, iy, weight = self.ix[rows], self.iy[rows], self.weight[rows]
+
+        levels = {}
+        for zoom in range(HEAT_MAX_ZOOM, HEAT_MIN_ZOOM - 1, -1):
+            level = zoom + CELL_BITS
+            keys = (ix << level) | iy
+            cells, inverse = np.unique(keys, return_inverse=True)
+            weight = np.bincount(inverse, weights=weight, minlength=len(cells))
+            ix, iy = cells >> level, cells & ((1 << level) - 1)
+            if len(cells) <= self.max_cells:
+                lat, lon = cell_centers(ix, iy, level)
+                peak = weight.max() if len(weight) else 1.0
+                levels[zoom] = {
+                    "lat": np.round(lat, 5).tolist(),
+                    "lon": np.round(lon, 5).tolist(),
+                    "w": np.round(weight / (peak or 1.0), 3).tolist(),
+                }
+            # 合并为上一级（低一级缩放）的网格
+            ix, iy = ix >> 1, iy >> 1
+        return levels
+
+    def levels(self, view_key, rows):
+        """
+        返回各缩放级别的网格 {缩放级别: {"lat", "lon", "w"}}，w按该级别最大值归一化，
+        网格数超过max_cells的级别不输出；
+        rows为筛选后的行号（None为全部），结果按view_key缓存
+        """
+        with self._lock:
+            cached = self._levels.get(view_key)
+            if cached is not None:
+                self._levels.move_to_end(view_key)
+                return cached
+
+        levels = self._build(rows)
+        with self._lock:
+            self._levels[view_key] = levels
+            if len(self._levels) > self._cache_size:
+                self._levels.popitem(last=False)
+        return levels
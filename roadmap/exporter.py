@@ -0,0 +1,91 @@
+import codecs
+import tempfile
+
+# 每次写出的行数，导出过程的内存占用与该值成正比而不是与总行数成正比
+CHUNK_ROWS = 50_000
+
+# 支持的导出格式
+EXPORT_FORMATS = {
+    "CSV": {
+        "suffix": ".csv",
+        "mime": "text/csv",
+    },
+    "Parquet": {
+        "suffix": ".parquet",
+        "mime": "application/vnd.apache.parquet",
+    },
+    "Excel (xlsx)": {
+        "suffix": ".xlsx",
+        "mime": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    },
+}
+
+
+def iter_chunks(df, chunk_rows=CHUNK_ROWS):
+    """
+    按行分块遍历数据（只做切片，不复制整表）
+    """
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def iter_csv_chunks(df, chunk_rows=CHUNK_ROWS):
+    """
+    分块生成带BOM的UTF-8 CSV字节，Excel可直接识别中文
+    """
+    yield codecs.BOM_UTF8 + df.head(0).to_csv(index=False).encode("utf-8")
+    for chunk in iter_chunks(df, chunk_rows):
+        yield chunk.to_csv(index=False, header=False).encode("utf-8")
+
+
+def write_csv(df, fileobj, chunk_rows=CHUNK_ROWS):
+    for data in iter_csv_chunks(df, chunk_rows):
+        fileobj.write(data)
+
+
+def write_parquet(df, fileobj, chunk_rows=CHUNK_ROWS):
+    """
+    每个分块写成一个row group
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(fileobj, schema) as writer:
+        for chunk in iter_chunks(df, chunk_rows):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+def write_xlsx(df, fileobj, chunk_rows=CHUNK_ROWS):
+    """
+    使用openpyxl只写模式逐行写出，内存占用与总行数无关
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("门店数据")
+    sheet.append([str(col) for col in df.columns])
+    for chunk in iter_chunks(df, chunk_rows):
+        values = chunk.astype(object).where(chunk.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            sheet.append(row)
+    workbook.save(fileobj)
+
+
+WRITERS = {
+    "CSV": write_csv,
+    "Parquet": write_parquet,
+    "Excel (xlsx)": write_xlsx,
+}
+
+
+def export_to_file(df, export_format="CSV", chunk_rows=CHUNK_ROWS):
+    """
+    将数据按指定格式分块写入临时文件，返回已定位到开头的文件对象（关闭后自动删除）
+    """
+    if export_format not in WRITERS:
+        raise ValueError(f"不支持的导出格式: {export_format}")
+    fileobj = tempfile.TemporaryFile(suffix=EXPORT_FORMATS[export_format]["suffix"])
+    WRITERS[export_format](df, fileobj, chunk_rows)
+    fileobj.seek(0)
+    return fileobj
@@ -0,0 +1,102 @@
+import numpy as np
+
+# 侧边栏中表示"不筛选"的取值
+ALL = '全部'
+
+# 建立倒排索引的分类字段
+CATEGORY_COLUMNS = ['市', '一级渠道', '城市级别']
+
+
+class FilterIndex:
+    """
+    门店筛选索引：分类字段保存每个取值对应的有序行号数组，
+    卖力值保存排序后的数组，范围查询通过二分查找完成
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self.size = len(df)
+        self.positions = {}
+        for col in CATEGORY_COLUMNS:
+            codes, uniques = df[col].factorize(sort=True)
+            order = np.argsort(codes, kind="stable")
+            bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+            self.positions[col] = {
+                value: order[bounds[i]:bounds[i + 1]].astype(np.int64)
+                for i, value in enumerate(uniques.tolist())
+            }
+
+        self.score = df['卖力值'].to_numpy(dtype=float)
+        self.score_order = np.argsort(self.score, kind="stable")
+        self.sorted_score = self.score[self.score_order]
+
+    def values(self, col):
+        """
+        返回分类字段的全部取值（已排序）
+        """
+        return list(self.positions[col].keys())
+
+    def _lookup(self, col, value):
+        positions = self.positions[col]
+        if value not in positions and col == '城市级别':
+            # 瓦片服务等从URL得到的级别是字符串
+            value = int(value)
+        return positions.get(value, np.empty(0, dtype=np.int64))
+
+    def select(self, city=ALL, channel=ALL, level=ALL, value_range=None):
+        """
+        返回满足筛选条件的行号（升序）；不设任何条件时返回None表示全部行
+        """
+        candidates = [
+            self._lookup(col, value)
+            for col, value in zip(CATEGORY_COLUMNS, (city, channel, level))
+            if value != ALL
+        ]
+
+        if value_range is not None:
+            low, high = value_range
+            if low <= self.sorted_score[0] and high >= self.sorted_score[-1]:
+                value_range = None
+
+        if not candidates:
+            if value_range is None:
+                return None
+            lo = np.searchsorted(self.sorted_score, low, side="left")
+            hi = np.searchsorted(self.sorted_score, high, side="right")
+            return np.sort(self.score_order[lo:hi])
+
+        # 从最短的行号数组开始求交集
+        candidates.sort(key=len)
+        rows = candidates[0]
+        for other in candidates[1:]:
+            rows = np.intersect1d(rows, other, assume_unique=True)
+
+        if value_range is not None:
+            score = self.score[rows]
+            rows = rows[(score >= low) & (score <= high)]
+        return rows
+
+    def take(self, rows):
+        """
+        按select返回的行号取出数据；rows为None时直接返回原表，不做复制
+        """
+        if rows is None:
+            return self.df
+        return self.df.iloc[rows]
+
+    def apply(self, city=ALL, channel=ALL, level=ALL, value_range=None):
+        """
+        返回筛选后的数据；不设任何条件时直接返回原表，不做复制
+        """
+        return self.take(self.select(city, channel, level, value_range))
+
+    def mask(self, city=ALL, channel=ALL, level=ALL, value_range=None):
+        """
+        返回与原表等长的布尔筛选掩码
+        """
+        rows = self.select(city, channel, level, value_range)
+        if rows is None:
+            return np.ones(self.size, dtype=bool)
+        mask = np.zeros(self.size, dtype=bool)
+        mask[rows] = True
+        return mask
@@ -0,0 +1,266 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+import weakref
+from contextlib import contextmanager
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    # Windows上没有resource模块，不记录进程内存峰值
+    resource = None
+
+# 剖析开关：环境变量 STORE_APP_PROFILE=1，或页面地址加 ?profile=1
+PROFILE_ENV = "STORE_APP_PROFILE"
+PROFILE_PARAM = "profile"
+TRUE_VALUES = {"1", "true", "yes", "on"}
+
+# 结构化日志（每行一个JSON）使用的logger
+LOGGER_NAME = "store_app.profile"
+
+# 每个会话保留的最近重跑次数
+HISTORY_SIZE = 50
+
+# 各类重跑的总计在p50/p95汇总表中的名称（fragment为页面片段单独重跑）
+TOTAL_LABELS = {"rerun": "(重跑总计)", "fragment": "(片段重跑总计)"}
+
+
+def profiling_enabled(query_params=None):
+    """
+    环境变量或页面地址参数开启剖析时返回True
+    """
+    if os.environ.get(PROFILE_ENV, "").strip().lower() in TRUE_VALUES:
+        return True
+    if query_params is None:
+        return False
+    return str(query_params.get(PROFILE_PARAM, "")).strip().lower() in TRUE_VALUES
+
+
+def get_logger():
+    """
+    剖析日志的logger：未配置处理器时输出到标准错误，每条消息一行JSON
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+
+# tracemalloc只在有剖析中的重跑时开启：按剖析器计数，最后一个剖析器结束时关闭
+_tracing_lock = threading.Lock()
+_tracing = {"profilers": 0, "started": False}
+
+# 所有剖析器中尚未结束的阶段（tracemalloc的峰值是整个进程共用的）
+_open_stages = []
+
+
+def _start_tracing():
+    with _tracing_lock:
+        _tracing["profilers"] += 1
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing["started"] = True
+
+
+def _stop_tracing():
+    with _tracing_lock:
+        _tracing["profilers"] -= 1
+        # 只关闭自己开启的tracemalloc（例如不影响 python -X tracemalloc）
+        if _tracing["profilers"] == 0 and _tracing["started"]:
+            tracemalloc.stop()
+            _tracing["started"] = False
+
+
+def _remove_frame(frames, frame):
+    del frames[next(i for i, other in enumerate(frames) if other is frame)]
+
+
+def peak_rss_mb():
+    """
+    进程的内存占用峰值（MB；Linux上ru_maxrss单位为KB，macOS上为字节），没有resource模块（Windows）时返回None
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024, 1)
+
+
+class RerunProfiler:
+    """
+    记录一次重跑中各阶段的耗时、行数、数据量和内存峰值（tracemalloc统计的、
+    阶段内新分配内存的最高值），结束时按阶段输出JSON日志行。
+    tracemalloc从第一个开启的剖析器创建时开始，到最后一个剖析器结束（或被回收）时停止；
+    内存峰值是整个进程的，阶段执行期间有其他剖析器的阶段同时执行时不记录内存峰值。
+    未开启时stage()只返回一个空记录，不计时也不统计内存
+    """
+
+    def __init__(self, enabled=False, session=None, kind="rerun"):
+        self.enabled = enabled
+        self.session = session
+        self.kind = kind
+        self.rerun = uuid.uuid4().hex[:12]
+        self.records = []
+        self.finished = False
+        self._open = []
+        self._started = time.perf_counter()
+        self._release = None
+        if enabled:
+            # 重跑中途被打断（st.stop、st.rerun）时没有调用finish()，剖析器被回收时同样停止计数
+            _start_tracing()
+            self._release = weakref.finalize(self, _stop_tracing)
+
+    @contextmanager
+    def stage(self, name, **fields):
+        """
+        统计with块内的一个阶段；块内可向返回的记录写入 rows、bytes 等字段。
+        阶段可以嵌套，外层阶段的内存峰值包含内层
+        """
+        record = {"stage": name, **fields}
+        if not self.enabled:
+            yield record
+            return
+
+        frame = {"owner": self, "shared": False}
+        with _tracing_lock:
+            # 重置峰值前先把当前峰值计入仍未结束的各阶段
+            current, peak = tracemalloc.get_traced_memory()
+            for other in _open_stages:
+                other["peak"] = max(other["peak"], peak)
+            # 其他剖析器的阶段同时执行时，峰值无法区分归属，双方都不记录内存峰值
+            if any(other["owner"] is not self for other in _open_stages):
+                frame["shared"] = True
+                for other in _open_stages:
+                    other["shared"] = True
+            tracemalloc.reset_peak()
+            frame.update(start=current, peak=current)
+            _open_stages.append(frame)
+        record["depth"] = len(self._open)
+        self._open.append(frame)
+        # 按开始顺序记录，外层阶段排在内层之前
+        self.records.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            elapsed = time.perf_counter() - start
+            with _tracing_lock:
+                _, peak = tracemalloc.get_traced_memory()
+                _remove_frame(_open_stages, frame)
+            # 后台线程中的阶段可能晚于外层阶段结束，按对象而不是按栈顶移除
+            _remove_frame(self._open, frame)
+            record["ms"] = round(elapsed * 1000, 2)
+            record["peak_mb"] = None if frame["shared"] else round((max(frame["peak"], peak) - frame["start"]) / 1024 / 1024, 2)
+
+    def finish(self):
+        """
+        结束本次重跑：输出各阶段和总计的JSON日志行，并返回这些记录（未开启时返回空列表）
+        """
+        self.finished = True
+        if not self.enabled:
+            return []
+        self._release()
+        base = {"ts": round(time.time(), 3), "session": self.session, "rerun": self.rerun, "kind": self.kind}
+        events = [{**base, "event": "stage", **record} for record in self.records]
+        events.append({
+            **base,
+            "event": self.kind,
+            "ms": round((time.perf_counter() - self._started) * 1000, 2),
+            "peak_rss_mb": peak_rss_mb(),
+        })
+        logger = get_logger()
+        for event in events:
+            logger.info(json.dumps(event, ensure_ascii=False, default=str))
+        return events
+
+    def table(self):
+        """
+        本次重跑各阶段的明细表（按开始顺序，内层阶段缩进显示）
+        """
+        rows = []
+        for record in self.records:
+            rows.append({
+                "阶段": "　" * record["depth"] + record["stage"],
+                "耗时(ms)": record["ms"],
+                "行数": record.get("rows"),
+                "数据量(KB)": None if record.get("bytes") is None else round(record["bytes"] / 1024, 1),
+                "内存峰值(MB)": record["peak_mb"],
+                "备注": record.get("note", ""),
+            })
+        return pd.DataFrame(rows)
+
+
+NULL_PROFILER = RerunProfiler(enabled=False)
+
+
+def read_log(lines):
+    """
+    从日志行中取出剖析记录（忽略不是JSON的行和其他日志）
+    """
+    records = []
+    for line in lines:
+        start = line.find("{")
+        if start < 0:
+            continue
+        try:
+            record = json.loads(line[start:])
+        except ValueError:
+            continue
+        if isinstance(record, dict) and record.get("event") in ("stage", "download", *TOTAL_LABELS):
+            records.append(record)
+    return pd.DataFrame(records)
+
+
+def percentiles(records):
+    """
+    按阶段汇总耗时的 次数、p50、p95、最大值，以及平均行数和数据量；整次重跑记为"(重跑总计)"，
+    页面片段单独重跑记为"(片段重跑总计)"
+    """
+    if records.empty:
+        return pd.DataFrame()
+    stages = records[records["event"] == "stage"].copy()
+    totals = records[records["event"].isin(list(TOTAL_LABELS))]
+    totals = totals.assign(stage=totals["event"].map(TOTAL_LABELS))
+    data = pd.concat([stages, totals], ignore_index=True)
+    for column in ("rows", "bytes", "peak_mb"):
+        # 与其他阶段同时执行的阶段没有内存峰值（None）
+        data[column] = pd.to_numeric(data[column], errors="coerce") if column in data.columns else float("nan")
+    grouped = data.groupby("stage", sort=False)
+    table = pd.DataFrame({
+        "次数": grouped["ms"].size(),
+        "p50(ms)": grouped["ms"].quantile(0.5),
+        "p95(ms)": grouped["ms"].quantile(0.95),
+        "最大(ms)": grouped["ms"].max(),
+        "平均行数": grouped["rows"].mean(),
+        "平均数据量(KB)": grouped["bytes"].mean() / 1024,
+        "内存峰值p95(MB)": grouped["peak_mb"].quantile(0.95),
+    })
+    return table.round(1).sort_values("p95(ms)", ascending=False)
+
+
+def parse_args():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="汇总应用剖析日志中各阶段耗时的p50/p95")
+    parser.add_argument("logs", nargs="*", help="日志文件，可指定多个（默认读取标准输入）")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.logs:
+        lines = [line for path in args.logs for line in open(path, encoding="utf-8", errors="replace")]
+    else:
+        lines = sys.stdin.readlines()
+    table = percentiles(read_log(lines))
+    print("没有找到剖析记录" if table.empty else table.to_string())
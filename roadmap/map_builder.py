@@ -0,0 +1,291 @@
+import folium
+import pandas as pd
+from folium import plugins
+
+from boundaries import AREA_METRICS
+from coverage import HUB_COLORS
+from instrumentation import NULL_PROFILER
+from map_layers import (CHANNEL_COLORS, CanvasChannelToggle, CanvasPointLayer, ChangeLayer, DensityHeatLayer,
+                        HubCoverageLayer, HubLinkLayer, StoreLayer, StoreTileLayer, ZoomLevelGeoJson)
+from release_diff import CHANGE_COLORS, CHANGE_LABELS
+from tile_server import CLUSTER_ROUTE, STORE_ROUTE, TILE_ROUTE, filter_query
+
+# 地图初始缩放级别
+MAP_ZOOM = 8
+
+# 区域分布图的边界按这几个缩放级别分别简化，浏览器按当前缩放级别切换
+AREA_ZOOMS = (MAP_ZOOM - 2, MAP_ZOOM, MAP_ZOOM + 2)
+
+# 地图渲染模式
+RENDER_MODES = {
+    "快速图层（推荐）": "vectorized",
+    "按视野加载（瓦片）": "tiles",
+    "门店聚合（按缩放级别）": "clusters",
+    "画布点图层（大数据量）": "canvas",
+    "逐点标记": "markers",
+}
+
+# 快速图层为每家门店创建一个circleMarker，门店数超过该值时自动改用画布点图层
+CANVAS_AUTO_ROWS = 10_000
+
+
+def auto_render_mode(render_mode, rows):
+    """
+    快速图层在门店数超过CANVAS_AUTO_ROWS时改用画布点图层，其他模式不变
+    """
+    return "canvas" if render_mode == "vectorized" and rows > CANVAS_AUTO_ROWS else render_mode
+
+
+def create_folium_map(df_filtered, render_mode="vectorized", service_url=None, query="", lazy_popups=False, changes=None,
+                      search=None, coverage=None, areas=None, heat=None, checkpoint=None):
+    """
+    创建Folium地图
+    vectorized: 按列数组整体渲染; tiles: 从本地瓦片服务按视野加载;
+    clusters: 从聚合索引按缩放级别加载聚合点; canvas: 全部门店画在一块画布上; markers: 逐点创建标记
+    service_url为本地瓦片/查询服务地址，query为筛选条件查询参数；
+    lazy_popups时门店弹窗点击后才从查询服务加载（画布模式给出service_url时总是按需加载）；
+    changes为与上一版本相比的变更明细，给出时添加版本变化图层；
+    search为周边查询条件，给出时标出查询中心和半径，点击地图可复制坐标；
+    coverage为 (Hub类型, Hub统计, 门店-Hub连线)，给出时添加Hub覆盖图层；
+    areas为 ({缩放级别: 简化后的边界GeoJSON}, 区域统计, 着色指标)，给出时添加区域分布图（缩放时切换边界精度）；
+    heat为密度网格按缩放级别的网格数据，给出时添加卖力值热力图；
+    checkpoint在各渠道图层之间调用，抛出异常即中止创建（后台渲染被取消时）
+    """
+    if df_filtered.empty:
+        return None
+
+    # 计算地图中心点
+    center_lat = df_filtered['纬度'].mean()
+    center_lon = df_filtered['经度'].mean()
+
+    # 创建地图（使用默认图层）
+    m = folium.Map(
+        location=[center_lat, center_lon],
+        zoom_start=MAP_ZOOM,
+        tiles="OpenStreetMap"
+    )
+
+    # 添加稳定可靠的地图图层
+    folium.TileLayer('cartodbpositron', name='CartoDB Positron').add_to(m)
+
+    # 添加全屏插件
+    plugins.Fullscreen(
+        position="topright",
+        title="Expand me",
+        title_cancel="Exit me",
+        force_separate_button=True,
+    ).add_to(m)
+
+    detail_url = f"{service_url}{STORE_ROUTE}" if service_url else None
+
+    if render_mode == "clusters":
+        # 聚合点由服务端索引按缩放级别和视野计算，不再逐渠道嵌入门店
+        cluster_group = folium.FeatureGroup(name="门店聚合", show=True)
+        StoreTileLayer(f"{service_url}{CLUSTER_ROUTE}?{query}", detail_url).add_to(cluster_group)
+        m.add_child(cluster_group)
+
+    if render_mode == "canvas":
+        # 全部门店共用一个画布图层，坐标和样式以二进制数组嵌入页面
+        canvas_layer = CanvasPointLayer(df_filtered, detail_url)
+        m.add_child(canvas_layer)
+
+    # 为每个渠道创建FeatureGroup
+    channel_groups = {}
+    for channel in df_filtered['一级渠道'].unique():
+        channel_groups[channel] = folium.FeatureGroup(name=f"{channel} 渠道", show=True)
+
+    # 按渠道分组添加门店标记
+    for channel, group in df_filtered.groupby('一级渠道', observed=True):
+        if checkpoint is not None:
+            checkpoint()
+        if channel in channel_groups and render_mode != "clusters":
+            feature_group = channel_groups[channel]
+            color = CHANNEL_COLORS.get(channel, 'gray')
+
+            if render_mode == "tiles":
+                # 只加载当前视野内的门店，渠道作为额外的筛选参数
+                channel_url = f"{service_url}{TILE_ROUTE}?{query}&{filter_query(channel=channel)}"
+                StoreTileLayer(channel_url, detail_url).add_to(feature_group)
+                m.add_child(feature_group)
+                continue
+
+            if render_mode == "canvas":
+                # 渠道图层只作为图层控制面板中的开关，门店画在共用的画布上
+                CanvasChannelToggle(canvas_layer, channel).add_to(feature_group)
+                m.add_child(feature_group)
+                continue
+
+            if render_mode == "vectorized":
+                # 整个渠道作为一个图层，由列数组驱动样式
+                StoreLayer(group, channel, color, detail_url if lazy_popups else None).add_to(feature_group)
+                m.add_child(feature_group)
+                continue
+
+            for count, (idx, row) in enumerate(group.iterrows()):
+                # 逐点创建标记较慢，每500家门店经过一次检查点
+                if checkpoint is not None and count % 500 == 499:
+                    checkpoint()
+
+                # 检查是否有宝洁SEQ
+                has_pg_seq = pd.notna(row['宝洁SEQ']) and str(row['宝洁SEQ']).strip() != ''
+
+                # 创建弹窗内容
+                popup_content = f"""
+                <div style="width: 300px;">
+                    <h4>{row['门店名称']} {'🚩' if has_pg_seq else ''}</h4>
+                    <p><strong>门店编码:</strong> {row['门店编码']}</p>
+                    <p><strong>地址:</strong> {row['地址']}</p>
+                    <p><strong>城市:</strong> {row['市']} - {row['区县']}</p>
+                    <p><strong>渠道:</strong> {row['一级渠道']}</p>
+                    <p><strong>城市级别:</strong> {row['城市级别']}级</p>
+                    <p><strong>卖力值:</strong> {row['卖力值']}</p>
+                    {f"<p><strong>连锁系统:</strong> {row['所属连锁系统']}</p>" if pd.notna(row['所属连锁系统']) else ""}
+                    {f"<p><strong>宝洁SEQ:</strong> {row['宝洁SEQ']} 🚩</p>" if has_pg_seq else ""}
+                </div>
+                """
+
+                # 缩小圆点，根据卖力值决定图标大小
+                radius = max(2, min(6, row['卖力值'] / 15))
+
+                # 添加门店圆点标记
+                folium.CircleMarker(
+                    location=[row['纬度'], row['经度']],
+                    radius=radius,
+                    popup=folium.Popup(popup_content, max_width=300),
+                    tooltip=f"{row['门店名称']} - {row['一级渠道']} {'🚩' if has_pg_seq else ''}",
+                    color=color,
+                    fill=True,
+                    fillColor=color,
+                    fillOpacity=0.7,
+                    weight=1
+                ).add_to(feature_group)
+
+                # 如果有宝洁SEQ，添加更大的小旗子标记
+                if has_pg_seq:
+                    folium.Marker(
+                        location=[row['纬度'], row['经度']],
+                        icon=folium.DivIcon(
+                            html='<div style="font-size: 18px; text-shadow: 1px 1px 2px rgba(0,0,0,0.5);">🚩</div>',
+                            icon_size=(24, 24),
+                            icon_anchor=(12, 24)
+                        ),
+                        tooltip=f"宝洁覆盖: {row['门店名称']}"
+                    ).add_to(feature_group)
+
+            # 将FeatureGroup添加到地图
+            m.add_child(feature_group)
+
+    # 版本变化图层（新增/删除/变更的门店）
+    if changes is not None and not changes.empty:
+        change_group = folium.FeatureGroup(name="与上一版本的变化", show=True)
+        ChangeLayer(changes, CHANGE_COLORS, CHANGE_LABELS).add_to(change_group)
+        m.add_child(change_group)
+
+    # 区域分布图：行政区域按所选指标着色，悬停显示各项统计
+    if areas is not None:
+        levels, area_table, metric = areas
+        values = area_table.set_index('id')[AREA_METRICS + ['标签不符门店数']]
+        properties = values.astype(object).where(values.notna(), None).to_dict('index')
+        levels = {
+            zoom: {"type": "FeatureCollection", "features": [
+                {**feature, 'properties': {'name': feature['properties']['name'], **properties[feature['id']]}}
+                for feature in geojson['features']
+            ]}
+            for zoom, geojson in sorted(levels.items())
+        }
+        # 初始显示不低于初始缩放级别的最粗一级，其余级别缩放时切换
+        initial = min((zoom for zoom in levels if zoom >= MAP_ZOOM), default=max(levels))
+        colored = area_table[area_table[metric].notna()]
+        choropleth = folium.Choropleth(
+            geo_data=levels[initial],
+            name=f"区域分布（{metric}）",
+            data=colored,
+            columns=['id', metric],
+            key_on='feature.id',
+            # ColorBrewer配色至少需要3种颜色
+            bins=min(6, max(3, colored[metric].nunique())),
+            fill_color='YlGn',
+            fill_opacity=0.5,
+            line_opacity=0.3,
+            nan_fill_opacity=0.05,
+            legend_name=metric,
+            highlight=True,
+        )
+        folium.GeoJsonTooltip(
+            fields=['name'] + AREA_METRICS + ['标签不符门店数'],
+            aliases=['区域', '门店数', '平均卖力值', 'SEQ渗透率(%)', '标签不符门店数'],
+        ).add_to(choropleth.geojson)
+        if len(levels) > 1:
+            ZoomLevelGeoJson(levels, initial).add_to(choropleth.geojson)
+        choropleth.add_to(m)
+
+    # Hub覆盖圆和门店到最近Hub的连线
+    if coverage is not None:
+        hub_type, hub_stats, hub_links = coverage
+        hub_color = HUB_COLORS.get(hub_type, 'green')
+        hub_group = folium.FeatureGroup(name=f"{hub_type} Hub平均半径", show=True)
+        HubCoverageLayer(hub_stats, hub_color).add_to(hub_group)
+        m.add_child(hub_group)
+        link_group = folium.FeatureGroup(name=f"{hub_type} 门店-Hub连线", show=False)
+        HubLinkLayer(hub_links, hub_color).add_to(link_group)
+        m.add_child(link_group)
+
+    # 周边查询的中心点和半径
+    if search is not None:
+        search_group = folium.FeatureGroup(name="周边查询", show=True)
+        folium.Marker(
+            location=[search['lat'], search['lon']],
+            tooltip="查询中心",
+            icon=folium.Icon(color="red", icon="screenshot"),
+        ).add_to(search_group)
+        if 'radius' in search:
+            folium.Circle(
+                location=[search['lat'], search['lon']],
+                radius=search['radius'] * 1000,
+                color="red",
+                weight=2,
+                fill=False,
+                dash_array="6",
+            ).add_to(search_group)
+        m.add_child(search_group)
+        # 点击地图复制"纬度, 经度"，粘贴到侧边栏即可作为新的查询中心
+        folium.ClickForLatLng(format_str='lat.toFixed(5) + ", " + lng.toFixed(5)', alert=True).add_to(m)
+
+    # 添加热力图图层（可选，嵌入服务端合并好的密度网格，页面大小与门店数无关）
+    if heat:
+        heat_group = folium.FeatureGroup(name="卖力值热力图", show=False)
+        DensityHeatLayer(heat).add_to(heat_group)
+        m.add_child(heat_group)
+
+    # 添加LayerControl
+    folium.LayerControl(position='topright').add_to(m)
+
+    return m
+
+
+def render_map_html(df_filtered, render_mode="vectorized", service_url=None, query="", lazy_popups=False, changes=None,
+                    search=None, coverage=None, areas=None, heat=None, profiler=NULL_PROFILER, checkpoint=None):
+    """
+    创建地图并序列化为HTML，没有门店时返回None；profiler分别记录创建和序列化两个阶段，
+    checkpoint在创建过程中和序列化之前调用（见create_folium_map）
+    """
+    with profiler.stage("create_folium_map", rows=len(df_filtered)):
+        folium_map = create_folium_map(
+            df_filtered, render_mode, service_url, query, lazy_popups, changes, search, coverage, areas, heat, checkpoint)
+    if folium_map is None:
+        return None
+    if checkpoint is not None:
+        checkpoint()
+    with profiler.stage("_repr_html_") as record:
+        map_html = folium_map._repr_html_()
+        record["bytes"] = len(map_html.encode("utf-8")) if profiler.enabled else None
+    return map_html
+
+
+def heat_levels(density_grid, view_key, rows):
+    """
+    筛选结果的热力图网格，门店太少时不显示热力图
+    """
+    if rows is not None and len(rows) <= 10:
+        return None
+    return density_grid.levels(view_key, rows)
@@ -0,0 +1,240 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+from filter_index import ALL
+
+# 地图HTML缓存的内存上限，可通过环境变量 MAP_CACHE_MB 调整
+DEFAULT_BUDGET_MB = int(os.environ.get("MAP_CACHE_MB", 256))
+
+
+def map_cache_key(version, render_mode, city=ALL, channel=ALL, level=ALL, value_range=None, full_range=None, search=None):
+    """
+    将筛选条件规范化为缓存键；卖力值取满全范围时视为不筛选，search为周边查询条件
+    """
+    if value_range is not None:
+        value_range = (round(float(value_range[0]), 2), round(float(value_range[1]), 2))
+        if full_range is not None and value_range == (round(float(full_range[0]), 2), round(float(full_range[1]), 2)):
+            value_range = None
+    if search is not None:
+        search = tuple(sorted((key, round(float(value), 6)) for key, value in search.items()))
+    return (version, render_mode, city, channel, str(level), value_range, search)
+
+
+class MapHtmlCache:
+    """
+    按内存预算淘汰的LRU缓存，保存渲染好的地图HTML，并记录命中/未命中次数
+    """
+
+    def __init__(self, budget_mb=DEFAULT_BUDGET_MB):
+        self.budget = budget_mb * 1024 * 1024
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            html = self._items.get(key)
+            if html is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return html
+
+    def put(self, key, html):
+        cost = sys.getsizeof(html)
+        if cost > self.budget:
+            return
+        with self._lock:
+            if key in self._items:
+                self.size -= sys.getsizeof(self._items.pop(key))
+            self._items[key] = html
+            self.size += cost
+            while self.size > self.budget:
+                _, old = self._items.popitem(last=False)
+                self.size -= sys.getsizeof(old)
+                self.evictions += 1
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def get_or_render(self, key, render):
+        """
+        命中时直接返回缓存的HTML，否则调用render()渲染并写入缓存
+        """
+        html = self.get(key)
+        if html is None:
+            html = render()
+            if html is not None:
+                self.put(key, html)
+        return html
+
+    def carry_over(self, old_version, new_version, keep):
+        """
+        数据版本更新后，将旧版本中keep(key)为真（不受变更影响）的视图改记到新版本下，
+        不必重新渲染；返回沿用的视图个数
+        """
+        moved = 0
+        with self._lock:
+            for key in list(self._items):
+                if key[0] != old_version or not keep(key):
+                    continue
+                html = self._items.pop(key)
+                new_key = (new_version,) + tuple(key[1:])
+                if new_key in self._items:
+                    self.size -= sys.getsizeof(html)
+                    continue
+                self._items[new_key] = html
+                moved += 1
+        return moved
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._items),
+                "size_mb": self.size / 1024 / 1024,
+                "budget_mb": self.budget / 1024 / 1024,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+class MapBuildCancelled(Exception):
+    """
+    后台渲染在检查点发现已被取消
+    """
+
+
+class MapBuild:
+    """
+    一次后台地图渲染：done在渲染结束（完成、出错或取消）时置位，html为结果，error为渲染时的异常；
+    waiters为等待该结果的会话，全部离开后设置cancelled，渲染在下一个检查点停止
+    """
+
+    def __init__(self, key, html=None):
+        self.key = key
+        self.html = html
+        self.error = None
+        self.waiters = set()
+        self.done = threading.Event()
+        self.cancelled = threading.Event()
+        if html is not None:
+            self.done.set()
+
+    def check(self):
+        """
+        渲染过程中的检查点：已取消时抛出MapBuildCancelled
+        """
+        if self.cancelled.is_set():
+            raise MapBuildCancelled(self.key)
+
+
+class BackgroundRenderer:
+    """
+    在后台线程中渲染地图并写入缓存，页面不必等地图渲染完成。
+    同一缓存键正在渲染时各会话共用这次渲染；每个会话同时只等待一个视图，
+    会话改看其他视图后，不再有会话等待的渲染会被取消，不会让新的渲染排在它后面
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self._builds = {}
+        self._owners = {}
+        self._lock = threading.Lock()
+
+    def submit(self, owner, key, render):
+        """
+        为owner（会话）请求key的地图：已缓存时返回已完成的MapBuild；正在渲染时加入等待；
+        否则在后台线程中调用render(build)，render应在耗时步骤之间调用build.check()
+        """
+        html = self.cache.get(key)
+        with self._lock:
+            previous = self._owners.get(owner)
+            if previous is not None and previous != key:
+                self._release(owner, previous)
+            if html is not None:
+                self._owners.pop(owner, None)
+                return MapBuild(key, html)
+            build = self._builds.get(key)
+            if build is None:
+                build = self._builds[key] = MapBuild(key)
+                thread = threading.Thread(target=self._run, args=(build, render), name="map-build", daemon=True)
+                thread.start()
+            build.waiters.add(owner)
+            self._owners[owner] = key
+            return build
+
+    def release(self, owner, key):
+        """
+        owner不再等待key的地图（例如页面重跑中断了等待）
+        """
+        with self._lock:
+            self._release(owner, key)
+
+    def _release(self, owner, key):
+        if self._owners.get(owner) == key:
+            del self._owners[owner]
+        build = self._builds.get(key)
+        if build is None:
+            return
+        build.waiters.discard(owner)
+        if not build.waiters:
+            build.cancelled.set()
+            del self._builds[key]
+
+    def _run(self, build, render):
+        try:
+            build.html = render(build)
+            if build.html is not None:
+                self.cache.put(build.key, build.html)
+        except MapBuildCancelled:
+            pass
+        except Exception as e:
+            build.error = e
+        finally:
+            with self._lock:
+                if self._builds.get(build.key) is build:
+                    del self._builds[build.key]
+                for owner in build.waiters:
+                    if self._owners.get(owner) == build.key:
+                        del self._owners[owner]
+            build.done.set()
+
+    def pending(self):
+        """
+        正在后台渲染的视图数
+        """
+        with self._lock:
+            return len(self._builds)
+
+
+def prewarm(cache, keys_and_renders, errors=None):
+    """
+    在后台线程中依次渲染常用视图并写入缓存（已缓存的跳过）；
+    渲染出错的视图跳过，(缓存键, 异常) 记入errors列表，由调用方在脚本线程中显示
+    """
+    def run():
+        for key, render in keys_and_renders:
+            if key in cache:
+                continue
+            try:
+                html = render()
+            except Exception as e:
+                if errors is not None:
+                    errors.append((key, e))
+                continue
+            if html is not None:
+                cache.put(key, html)
+
+    thread = threading.Thread(target=run, name="map-cache-prewarm", daemon=True)
+    thread.start()
+    return thread
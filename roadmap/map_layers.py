@@ -0,0 +1,893 @@
+import base64
+import json
+
+import numpy as np
+import pandas as pd
+from branca.element import Element, Figure, MacroElement
+from folium.elements import JSCSSMixin
+from folium.plugins import HeatMap
+from jinja2 import Template
+
+# 渠道颜色
+CHANNEL_COLORS = {
+    'MM': 'red',
+    'Grocery': 'blue',
+    'CVS': 'green',
+    'HSM': 'orange'
+}
+
+# 宝洁SEQ小旗子图标
+SEQ_FLAG_HTML = '<div style="font-size: 18px; text-shadow: 1px 1px 2px rgba(0,0,0,0.5);">🚩</div>'
+
+# 画布门店图层从该缩放级别起在宝洁SEQ门店上方画小旗子（缩得更小时只有描边，避免小旗子连成一片）
+CANVAS_FLAG_ZOOM = 11
+
+
+def has_pg_seq(df):
+    """
+    按列判断门店是否有宝洁SEQ（非空且不是空白字符串）
+    """
+    return df['宝洁SEQ'].astype("string").fillna("").str.strip().ne("")
+
+
+def marker_radius(df):
+    """
+    根据卖力值计算圆点半径，限制在2~6之间
+    """
+    return np.clip(df['卖力值'].to_numpy(dtype=float) / 15, 2, 6)
+
+
+# 门店弹窗的浏览器端公共函数：转义、生成弹窗HTML、按门店编码从查询接口加载弹窗
+# （由StorePopupMixin在每张地图的页面脚本中输出一次，各图层共用）
+POPUP_JS = u"""
+                function esc(value) {
+                    return String(value).replace(/&/g, '&amp;').replace(/</g, '&lt;')
+                        .replace(/>/g, '&gt;').replace(/"/g, '&quot;');
+                }
+
+                function storePopupHtml(s) {
+                    var flag = s.seq ? ' 🚩' : '';
+                    var html = '<div style="width: 300px;">'
+                        + '<h4>' + esc(s.name) + flag + '</h4>'
+                        + '<p><strong>门店编码:</strong> ' + esc(s.code) + '</p>'
+                        + '<p><strong>地址:</strong> ' + esc(s.addr) + '</p>'
+                        + '<p><strong>城市:</strong> ' + esc(s.city) + ' - ' + esc(s.district) + '</p>'
+                        + '<p><strong>渠道:</strong> ' + esc(s.channel) + '</p>'
+                        + '<p><strong>城市级别:</strong> ' + s.level + '级</p>'
+                        + '<p><strong>卖力值:</strong> ' + s.score + '</p>';
+                    if (s.chain) {
+                        html += '<p><strong>连锁系统:</strong> ' + esc(s.chain) + '</p>';
+                    }
+                    if (s.seq) {
+                        html += '<p><strong>宝洁SEQ:</strong> ' + esc(s.seq_code) + ' 🚩</p>';
+                    }
+                    return html + '</div>';
+                }
+
+                function loadStorePopup(popup, detailUrl, code) {
+                    fetch(L.Util.template(detailUrl, {code: encodeURIComponent(code)}))
+                        .then(function(resp) {
+                            if (!resp.ok) {
+                                throw new Error(resp.status);
+                            }
+                            return resp.json();
+                        })
+                        .then(function(s) {
+                            popup.setContent(storePopupHtml(s));
+                            popup._storeLoaded = true;
+                        })
+                        .catch(function() { popup.setContent('门店信息加载失败'); });
+                }
+
+                function bindLazyPopup(marker, detailUrl, code) {
+                    marker.bindPopup('门店信息加载中...', {maxWidth: 300});
+                    marker.on('popupopen', function(e) {
+                        if (!e.popup._storeLoaded) {
+                            loadStorePopup(e.popup, detailUrl, code);
+                        }
+                    });
+                    return marker;
+                }
+"""
+
+
+class StorePopupMixin(MacroElement):
+    """
+    使用门店弹窗公共函数（POPUP_JS）的图层：渲染时按固定名称把公共函数加入页面脚本，
+    同一张地图上的多个图层只输出一份（与folium的JSCSSMixin加入外部资源的方式相同）
+    """
+
+    def render(self, **kwargs):
+        figure = self.get_root()
+        assert isinstance(figure, Figure), "You cannot render this Element if it is not in a Figure."
+        figure.script.add_child(Element(POPUP_JS), name="store_popup_js", index=0)
+        super().render(**kwargs)
+
+
+def _text_column(series):
+    return series.astype("string").fillna("").tolist()
+
+
+def to_js_json(payload):
+    """
+    序列化为可以直接嵌入<script>的紧凑JSON
+    """
+    text = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    return text.replace("<", "\\u003c").replace(">", "\\u003e").replace("&", "\\u0026")
+
+
+def _coord_column(series):
+    # 取6位小数（与Excel中的精度相同），减小嵌入页面的JSON体积
+    return np.round(series.to_numpy(dtype=float), 6).tolist()
+
+
+def store_details(df):
+    """
+    门店弹窗所需的各列（门店编码和坐标、样式列除外）
+    """
+    return {
+        "name": _text_column(df['门店名称']),
+        "addr": _text_column(df['地址']),
+        "city": _text_column(df['市']),
+        "district": _text_column(df['区县']),
+        "level": df['城市级别'].tolist(),
+        "score": df['卖力值'].tolist(),
+        "chain": _text_column(df['所属连锁系统']),
+        "seq_code": _text_column(df['宝洁SEQ']),
+    }
+
+
+def store_columns(df, lazy_popups=False):
+    """
+    将门店数据按列转换为渲染所需的数组，不逐行创建Python对象；
+    lazy_popups时只保留坐标、样式和门店编码，弹窗内容点击后再加载
+    """
+    columns = {
+        "lat": _coord_column(df['纬度']),
+        "lon": _coord_column(df['经度']),
+        "r": np.round(marker_radius(df), 2).tolist(),
+        "seq": has_pg_seq(df).astype(int).tolist(),
+        "code": _text_column(df['门店编码']),
+    }
+    if not lazy_popups:
+        columns.update(store_details(df))
+    return columns
+
+
+def pack_array(values, dtype):
+    """
+    将数组按小端字节序打包为base64字符串，浏览器端解码后直接作为对应的TypedArray使用
+    """
+    data = np.ascontiguousarray(values, dtype=np.dtype(dtype).newbyteorder("<"))
+    return base64.b64encode(data.tobytes()).decode("ascii")
+
+
+class StoreLayer(StorePopupMixin):
+    """
+    单个渠道的门店图层：数据以列数组形式嵌入页面，
+    由浏览器端循环创建圆点，弹窗内容在点击时才生成；
+    传入detail_url时页面只带门店编码，弹窗内容点击后从查询接口加载
+    """
+
+    _template = Template(u"""
+        {% macro script(this, kwargs) %}
+            (function() {
+                var data = {{ this.data }};
+                var layer = {{ this._parent.get_name() }};
+                var color = {{ this.color_json }};
+                var channel = {{ this.channel_json }};
+                var detailUrl = {{ this.detail_url_json }};
+                var flagIcon = L.divIcon({
+                    html: {{ this.flag_json }},
+                    iconSize: [24, 24],
+                    iconAnchor: [12, 24],
+                    className: 'empty'
+                });
+                function record(i) {
+                    return {
+                        name: data.name[i], code: data.code[i], addr: data.addr[i],
+                        city: data.city[i], district: data.district[i], channel: channel,
+                        level: data.level[i], score: data.score[i], chain: data.chain[i],
+                        seq: data.seq[i], seq_code: data.seq_code[i]
+                    };
+                }
+
+                for (var i = 0; i < data.lat.length; i++) {
+                    var flag = data.seq[i] ? ' 🚩' : '';
+                    var label = detailUrl ? data.code[i] : data.name[i];
+                    var marker = L.circleMarker([data.lat[i], data.lon[i]], {
+                        radius: data.r[i],
+                        color: color,
+                        fill: true,
+                        fillColor: color,
+                        fillOpacity: 0.7,
+                        weight: 1
+                    }).bindTooltip(esc(label) + ' - ' + esc(channel) + flag);
+
+                    if (detailUrl) {
+                        bindLazyPopup(marker, detailUrl, data.code[i]);
+                    } else {
+                        marker.bindPopup(storePopupHtml.bind(null, record(i)), {maxWidth: 300});
+                    }
+                    marker.addTo(layer);
+
+                    if (data.seq[i]) {
+                        L.marker([data.lat[i], data.lon[i]], {icon: flagIcon})
+                            .bindTooltip('宝洁覆盖: ' + esc(label))
+                            .addTo(layer);
+                    }
+                }
+            })();
+        {% endmacro %}
+        """)
+
+    def __init__(self, df, channel, color, detail_url=None):
+        super().__init__()
+        self._name = 'StoreLayer'
+        self.data = to_js_json(store_columns(df, lazy_popups=detail_url is not None))
+        self.channel_json = to_js_json(str(channel))
+        self.color_json = to_js_json(color)
+        self.flag_json = to_js_json(SEQ_FLAG_HTML)
+        self.detail_url_json = to_js_json(detail_url)
+
+
+class CanvasPointLayer(StorePopupMixin):
+    """
+    画布门店图层：全部门店画在同一块canvas上，坐标和样式以二进制数组（base64）嵌入页面，
+    浏览器端不为门店创建任何Leaflet对象。画布比视野大出半屏，拖动地图只是平移画布，
+    停下后才按新视野重绘；悬停和点击按像素距离查找最近的门店，显示提示和弹窗。
+    传入detail_url时页面只带门店编码，弹窗内容点击后从查询接口加载；
+    渠道的显示/隐藏由各渠道FeatureGroup中的CanvasChannelToggle控制
+    """
+
+    _template = Template(u"""
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function() {
+                var map = {{ this._parent.get_name() }};
+                var packed = {{ this.points }};
+                var codes = {{ this.codes }};
+                var details = {{ this.details }};
+                var channels = {{ this.channels_json }};
+                var colors = {{ this.colors_json }};
+                var detailUrl = {{ this.detail_url_json }};
+                var flagZoom = {{ this.flag_zoom }};
+                // 画布四周各多画出半个视野，拖动时不必重绘
+                var padding = 0.5;
+                function decode(text, Type) {
+                    var raw = atob(text), bytes = new Uint8Array(raw.length);
+                    for (var i = 0; i < raw.length; i++) {
+                        bytes[i] = raw.charCodeAt(i);
+                    }
+                    return new Type(bytes.buffer);
+                }
+
+                var lat = decode(packed.lat, Float32Array), lon = decode(packed.lon, Float32Array);
+                var channel = decode(packed.channel, Uint8Array), r10 = decode(packed.r, Uint8Array);
+                var seq = decode(packed.seq, Uint8Array);
+                var n = lat.length;
+
+                // 预先投影为0~1的Web墨卡托坐标，重绘时只需乘以当前缩放级别的比例
+                var mx = new Float64Array(n), my = new Float64Array(n);
+                for (var i = 0; i < n; i++) {
+                    var phi = Math.max(-85.0511287798, Math.min(85.0511287798, lat[i])) * Math.PI / 180;
+                    mx[i] = (lon[i] + 180) / 360;
+                    my[i] = 0.5 - Math.log(Math.tan(Math.PI / 4 + phi / 2)) / (2 * Math.PI);
+                }
+
+                // 当前画布上的门店（序号和画布坐标），供悬停和点击查找
+                var shown = new Int32Array(n), shownX = new Float32Array(n), shownY = new Float32Array(n);
+                var shownCount = 0;
+                var visible = new Uint8Array(channels.length).fill(1);
+                var dpr = window.devicePixelRatio || 1;
+
+                // 每种 (渠道, 半径, SEQ) 的圆点只画一次，重绘时整块复制
+                var sprites = [];
+                function sprite(c, r, isSeq) {
+                    var key = (c * 256 + r) * 2 + isSeq;
+                    if (!sprites[key]) {
+                        var radius = r / 10, size = Math.ceil(2 * radius + (isSeq ? 8 : 2));
+                        var canvas = document.createElement('canvas');
+                        canvas.width = canvas.height = Math.ceil(size * dpr);
+                        var ctx = canvas.getContext('2d');
+                        ctx.scale(dpr, dpr);
+                        ctx.beginPath();
+                        ctx.arc(size / 2, size / 2, radius, 0, 2 * Math.PI);
+                        ctx.fillStyle = colors[c];
+                        ctx.globalAlpha = 0.7;
+                        ctx.fill();
+                        ctx.globalAlpha = 1;
+                        ctx.strokeStyle = colors[c];
+                        ctx.lineWidth = 1;
+                        ctx.stroke();
+                        if (isSeq) {
+                            // 宝洁SEQ门店外加深红色描边
+                            ctx.beginPath();
+                            ctx.arc(size / 2, size / 2, radius + 2, 0, 2 * Math.PI);
+                            ctx.strokeStyle = '#b00020';
+                            ctx.lineWidth = 2;
+                            ctx.stroke();
+                        }
+                        sprites[key] = {canvas: canvas, size: size};
+                    }
+                    return sprites[key];
+                }
+
+                var flagSprite = (function() {
+                    var canvas = document.createElement('canvas');
+                    canvas.width = canvas.height = Math.ceil(24 * dpr);
+                    var ctx = canvas.getContext('2d');
+                    ctx.scale(dpr, dpr);
+                    ctx.font = '18px sans-serif';
+                    ctx.textAlign = 'center';
+                    ctx.textBaseline = 'bottom';
+                    ctx.shadowColor = 'rgba(0, 0, 0, 0.5)';
+                    ctx.shadowOffsetX = 1;
+                    ctx.shadowOffsetY = 1;
+                    ctx.shadowBlur = 2;
+                    ctx.fillText('🚩', 12, 24);
+                    return canvas;
+                })();
+
+                function record(i) {
+                    return {
+                        name: details.name[i], code: codes[i], addr: details.addr[i],
+                        city: details.city[i], district: details.district[i], channel: channels[channel[i]],
+                        level: details.level[i], score: details.score[i], chain: details.chain[i],
+                        seq: seq[i], seq_code: details.seq_code[i]
+                    };
+                }
+
+                function label(i) {
+                    var flag = seq[i] ? ' 🚩' : '';
+                    return esc(details ? details.name[i] : codes[i]) + ' - ' + esc(channels[channel[i]]) + flag;
+                }
+
+                var CanvasPoints = L.Layer.extend({
+                    onAdd: function(map) {
+                        // leaflet-zoom-hide：缩放动画期间隐藏画布，缩放结束后重绘
+                        this._canvas = L.DomUtil.create('canvas', 'leaflet-zoom-hide');
+                        this._canvas.style.pointerEvents = 'none';
+                        map.getPanes().overlayPane.appendChild(this._canvas);
+                        this._tooltip = L.tooltip({direction: 'top', offset: [0, -4]});
+                        this._hovered = -1;
+                        map.on('moveend resize', this._redraw, this);
+                        map.on('zoomstart', this._clearHover, this);
+                        map.on('mousemove', this._hover, this);
+                        map.on('click', this._click, this);
+                        this._redraw();
+                    },
+
+                    onRemove: function(map) {
+                        this._clearHover();
+                        L.DomUtil.remove(this._canvas);
+                        map.off('moveend resize', this._redraw, this);
+                        map.off('zoomstart', this._clearHover, this);
+                        map.off('mousemove', this._hover, this);
+                        map.off('click', this._click, this);
+                    },
+
+                    setChannel: function(index, show) {
+                        visible[index] = show ? 1 : 0;
+                        if (this._map) {
+                            this._redraw();
+                        }
+                    },
+
+                    _redraw: function() {
+                        var map = this._map, size = map.getSize();
+                        var pad = size.multiplyBy(padding).round();
+                        var width = size.x + 2 * pad.x, height = size.y + 2 * pad.y;
+                        this._origin = map.containerPointToLayerPoint([0, 0]).subtract(pad).round();
+                        L.DomUtil.setPosition(this._canvas, this._origin);
+                        this._canvas.width = Math.round(width * dpr);
+                        this._canvas.height = Math.round(height * dpr);
+                        this._canvas.style.width = width + 'px';
+                        this._canvas.style.height = height + 'px';
+                        this._clearHover();
+
+                        var scale = map.options.crs.scale(map.getZoom()), pixelOrigin = map.getPixelOrigin();
+                        var ox = pixelOrigin.x + this._origin.x, oy = pixelOrigin.y + this._origin.y;
+                        shownCount = 0;
+                        for (var i = 0; i < n; i++) {
+                            if (!visible[channel[i]]) {
+                                continue;
+                            }
+                            var x = mx[i] * scale - ox, y = my[i] * scale - oy;
+                            if (x < -10 || y < -10 || x > width + 10 || y > height + 30) {
+                                continue;
+                            }
+                            shown[shownCount] = i;
+                            shownX[shownCount] = x;
+                            shownY[shownCount] = y;
+                            shownCount++;
+                        }
+
+                        var ctx = this._canvas.getContext('2d');
+                        ctx.setTransform(dpr, 0, 0, dpr, 0, 0);
+                        // 先画普通门店，再把SEQ门店和小旗子画在上面
+                        for (var pass = 0; pass < 2; pass++) {
+                            for (var k = 0; k < shownCount; k++) {
+                                var j = shown[k];
+                                if (seq[j] !== pass) {
+                                    continue;
+                                }
+                                var s = sprite(channel[j], r10[j], seq[j]);
+                                ctx.drawImage(s.canvas, Math.round(shownX[k] - s.size / 2), Math.round(shownY[k] - s.size / 2), s.size, s.size);
+                            }
+                        }
+                        if (map.getZoom() >= flagZoom) {
+                            for (var f = 0; f < shownCount; f++) {
+                                if (seq[shown[f]]) {
+                                    ctx.drawImage(flagSprite, Math.round(shownX[f] - 12), Math.round(shownY[f] - 24), 24, 24);
+                                }
+                            }
+                        }
+                    },
+
+                    // 返回鼠标位置（图层坐标）处最近的门店序号，没有时返回-1
+                    _hit: function(layerPoint) {
+                        var x = layerPoint.x - this._origin.x, y = layerPoint.y - this._origin.y;
+                        var best = -1, bestDist = Infinity;
+                        for (var k = 0; k < shownCount; k++) {
+                            var dx = shownX[k] - x, dy = shownY[k] - y, dist = dx * dx + dy * dy;
+                            var reach = r10[shown[k]] / 10 + 3;
+                            if (dist <= reach * reach && dist < bestDist) {
+                                best = shown[k];
+                                bestDist = dist;
+                            }
+                        }
+                        return best;
+                    },
+
+                    _clearHover: function() {
+                        if (this._hovered >= 0) {
+                            this._map.closeTooltip(this._tooltip);
+                            this._map.getContainer().style.cursor = '';
+                            this._hovered = -1;
+                        }
+                    },
+
+                    // 鼠标移动时每帧最多查找一次
+                    _hover: function(e) {
+                        this._hoverPoint = e.layerPoint;
+                        if (this._hoverFrame) {
+                            return;
+                        }
+                        this._hoverFrame = L.Util.requestAnimFrame(function() {
+                            this._hoverFrame = null;
+                            if (!this._map) {
+                                return;
+                            }
+                            var i = this._hit(this._hoverPoint);
+                            if (i === this._hovered) {
+                                return;
+                            }
+                            this._clearHover();
+                            if (i >= 0) {
+                                this._hovered = i;
+                                this._map.getContainer().style.cursor = 'pointer';
+                                this._map.openTooltip(this._tooltip.setContent(label(i)), L.latLng(lat[i], lon[i]));
+                            }
+                        }, this);
+                    },
+
+                    _click: function(e) {
+                        var i = this._hit(e.layerPoint);
+                        if (i < 0) {
+                            return;
+                        }
+                        var popup = L.popup({maxWidth: 300}).setLatLng(L.latLng(lat[i], lon[i]));
+                        if (detailUrl) {
+                            popup.setContent('门店信息加载中...').openOn(this._map);
+                            loadStorePopup(popup, detailUrl, codes[i]);
+                        } else {
+                            popup.setContent(storePopupHtml(record(i))).openOn(this._map);
+                        }
+                    }
+                });
+
+                return new CanvasPoints().addTo(map);
+            })();
+        {% endmacro %}
+        """)
+
+    def __init__(self, df, detail_url=None, colors=CHANNEL_COLORS, flag_zoom=CANVAS_FLAG_ZOOM):
+        super().__init__()
+        self._name = 'CanvasPointLayer'
+        df = df[df['一级渠道'].notna()]
+        channel = pd.Categorical(df['一级渠道'].astype(str))
+        self.channels = [str(c) for c in channel.categories]
+        self.points = to_js_json({
+            "lat": pack_array(df['纬度'], np.float32),
+            "lon": pack_array(df['经度'], np.float32),
+            "channel": pack_array(channel.codes, np.uint8),
+            "r": pack_array(np.round(np.nan_to_num(marker_radius(df), nan=2) * 10), np.uint8),
+            "seq": pack_array(has_pg_seq(df), np.uint8),
+        })
+        self.codes = to_js_json(_text_column(df['门店编码']))
+        self.details = to_js_json(None if detail_url else store_details(df))
+        self.channels_json = to_js_json(self.channels)
+        self.colors_json = to_js_json([colors.get(c, 'gray') for c in self.channels])
+        self.detail_url_json = to_js_json(detail_url)
+        self.flag_zoom = flag_zoom
+
+
+class CanvasChannelToggle(MacroElement):
+    """
+    画布门店图层的渠道开关：放在渠道FeatureGroup中，
+    在图层控制面板中勾选/取消该渠道时显示/隐藏画布上对应的门店
+    """
+
+    _template = Template(u"""
+        {% macro script(this, kwargs) %}
+            (function() {
+                var group = {{ this._parent.get_name() }};
+                var points = {{ this.points.get_name() }};
+                var index = {{ this.index }};
+                group.on('add', function() { points.setChannel(index, true); });
+                group.on('remove', function() { points.setChannel(index, false); });
+            })();
+        {% endmacro %}
+        """)
+
+    def __init__(self, points, channel):
+        super().__init__()
+        self._name = 'CanvasChannelToggle'
+        self.points = points
+        self.index = points.channels.index(str(channel))
+
+
+class StoreTileLayer(StorePopupMixin):
+    """
+    按视野加载的门店图层：浏览器只请求当前可见瓦片的GeoJSON，
+    瓦片移出视野后对应的圆点随之移除；瓦片中的聚合点显示为带门店数的圆圈，
+    单个门店的弹窗内容点击后从 detail_url 加载
+    """
+
+    _template = Template(u"""
+        {% macro script(this, kwargs) %}
+            (function() {
+                var layer = {{ this._parent.get_name() }};
+                var urlTemplate = {{ this.url_json }};
+                var detailUrl = {{ this.detail_url_json }};
+                var tileFeatures = {};
+                // 聚合点：圆圈大小随门店数增长，点击后放大两级展开
+                function clusterMarker(p, latlng) {
+                    var size = Math.round(24 + 8 * Math.log10(p.count));
+                    var avg = (p.score_sum / p.count).toFixed(2);
+                    return L.marker(latlng, {
+                        icon: L.divIcon({
+                            html: '<div style="width: ' + size + 'px; height: ' + size + 'px; line-height: ' + size + 'px;'
+                                + ' border-radius: 50%; background: rgba(31, 119, 180, 0.75); color: #fff;'
+                                + ' text-align: center; font-size: 12px; font-weight: bold;">' + p.count + '</div>',
+                            iconSize: [size, size],
+                            iconAnchor: [size / 2, size / 2],
+                            className: 'empty'
+                        })
+                    })
+                        .bindTooltip('门店 ' + p.count + ' 家 | 平均卖力值 ' + avg + ' | 宝洁SEQ ' + p.seq_count + ' 家 🚩')
+                        .on('click', function(e) {
+                            var map = layer._map;
+                            map.setView(e.latlng, map.getZoom() + 2);
+                        });
+                }
+
+                var StoreTiles = L.GridLayer.extend({
+                    createTile: function(coords, done) {
+                        var key = coords.z + '/' + coords.x + '/' + coords.y;
+                        var url = L.Util.template(urlTemplate, coords);
+                        var tile = L.DomUtil.create('div');
+                        fetch(url)
+                            .then(function(resp) { return resp.json(); })
+                            .then(function(data) {
+                                // 请求返回前瓦片已移出视野
+                                if (!tile.parentNode) {
+                                    done(null, tile);
+                                    return;
+                                }
+                                tileFeatures[key] = L.geoJSON(data, {
+                                    pointToLayer: function(feature, latlng) {
+                                        var p = feature.properties;
+                                        if (p.cluster) {
+                                            return clusterMarker(p, latlng);
+                                        }
+                                        var flag = p.seq ? ' 🚩' : '';
+                                        var marker = L.circleMarker(latlng, {
+                                            radius: p.r,
+                                            color: p.color,
+                                            fill: true,
+                                            fillColor: p.color,
+                                            fillOpacity: 0.7,
+                                            weight: p.seq ? 2 : 1
+                                        }).bindTooltip(esc(p.name) + ' - ' + esc(p.channel) + flag);
+                                        return bindLazyPopup(marker, detailUrl, p.code);
+                                    }
+                                }).addTo(layer);
+                                done(null, tile);
+                            })
+                            .catch(function(err) { done(err, tile); });
+                        return tile;
+                    }
+                });
+
+                var tiles = new StoreTiles({tileSize: 256, updateWhenIdle: true});
+                tiles.on('tileunload', function(e) {
+                    var key = e.coords.z + '/' + e.coords.x + '/' + e.coords.y;
+                    if (tileFeatures[key]) {
+                        layer.removeLayer(tileFeatures[key]);
+                        delete tileFeatures[key];
+                    }
+                });
+                tiles.addTo(layer);
+            })();
+        {% endmacro %}
+        """)
+
+    def __init__(self, url_template, detail_url):
+        super().__init__()
+        self._name = 'StoreTileLayer'
+        self.url_json = to_js_json(url_template)
+        self.detail_url_json = to_js_json(detail_url)
+
+
+class ChangeLayer(StorePopupMixin):
+    """
+    版本变化图层：新增/删除/变更的门店以不同颜色的空心圆标出，弹窗显示变更字段
+    """
+
+    _template = Template(u"""
+        {% macro script(this, kwargs) %}
+            (function() {
+                var data = {{ this.data }};
+                var layer = {{ this._parent.get_name() }};
+                var colors = {{ this.colors_json }};
+                var labels = {{ this.labels_json }};
+                for (var i = 0; i < data.lat.length; i++) {
+                    var kind = data.kind[i];
+                    var html = '<div style="width: 260px;">'
+                        + '<h4>' + esc(data.name[i]) + '</h4>'
+                        + '<p><strong>门店编码:</strong> ' + esc(data.code[i]) + '</p>'
+                        + '<p><strong>变化:</strong> ' + esc(labels[kind]) + '</p>';
+                    if (data.fields[i]) {
+                        html += '<p><strong>变更字段:</strong> ' + esc(data.fields[i]) + '</p>';
+                    }
+                    L.circleMarker([data.lat[i], data.lon[i]], {
+                        radius: 9,
+                        color: colors[kind],
+                        weight: 3,
+                        fill: false,
+                        dashArray: kind === 'removed' ? '4 3' : null
+                    }).bindTooltip(esc(labels[kind]) + ': ' + esc(data.name[i]))
+                      .bindPopup(html + '</div>', {maxWidth: 280})
+                      .addTo(layer);
+                }
+            })();
+        {% endmacro %}
+        """)
+
+    def __init__(self, changes, colors, labels):
+        super().__init__()
+        self._name = 'ChangeLayer'
+        self.data = to_js_json({
+            "lat": _coord_column(changes['纬度']),
+            "lon": _coord_column(changes['经度']),
+            "kind": _text_column(changes['变更类型']),
+            "name": _text_column(changes['门店名称']),
+            "code": _text_column(changes['门店编码']),
+            "fields": _text_column(changes['变更字段']),
+        })
+        self.colors_json = to_js_json(colors)
+        self.labels_json = to_js_json(labels)
+
+
+class HubCoverageLayer(StorePopupMixin):
+    """
+    Hub覆盖图层：每个Hub画一个以平均覆盖距离为半径的圆，弹窗显示门店数和平均/最大距离
+    """
+
+    _template = Template(u"""
+        {% macro script(this, kwargs) %}
+            (function() {
+                var data = {{ this.data }};
+                var layer = {{ this._parent.get_name() }};
+                var color = {{ this.color_json }};
+                for (var i = 0; i < data.lat.length; i++) {
+                    var html = '<div style="width: 260px;">'
+                        + '<h5>' + esc(data.name[i]) + '</h5>'
+                        + '<p><b>Address:</b> ' + esc(data.addr[i]) + '</p>'
+                        + '<p><b>Hub Type:</b> ' + esc(data.type[i]) + '</p>'
+                        + '<p><b>最近门店数:</b> ' + data.count[i] + '（覆盖半径内 ' + data.within[i] + '）</p>'
+                        + '<p><b>Hub 平均覆盖距离:</b> ' + data.mean[i] + ' km</p>'
+                        + '<p><b>最大距离:</b> ' + data.max[i] + ' km</p>'
+                        + '</div>';
+                    if (data.mean[i] > 0) {
+                        L.circle([data.lat[i], data.lon[i]], {
+                            radius: data.mean[i] * 1000,
+                            color: color,
+                            weight: 0.5,
+                            opacity: 1,
+                            fill: false
+                        }).bindPopup(html, {maxWidth: 300}).addTo(layer);
+                    }
+                    L.circleMarker([data.lat[i], data.lon[i]], {
+                        radius: 6,
+                        color: color,
+                        weight: 2,
+                        fill: true,
+                        fillColor: 'white',
+                        fillOpacity: 1
+                    }).bindTooltip(esc(data.type[i]) + ': ' + esc(data.name[i]))
+                      .bindPopup(html, {maxWidth: 300})
+                      .addTo(layer);
+                }
+            })();
+        {% endmacro %}
+        """)
+
+    def __init__(self, stats, color):
+        super().__init__()
+        self._name = 'HubCoverageLayer'
+        self.data = to_js_json({
+            "lat": _coord_column(stats['纬度']),
+            "lon": _coord_column(stats['经度']),
+            "name": _text_column(stats['Hub名称']),
+            "addr": _text_column(stats['Hub地址']),
+            "type": _text_column(stats['Hub类型']),
+            "count": stats['门店数'].astype(int).tolist(),
+            "within": stats['覆盖门店数'].astype(int).tolist(),
+            "mean": stats['平均距离'].astype(float).tolist(),
+            "max": stats['最大距离'].astype(float).tolist(),
+        })
+        self.color_json = to_js_json(color)
+
+
+class HubLinkLayer(StorePopupMixin):
+    """
+    门店到最近Hub的连线图层：覆盖半径内的门店用Hub颜色连线，未覆盖的门店标红
+    """
+
+    _template = Template(u"""
+        {% macro script(this, kwargs) %}
+            (function() {
+                var data = {{ this.data }};
+                var layer = {{ this._parent.get_name() }};
+                var color = {{ this.color_json }};
+                for (var i = 0; i < data.lat.length; i++) {
+                    var lineColor = data.covered[i] ? color : 'red';
+                    L.polyline([[data.lat[i], data.lon[i]], [data.hub_lat[i], data.hub_lon[i]]], {
+                        weight: 1,
+                        color: lineColor
+                    }).addTo(layer);
+                    if (!data.covered[i]) {
+                        L.circleMarker([data.lat[i], data.lon[i]], {
+                            radius: 3,
+                            color: 'red',
+                            weight: 1,
+                            fill: true,
+                            fillColor: 'red',
+                            fillOpacity: 1
+                        }).bindTooltip(esc(data.name[i]) + '：距 ' + esc(data.hub[i]) + ' ' + data.distance[i] + ' km')
+                          .addTo(layer);
+                    }
+                }
+            })();
+        {% endmacro %}
+        """)
+
+    def __init__(self, links, color):
+        super().__init__()
+        self._name = 'HubLinkLayer'
+        self.data = to_js_json({
+            "lat": _coord_column(links['纬度']),
+            "lon": _coord_column(links['经度']),
+            "hub_lat": _coord_column(links['Hub纬度']),
+            "hub_lon": _coord_column(links['Hub经度']),
+            "name": _text_column(links['门店名称']),
+            "hub": _text_column(links['Hub名称']),
+            "distance": np.round(links['距离'].to_numpy(dtype=float), 2).tolist(),
+            "covered": links['已覆盖'].astype(int).tolist(),
+        })
+        self.color_json = to_js_json(color)
+
+
+class ZoomLevelGeoJson(MacroElement):
+    """
+    按缩放级别切换GeoJson图层的几何：levels为 {缩放级别: 该级别简化后的GeoJSON}，
+    initial为图层本身已嵌入的级别（不再重复嵌入）。
+    缩放结束后选用不低于当前缩放级别的最粗一级，超过最高级别时使用最精细的一级；
+    要素id不变，图层的样式、高亮和提示沿用
+    """
+
+    _template = Template(u"""
+        {% macro script(this, kwargs) %}
+            (function() {
+                var levels = {{ this.data }};
+                var layer = {{ this._parent.get_name() }};
+                var zooms = Object.keys(levels).map(Number).sort(function(a, b) { return a - b; });
+                var current = {{ this.initial }};
+                var map = null, features = [];
+                layer.eachLayer(function(l) { features.push(l.feature); });
+                levels[current] = {type: 'FeatureCollection', features: features};
+
+                function update() {
+                    var z = Math.round(map.getZoom());
+                    var level = zooms[zooms.length - 1];
+                    for (var i = zooms.length - 1; i >= 0; i--) {
+                        if (zooms[i] >= z) { level = zooms[i]; }
+                    }
+                    if (level !== current) {
+                        layer.clearLayers();
+                        layer.addData(levels[level]);
+                        current = level;
+                    }
+                }
+
+                function attach() { map = layer._map; map.on('zoomend', update); update(); }
+                layer.on('add', attach);
+                layer.on('remove', function() { if (map) { map.off('zoomend', update); } });
+                if (layer._map) {
+                    attach();
+                }
+            })();
+        {% endmacro %}
+        """)
+
+    def __init__(self, levels, initial):
+        super().__init__()
+        self._name = 'ZoomLevelGeoJson'
+        self.data = to_js_json({str(zoom): None if zoom == initial else geojson for zoom, geojson in levels.items()})
+        self.initial = int(initial)
+
+
+class DensityHeatLayer(JSCSSMixin, MacroElement):
+    """
+    多级密度热力图：服务端按缩放级别预先合并好的网格以列数组嵌入页面，
+    浏览器端按当前缩放级别选用对应网格，超过最高级别时按比例放大半径
+    """
+
+    _template = Template(u"""
+        {% macro script(this, kwargs) %}
+            (function() {
+                var levels = {{ this.data }};
+                var layer = {{ this._parent.get_name() }};
+                var radius = {{ this.radius }}, blur = {{ this.blur }};
+                var zooms = Object.keys(levels).map(Number).sort(function(a, b) { return a - b; });
+                // 每个网格已按级别合并，关闭leaflet.heat按缩放衰减强度（maxZoom: 0）
+                var heat = L.heatLayer([], {radius: radius, blur: blur, maxZoom: 0, max: 1.0, minOpacity: 0.3});
+                var map = null, current = null;
+
+                function update() {
+                    var z = Math.round(map.getZoom());
+                    var level = zooms[0];
+                    for (var i = 0; i < zooms.length; i++) {
+                        if (zooms[i] <= z) { level = zooms[i]; }
+                    }
+                    var scale = Math.pow(2, Math.max(0, z - level));
+                    heat.setOptions({radius: radius * scale, blur: blur * scale});
+                    if (level !== current) {
+                        var cells = levels[level], points = new Array(cells.w.length);
+                        for (var j = 0; j < points.length; j++) {
+                            points[j] = [cells.lat[j], cells.lon[j], cells.w[j]];
+                        }
+                        heat.setLatLngs(points);
+                        current = level;
+                    }
+                }
+
+                heat.on('add', function() { map = heat._map; map.on('zoomend', update); update(); });
+                heat.on('remove', function() { if (map) { map.off('zoomend', update); } });
+                if (zooms.length) {
+                    heat.addTo(layer);
+                }
+            })();
+        {% endmacro %}
+        """)
+
+    default_js = HeatMap.default_js
+
+    def __init__(self, levels, radius=12, blur=10):
+        super().__init__()
+        self._name = 'DensityHeatLayer'
+        self.data = to_js_json({str(zoom): cells for zoom, cells in levels.items()})
+        self.radius = radius
+        self.blur = blur
@@ -0,0 +1,567 @@
+import math
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from data_loader import DATA_FILE, _normalize_types, cache_path
+from store_schema import apply_schema, as_float64, canonical_column, memory_mb, plain_schema
+
+# 每批读取的行数，画像过程的内存占用与该值成正比而不是与总行数成正比
+BATCH_ROWS = 50_000
+
+# 门店主键列，用于检查编码唯一性
+KEY_COLUMN = '门店编码'
+
+# 预览保留的行数 / 每列保留的非空样例数
+PREVIEW_ROWS = 5
+
+
+def _hash_values(values):
+    """
+    返回值数组的64位哈希；数值统一按float64、文本统一按字符串计算，
+    使Excel与列式缓存两种来源的结果一致
+    """
+    return pd.util.hash_array(values, categorize=False)
+
+
+def _bit_length(x):
+    n = np.zeros(len(x), dtype=np.uint8)
+    for shift in (32, 16, 8, 4, 2, 1):
+        big = x >= (np.uint64(1) << np.uint64(shift))
+        n[big] += shift
+        x = np.where(big, x >> np.uint64(shift), x)
+    return n + (x > 0)
+
+
+class Moments:
+    """
+    Welford均值/方差累加器，分批统计后按Chan公式合并
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def _combine(self, n, mean, m2):
+        if n == 0:
+            return
+        total = self.n + n
+        delta = mean - self.mean
+        self.m2 += m2 + delta * delta * self.n * n / total
+        self.mean += delta * n / total
+        self.n = total
+
+    def update(self, values):
+        if len(values):
+            mean = float(values.mean())
+            self._combine(len(values), mean, float(((values - mean) ** 2).sum()))
+
+    def merge(self, other):
+        self._combine(other.n, other.mean, other.m2)
+
+    @property
+    def std(self):
+        # 样本标准差，与pandas的std()一致
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else float("nan")
+
+
+class QuantileSketch:
+    """
+    KLL分位数草图：第h层的每个元素代表2^h个原始值，
+    某层超出容量时排序后隔一个取一个提升到上一层。未发生压缩时结果精确
+    """
+
+    def __init__(self, k=1024):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(0)
+
+    def _capacity(self, h):
+        depth = len(self.levels) - 1 - h
+        return max(8, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            level = self.levels[h]
+            if len(level) > self._capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                level = np.sort(level)
+                # 奇数个时保留最后一个元素在本层
+                keep = level[len(level) - len(level) % 2:]
+                offset = int(self._rng.integers(2))
+                promoted = level[offset:len(level) - len(level) % 2:2]
+                self.levels[h] = keep
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+            h += 1
+
+    def update(self, values):
+        if len(values):
+            self.levels[0] = np.concatenate([self.levels[0], values])
+            self.n += len(values)
+            self._compress()
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, level in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], level])
+        self.n += other.n
+        self._compress()
+
+    @property
+    def exact(self):
+        return len(self.levels) == 1
+
+    def quantile(self, q):
+        if self.n == 0:
+            return float("nan")
+        if self.exact:
+            return float(np.quantile(self.levels[0], q))
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        cumulative = np.cumsum(weights[order])
+        pos = np.searchsorted(cumulative, q * cumulative[-1], side="left")
+        return float(values[order][min(pos, len(values) - 1)])
+
+
+class HyperLogLog:
+    """
+    HyperLogLog去重计数，合并时对寄存器逐位取最大值
+    """
+
+    def __init__(self, p=14):
+        self.p = p
+        self.registers = np.zeros(1 << p, dtype=np.uint8)
+
+    def update(self, hashes):
+        if not len(hashes):
+            return
+        tail_bits = 64 - self.p
+        index = (hashes >> np.uint64(tail_bits)).astype(np.int64)
+        tail = hashes & np.uint64((1 << tail_bits) - 1)
+        rank = (tail_bits - _bit_length(tail) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            # 小基数时使用线性计数修正
+            return int(round(m * math.log(m / zeros)))
+        return int(round(raw))
+
+
+class HeavyHitters:
+    """
+    高频值计数：取值个数不超过capacity时计数精确；
+    超出后只保留计数最高的capacity个值（计数相同时保留先出现的），此后的计数为下界
+    """
+
+    def __init__(self, capacity=2048):
+        self.capacity = capacity
+        self.counts = Counter()
+        self.exact = True
+
+    def _trim(self):
+        if len(self.counts) > self.capacity:
+            self.counts = Counter(dict(self.counts.most_common(self.capacity)))
+            self.exact = False
+
+    def update(self, values):
+        self.counts.update(pd.Series(values).value_counts(sort=False).to_dict())
+        self._trim()
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+        self.exact = self.exact and other.exact
+        self._trim()
+
+    def top(self, n=None):
+        return self.counts.most_common(n)
+
+
+class HashSet:
+    """
+    64位哈希的精确集合，用于主键和整行的重复检查（每行8字节）
+    """
+
+    def __init__(self):
+        self.parts = []
+        self.n = 0
+
+    def update(self, hashes):
+        self.parts.append(np.asarray(hashes, dtype=np.uint64))
+        self.n += len(hashes)
+        if len(self.parts) > 16:
+            self.parts = [np.unique(np.concatenate(self.parts))]
+
+    def merge(self, other):
+        self.parts.extend(other.parts)
+        self.n += other.n
+
+    def distinct(self):
+        if not self.parts:
+            return 0
+        self.parts = [np.unique(np.concatenate(self.parts))]
+        return len(self.parts[0])
+
+    def duplicates(self):
+        return self.n - self.distinct()
+
+
+def _column_values(series):
+    """
+    返回 (非空值数组, 是否数值)：数值统一为float64、文本统一为字符串；空批次返回的类型为None
+    """
+    values = series.dropna()
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype(values.cat.categories.dtype)
+    if not len(values):
+        return values.to_numpy(), None
+    if pd.api.types.is_bool_dtype(values):
+        return values.astype(str).to_numpy(dtype=object), False
+    if pd.api.types.is_numeric_dtype(values):
+        return as_float64(values), True
+    if pd.api.types.infer_dtype(values, skipna=True) in ("integer", "floating", "mixed-integer-float"):
+        return values.to_numpy(dtype=float), True
+    return values.astype(str).to_numpy(dtype=object), False
+
+
+def _display_values(values, numeric):
+    if numeric and np.all(np.mod(values, 1) == 0):
+        return values.astype(np.int64)
+    return values
+
+
+class ColumnProfile:
+    """
+    单列画像：一次遍历同时累计计数、空值、极值、均值/标准差、中位数、去重数、高频值和样例
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.nulls = 0
+        self.numeric = None
+        self.min = math.inf
+        self.max = -math.inf
+        self.moments = Moments()
+        self.sketch = QuantileSketch()
+        self.hll = HyperLogLog()
+        self.heavy = HeavyHitters()
+        self.head = []
+
+    def update(self, series):
+        values, numeric = _column_values(series)
+        self.count += len(values)
+        self.nulls += len(series) - len(values)
+        if numeric is None:
+            return
+        self.numeric = numeric if self.numeric is None else self.numeric and numeric
+        display = _display_values(values, numeric)
+        if len(self.head) < PREVIEW_ROWS:
+            self.head.extend(display[:PREVIEW_ROWS - len(self.head)].tolist())
+        self.hll.update(_hash_values(values))
+        self.heavy.update(display)
+        if numeric:
+            self.min = min(self.min, float(values.min()))
+            self.max = max(self.max, float(values.max()))
+            self.moments.update(values)
+            self.sketch.update(values)
+
+    def merge(self, other):
+        """
+        合并同一列的另一部分画像（other的行在self之后）
+        """
+        self.count += other.count
+        self.nulls += other.nulls
+        if other.numeric is not None:
+            self.numeric = other.numeric if self.numeric is None else self.numeric and other.numeric
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.moments.merge(other.moments)
+        self.sketch.merge(other.sketch)
+        self.hll.merge(other.hll)
+        self.heavy.merge(other.heavy)
+        self.head = (self.head + other.head)[:PREVIEW_ROWS]
+
+    @property
+    def rows(self):
+        return self.count + self.nulls
+
+    @property
+    def mean(self):
+        return self.moments.mean if self.moments.n else float("nan")
+
+    @property
+    def std(self):
+        return self.moments.std
+
+    @property
+    def median(self):
+        return self.sketch.quantile(0.5)
+
+    @property
+    def distinct(self):
+        # 高频值计数精确时即为精确去重数，否则使用HyperLogLog估算
+        # （估算值不超过非空值个数，也不少于高频值表中保留的取值个数）
+        if self.heavy.exact:
+            return len(self.heavy.counts)
+        return min(max(self.hll.estimate(), len(self.heavy.counts)), self.count)
+
+    @property
+    def distinct_exact(self):
+        return self.heavy.exact
+
+    def top(self, n=None):
+        return self.heavy.top(n)
+
+
+class TableProfile:
+    """
+    整表画像：各列画像加上行级检查（空行、重复行、主键重复）和内存估算。
+    并行画像时按列分组统计列画像，行级检查单独作为一个任务，
+    column_stats / row_checks 控制当前画像负责哪一部分
+    """
+
+    def __init__(self, columns=None, column_stats=True, row_checks=True):
+        self.rows = 0
+        self.column_stats = column_stats
+        self.row_checks = row_checks
+        self.header = None
+        self.columns = {col: ColumnProfile(col) for col in columns or []} if column_stats else {}
+        self.empty_rows = 0
+        self.row_hashes = HashSet()
+        self.key_hashes = HashSet()
+        self.preview = None
+        self.plain_bytes = 0
+        self.typed_bytes = 0
+        self.sources = []
+
+    def update(self, batch):
+        self.rows += len(batch)
+        if self.column_stats:
+            for col in batch.columns:
+                if col not in self.columns:
+                    self.columns[col] = ColumnProfile(col)
+                self.columns[col].update(batch[col])
+        if self.row_checks:
+            self._update_rows(batch)
+
+    def _update_rows(self, batch):
+        if self.header is None:
+            self.header = list(batch.columns)
+        self.empty_rows += int(batch.isna().all(axis=1).sum())
+        canonical = pd.DataFrame({
+            col: canonical_column(batch[col]) for col in batch.columns
+        })
+        self.row_hashes.update(pd.util.hash_pandas_object(canonical, index=False).to_numpy())
+        if KEY_COLUMN in batch.columns:
+            self.key_hashes.update(_hash_values(canonical[KEY_COLUMN].to_numpy()))
+
+        if self.preview is None:
+            self.preview = batch.head(PREVIEW_ROWS).reset_index(drop=True)
+        typed = apply_schema(_normalize_types(batch.copy()))
+        self.plain_bytes += memory_mb(plain_schema(typed)) * 1024 * 1024
+        self.typed_bytes += memory_mb(typed) * 1024 * 1024
+
+    def merge(self, other):
+        """
+        合并另一部分画像（other的行在self之后）
+        """
+        self.rows += other.rows
+        for col, profile in other.columns.items():
+            if col in self.columns:
+                self.columns[col].merge(profile)
+            else:
+                self.columns[col] = profile
+        self.empty_rows += other.empty_rows
+        self.row_hashes.merge(other.row_hashes)
+        self.key_hashes.merge(other.key_hashes)
+        if self.preview is None:
+            self.preview = other.preview
+        self.plain_bytes += other.plain_bytes
+        self.typed_bytes += other.typed_bytes
+        self.sources.extend(other.sources)
+        return self
+
+    def join(self, other):
+        """
+        合并同一批行上其他列分组（或行级检查）的画像
+        """
+        self.columns.update(other.columns)
+        if other.row_checks:
+            self.row_checks = True
+            self.header = other.header
+            self.empty_rows = other.empty_rows
+            self.row_hashes = other.row_hashes
+            self.key_hashes = other.key_hashes
+            self.preview = other.preview
+            self.plain_bytes = other.plain_bytes
+            self.typed_bytes = other.typed_bytes
+        if self.header is not None:
+            # 列画像按原表的列顺序排列
+            self.columns = {col: self.columns[col] for col in self.header if col in self.columns}
+        return self
+
+    def duplicate_rows(self):
+        return self.row_hashes.duplicates()
+
+    def duplicate_keys(self):
+        return self.key_hashes.duplicates()
+
+    def distinct_keys(self):
+        return self.key_hashes.distinct()
+
+
+def iter_batches(file_path=DATA_FILE, batch_rows=BATCH_ROWS, columns=None):
+    """
+    分批读取门店数据：存在列式缓存时按row group流式读取缓存，
+    否则使用openpyxl只读模式逐行读取Excel，不会把整个工作簿载入内存
+    """
+    path = Path(file_path)
+    target = cache_path(path)
+    if target.exists():
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(target)
+        for record_batch in parquet.iter_batches(batch_size=batch_rows, columns=columns):
+            yield record_batch.to_pandas()
+        return
+
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [str(col) for col in next(rows)]
+        wanted = [i for i, col in enumerate(header) if columns is None or col in columns]
+        names = [header[i] for i in wanted]
+        buffer = []
+        for row in rows:
+            buffer.append([row[i] if i < len(row) else None for i in wanted])
+            if len(buffer) >= batch_rows:
+                yield pd.DataFrame(buffer, columns=names)
+                buffer = []
+        if buffer:
+            yield pd.DataFrame(buffer, columns=names)
+    finally:
+        workbook.close()
+
+
+def read_columns(file_path=DATA_FILE):
+    """
+    只读取表头，返回列名列表
+    """
+    target = cache_path(file_path)
+    if target.exists():
+        import pyarrow.parquet as pq
+
+        return list(pq.ParquetFile(target).schema_arrow.names)
+
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        header = next(workbook.worksheets[0].iter_rows(max_row=1, values_only=True))
+        return [str(col) for col in header]
+    finally:
+        workbook.close()
+
+
+def profile_file(file_path=DATA_FILE, batch_rows=BATCH_ROWS, columns=None, row_checks=True, column_stats=True):
+    """
+    一次遍历生成门店数据画像；columns为None时统计全部列，
+    只做行级检查（column_stats=False）时需要读取全部列
+    """
+    read = columns if column_stats else None
+    profile = TableProfile(columns, column_stats=column_stats, row_checks=row_checks)
+    for batch in iter_batches(file_path, batch_rows, read):
+        profile.update(batch)
+    profile.sources.append(str(file_path))
+    return profile
+
+
+def _profile_task(args):
+    file_path, batch_rows, columns, row_checks, column_stats = args
+    return profile_file(file_path, batch_rows, columns, row_checks, column_stats)
+
+
+def split_columns(columns, groups):
+    """
+    按轮转方式将列分为不超过groups组
+    """
+    groups = max(1, min(groups, len(columns)))
+    return [columns[i::groups] for i in range(groups)]
+
+
+def plan_tasks(file_paths, jobs, batch_rows=BATCH_ROWS):
+    """
+    生成并行画像任务：文件数少于进程数时，将有列式缓存的文件按列分组，
+    并单独安排一个行级检查任务；Excel每次读取都要解析全部单元格，不做列分组
+    """
+    tasks = []
+    groups = max(1, jobs // max(1, len(file_paths)))
+    for index, file_path in enumerate(file_paths):
+        if groups > 1 and cache_path(file_path).exists():
+            for columns in split_columns(read_columns(file_path), groups):
+                tasks.append((index, (file_path, batch_rows, columns, False, True)))
+            tasks.append((index, (file_path, batch_rows, None, True, False)))
+        else:
+            tasks.append((index, (file_path, batch_rows, None, True, True)))
+    return tasks
+
+
+def profile_files(file_paths, jobs=1, batch_rows=BATCH_ROWS):
+    """
+    画像一个或多个工作簿并合并为一份结果；jobs大于1时在进程池中并行执行，
+    同一文件的列分组结果先按列拼接，各文件结果再按输入顺序合并
+    """
+    if isinstance(file_paths, (str, os.PathLike)):
+        file_paths = [file_paths]
+    file_paths = [Path(p) for p in file_paths]
+    if jobs <= 1:
+        partials = [(i, _profile_task((p, batch_rows, None, True, True))) for i, p in enumerate(file_paths)]
+    else:
+        tasks = plan_tasks(file_paths, jobs, batch_rows)
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = pool.map(_profile_task, [args for _, args in tasks])
+            partials = list(zip([index for index, _ in tasks], results))
+
+    per_file = {}
+    for index, partial in partials:
+        if index in per_file:
+            per_file[index].join(partial)
+        else:
+            per_file[index] = partial
+
+    profile = None
+    for index in sorted(per_file):
+        profile = per_file[index] if profile is None else profile.merge(per_file[index])
+    return profile
+
+
+def parse_args(description):
+    """
+    画像脚本的命令行参数：待分析的工作簿（默认为黑龙江数据）和并行进程数
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("files", nargs="*", type=Path, default=[DATA_FILE], help="待分析的Excel文件，可指定多个")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="并行进程数（默认1，即顺序执行）")
+    return parser.parse_args()
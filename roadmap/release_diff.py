@@ -0,0 +1,223 @@
+import re
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from store_schema import apply_schema, canonical_column
+
+# 门店主键列
+KEY_COLUMN = '门店编码'
+
+# 变更类型及其在地图上的颜色
+CHANGE_LABELS = {'added': '新增', 'removed': '删除', 'changed': '变更'}
+CHANGE_COLORS = {'added': 'green', 'removed': 'gray', 'changed': 'purple'}
+
+# 版本文件名：<系列名>V<YYYYMMDD>，如 黑龙江数据V20250609
+RELEASE_NAME = re.compile(r"^(.*?)[Vv](\d{8})$")
+
+# 保存变更明细时使用的附加列
+CHANGE_COLUMN = '变更类型'
+FIELDS_COLUMN = '变更字段'
+SIDE_COLUMN = '_side'
+
+
+def parse_release(file_path):
+    """
+    从文件名解析 (系列名, 发布日期)；文件名不含版本日期时发布日期为None
+    """
+    stem = Path(file_path).stem
+    match = RELEASE_NAME.match(stem)
+    if match is None:
+        return stem, None
+    try:
+        value = match.group(2)
+        return match.group(1), date(int(value[:4]), int(value[4:6]), int(value[6:]))
+    except ValueError:
+        return stem, None
+
+
+def field_hashes(df, columns):
+    """
+    返回每个字段的64位哈希（行号与df一致），数值与文本按统一形式计算，与存储类型无关
+    """
+    return pd.DataFrame({
+        col: pd.util.hash_array(canonical_column(df[col]).to_numpy(dtype=object), categorize=False)
+        for col in columns
+    }, index=df.index)
+
+
+def row_fingerprints(hashes):
+    """
+    将字段哈希合并为整行指纹
+    """
+    fingerprint = np.zeros(len(hashes), dtype=np.uint64)
+    for col in hashes.columns:
+        # 与列顺序相关的组合，避免字段互换时指纹相同
+        fingerprint = fingerprint * np.uint64(1000003) ^ hashes[col].to_numpy()
+    return fingerprint
+
+
+class ReleaseDiff:
+    """
+    两个数据版本之间按门店编码比较的结果：
+    新增门店（新版本的行）、删除门店（旧版本的行）、变更门店（新旧两个版本的行及变更字段）
+    """
+
+    def __init__(self, added, removed, changed_old, changed_new, changed_fields):
+        self.added = added
+        self.removed = removed
+        self.changed_old = changed_old
+        self.changed_new = changed_new
+        self.changed_fields = changed_fields
+
+    @property
+    def empty(self):
+        return self.added.empty and self.removed.empty and self.changed_new.empty
+
+    def summary(self):
+        return {
+            "added": len(self.added),
+            "removed": len(self.removed),
+            "changed": len(self.changed_new),
+        }
+
+    def old_rows(self):
+        """
+        旧版本中不再有效的行（删除 + 变更前）
+        """
+        return pd.concat([self.removed, self.changed_old], ignore_index=True)
+
+    def new_rows(self):
+        """
+        新版本中新出现的行（新增 + 变更后）
+        """
+        return pd.concat([self.added, self.changed_new], ignore_index=True)
+
+    def cities(self):
+        """
+        受变更影响的城市
+        """
+        return set(self.old_rows()['市'].astype(str)) | set(self.new_rows()['市'].astype(str))
+
+    def changes(self):
+        """
+        变更明细：新增/变更门店取新版本的行，删除门店取旧版本的行，附带变更类型和变更字段
+        """
+        frames = []
+        for kind, rows in (('added', self.added), ('removed', self.removed), ('changed', self.changed_new)):
+            if rows.empty:
+                continue
+            rows = rows.assign(**{CHANGE_COLUMN: kind})
+            if kind == 'changed':
+                fields = [self.changed_fields.get(code, []) for code in rows[KEY_COLUMN].astype(str)]
+                rows[FIELDS_COLUMN] = ['、'.join(f) for f in fields]
+            else:
+                rows[FIELDS_COLUMN] = ''
+            frames.append(rows)
+        if not frames:
+            return pd.DataFrame(columns=list(self.added.columns) + [CHANGE_COLUMN, FIELDS_COLUMN])
+        return apply_schema(pd.concat(frames, ignore_index=True))
+
+    def select(self, mask_fn):
+        """
+        按条件筛选各部分的行，mask_fn(df)返回布尔掩码
+        """
+        keep = lambda df: df[mask_fn(df)] if not df.empty else df
+        changed_new = keep(self.changed_new)
+        codes = set(changed_new[KEY_COLUMN].astype(str))
+        changed_old = self.changed_old[self.changed_old[KEY_COLUMN].astype(str).isin(codes)]
+        fields = {code: f for code, f in self.changed_fields.items() if code in codes}
+        return ReleaseDiff(keep(self.added), keep(self.removed), changed_old, changed_new, fields)
+
+    def to_frame(self):
+        """
+        转换为可以写入Parquet的单张表
+        """
+        frames = [
+            self.added.assign(**{SIDE_COLUMN: 'new', CHANGE_COLUMN: 'added', FIELDS_COLUMN: ''}),
+            self.removed.assign(**{SIDE_COLUMN: 'old', CHANGE_COLUMN: 'removed', FIELDS_COLUMN: ''}),
+            self.changed_old.assign(**{SIDE_COLUMN: 'old', CHANGE_COLUMN: 'changed', FIELDS_COLUMN: ''}),
+            self.changed_new.assign(**{
+                SIDE_COLUMN: 'new', CHANGE_COLUMN: 'changed',
+                FIELDS_COLUMN: ['、'.join(self.changed_fields[code]) for code in self.changed_new[KEY_COLUMN].astype(str)],
+            }),
+        ]
+        return apply_schema(pd.concat(frames, ignore_index=True))
+
+    @classmethod
+    def from_frame(cls, frame):
+        side, kind = frame[SIDE_COLUMN].astype(str), frame[CHANGE_COLUMN].astype(str)
+        rows = lambda mask: frame[mask.to_numpy()].drop(columns=[SIDE_COLUMN, CHANGE_COLUMN, FIELDS_COLUMN]).reset_index(drop=True)
+        changed = frame[((side == 'new') & (kind == 'changed')).to_numpy()]
+        fields = {
+            code: [f for f in str(value).split('、') if f]
+            for code, value in zip(changed[KEY_COLUMN].astype(str), changed[FIELDS_COLUMN])
+        }
+        return cls(
+            rows((side == 'new') & (kind == 'added')),
+            rows((side == 'old') & (kind == 'removed')),
+            rows((side == 'old') & (kind == 'changed')),
+            rows((side == 'new') & (kind == 'changed')),
+            fields,
+        )
+
+    @classmethod
+    def concat(cls, diffs):
+        diffs = list(diffs)
+        if not diffs:
+            return None
+        if len(diffs) == 1:
+            return diffs[0]
+        fields = {}
+        for diff in diffs:
+            fields.update(diff.changed_fields)
+        join = lambda parts: apply_schema(pd.concat(parts, ignore_index=True))
+        return cls(
+            join([d.added for d in diffs]),
+            join([d.removed for d in diffs]),
+            join([d.changed_old for d in diffs]),
+            join([d.changed_new for d in diffs]),
+            fields,
+        )
+
+
+def diff_releases(old, new):
+    """
+    按门店编码比较两个版本：编码只在新版本出现为新增，只在旧版本出现为删除，
+    两边都有且整行指纹不同为变更，并逐字段比较哈希得到变更字段
+    """
+    columns = [col for col in new.columns if col != KEY_COLUMN and col in old.columns]
+    old_codes = old[KEY_COLUMN].astype(str).to_numpy()
+    new_codes = new[KEY_COLUMN].astype(str).to_numpy()
+
+    # 基于哈希表判断编码是否存在（np.isin对字符串数组是排序比较，大表时很慢）
+    in_old = pd.Index(new_codes).isin(old_codes)
+    in_new = pd.Index(old_codes).isin(new_codes)
+    added = new[~in_old].reset_index(drop=True)
+    removed = old[~in_new].reset_index(drop=True)
+
+    old_common = old[in_new].reset_index(drop=True)
+    new_common = new[in_old].reset_index(drop=True)
+    # 按编码对齐两边的行（重复编码以最后一行为准）
+    old_position = pd.Series(np.arange(len(old_common)), index=old_common[KEY_COLUMN].astype(str).to_numpy())
+    old_position = old_position[~old_position.index.duplicated(keep='last')]
+    old_common = old_common.iloc[old_position.reindex(new_common[KEY_COLUMN].astype(str).to_numpy()).to_numpy()].reset_index(drop=True)
+
+    old_hashes = field_hashes(old_common, columns)
+    new_hashes = field_hashes(new_common, columns)
+    changed = row_fingerprints(old_hashes) != row_fingerprints(new_hashes)
+
+    differs = old_hashes[changed].to_numpy() != new_hashes[changed].to_numpy()
+    codes = new_common[KEY_COLUMN].astype(str).to_numpy()[changed]
+    changed_fields = {
+        code: [col for col, flag in zip(columns, row) if flag]
+        for code, row in zip(codes, differs)
+    }
+    return ReleaseDiff(
+        added, removed,
+        old_common[changed].reset_index(drop=True),
+        new_common[changed].reset_index(drop=True),
+        changed_fields,
+    )
@@ -0,0 +1,133 @@
+import math
+
+import numpy as np
+
+# 地球平均半径（千米）
+EARTH_RADIUS_KM = 6371.0088
+
+# 网格单元边长（度），约5千米
+CELL_DEGREES = 0.05
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    按球面大圆距离计算两点间的距离（千米），参数为经纬度（度），支持数组
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def parse_point(text):
+    """
+    解析"纬度, 经度"形式的坐标文本，格式不正确时返回None
+    """
+    parts = str(text).replace('，', ',').replace(' ', ',').split(',')
+    values = [p for p in parts if p]
+    if len(values) != 2:
+        return None
+    try:
+        lat, lon = float(values[0]), float(values[1])
+    except ValueError:
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+
+class SpatialIndex:
+    """
+    门店空间索引：按经纬度网格单元编号（行优先）排序门店，
+    查询时由半径求出经纬度包围盒，每个网格行对应编号上的一个连续区间，
+    只对包围盒内的候选门店计算球面距离；最近K家门店通过逐步扩大半径求得
+    """
+
+    def __init__(self, df, cell_degrees=CELL_DEGREES):
+        lat = df['纬度'].to_numpy(dtype=float)
+        lon = df['经度'].to_numpy(dtype=float)
+        valid = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+        self.size = len(df)
+        self.cell = cell_degrees
+        self.lat0 = float(lat[valid].min()) if len(valid) else 0.0
+        self.lon0 = float(lon[valid].min()) if len(valid) else 0.0
+
+        iy = np.floor((lat[valid] - self.lat0) / cell_degrees).astype(np.int64)
+        ix = np.floor((lon[valid] - self.lon0) / cell_degrees).astype(np.int64)
+        self.grid_rows = int(iy.max()) + 1 if len(valid) else 0
+        self.grid_columns = int(ix.max()) + 1 if len(valid) else 0
+        keys = iy * self.grid_columns + ix
+
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.rows = valid[order]
+        self.lat = lat[self.rows]
+        self.lon = lon[self.rows]
+
+    def _candidates(self, lat, lon, radius_km):
+        """
+        返回距离可能不超过radius_km的门店（排序后数组中的位置）
+        """
+        d = radius_km / EARTH_RADIUS_KM
+        lat_lo, lat_hi = lat - math.degrees(d), lat + math.degrees(d)
+        # 圆的经度跨度：sin(d)/cos(纬度)≥1 或包含极点时取全部经度
+        ratio = math.sin(min(d, math.pi / 2)) / max(math.cos(math.radians(lat)), 1e-12)
+        if d >= math.pi / 2 or ratio >= 1 or lat_hi >= 90 or lat_lo <= -90:
+            lon_lo, lon_hi = -180.0, 180.0
+        else:
+            dlon = math.degrees(math.asin(ratio))
+            lon_lo, lon_hi = lon - dlon, lon + dlon
+
+        iy_lo = max(0, math.floor((lat_lo - self.lat0) / self.cell))
+        iy_hi = min(self.grid_rows - 1, math.floor((lat_hi - self.lat0) / self.cell))
+        ix_lo = max(0, math.floor((lon_lo - self.lon0) / self.cell))
+        ix_hi = min(self.grid_columns - 1, math.floor((lon_hi - self.lon0) / self.cell))
+        if iy_lo > iy_hi or ix_lo > ix_hi:
+            return np.empty(0, dtype=np.int64)
+
+        row_keys = np.arange(iy_lo, iy_hi + 1, dtype=np.int64) * self.grid_columns
+        starts = np.searchsorted(self.keys, row_keys + ix_lo, side="left")
+        ends = np.searchsorted(self.keys, row_keys + ix_hi, side="right")
+        lengths = ends - starts
+        # 拼接各网格行的连续区间
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return offsets + np.arange(int(lengths.sum()))
+
+    def within(self, lat, lon, radius_km, mask=None):
+        """
+        返回距 (lat, lon) 不超过radius_km千米的门店 (行号, 距离)，按距离升序；
+        mask为与原表等长的布尔数组时只在满足条件的门店中查找
+        """
+        positions = self._candidates(float(lat), float(lon), float(radius_km))
+        if mask is not None:
+            positions = positions[mask[self.rows[positions]]]
+        distance = haversine_km(lat, lon, self.lat[positions], self.lon[positions])
+        inside = distance <= radius_km
+        positions, distance = positions[inside], distance[inside]
+        order = np.argsort(distance, kind="stable")
+        return self.rows[positions[order]], distance[order]
+
+    def nearest(self, lat, lon, k, mask=None):
+        """
+        返回距 (lat, lon) 最近的k家门店 (行号, 距离)，按距离升序；mask用法同within
+        """
+        available = len(self.rows) if mask is None else int(mask[self.rows].sum())
+        k = min(int(k), available)
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        # 半径内已有k家门店时，最近的k家必然都在该半径内
+        radius = self.cell * 111.0
+        while True:
+            rows, distance = self.within(lat, lon, radius, mask)
+            if len(rows) >= k or radius >= math.pi * EARTH_RADIUS_KM:
+                return rows[:k], distance[:k]
+            # 门店数约与半径的平方成正比
+            radius *= 2.0 if len(rows) == 0 else max(1.5, math.sqrt(k / len(rows)) * 1.2)
+
+    def search(self, lat, lon, radius_km=None, k=None, mask=None):
+        """
+        给出radius_km时按半径查询，否则查询最近的k家门店
+        """
+        if radius_km is not None:
+            return self.within(lat, lon, radius_km, mask)
+        return self.nearest(lat, lon, k, mask)
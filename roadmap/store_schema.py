@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+
+# 门店表结构版本，修改下方类型定义后需要递增，使列式缓存自动重建
+SCHEMA_VERSION = 3
+
+# 高基数文本列使用Arrow字符串，内存紧凑且支持空值
+TEXT = "string[pyarrow]"
+
+# 门店表各列的紧凑类型：低基数文本用分类类型，级别、排名和网点状态（整数编码）用小整数。
+# 分类类型只用于文本列：整数的分类类型从Parquet读回时为int64，与解析Excel得到的类型不一致。
+# 坐标和卖力值保留float64：坐标原样导出（float32只有约7位有效数字，会改变Excel中的6位小数），
+# 卖力值保证两位小数的范围筛选和聚合结果精确
+STORE_SCHEMA = {
+    '门店编码': TEXT,
+    '门店名称': TEXT,
+    '大区': 'category',
+    '省': 'category',
+    '市': 'category',
+    '区县': 'category',
+    '乡镇': 'category',
+    '村/街道': 'category',
+    '地址': TEXT,
+    '经度': 'float64',
+    '纬度': 'float64',
+    '城市级别': 'int8',
+    '一级渠道': 'category',
+    '所属连锁系统': 'category',
+    '网点状态名称': 'int8',
+    '渠道高潜排名': 'int32',
+    '卖力值': 'float64',
+    '宝洁SEQ': TEXT,
+}
+
+
+def _convert(series, dtype):
+    if dtype.startswith('int') and series.isna().any():
+        # 含空值的整数列使用可空整数类型
+        dtype = dtype.capitalize()
+    if dtype == 'category' and isinstance(series.dtype, pd.StringDtype):
+        # 可空字符串（pd.NA）的分类取值从Parquet读回时为默认的字符串类型，先还原为普通文本
+        series = series.astype(object).where(series.notna(), np.nan)
+    return series.astype(dtype)
+
+
+def apply_schema(df):
+    """
+    按 STORE_SCHEMA 转换列类型，表中不存在的列跳过，其他列保持不变
+    """
+    return df.assign(**{
+        col: _convert(df[col], dtype)
+        for col, dtype in STORE_SCHEMA.items()
+        if col in df.columns
+    })
+
+
+def plain_schema(df):
+    """
+    还原为pd.read_excel默认的通用类型（object文本、float64、int64），用于对比内存占用
+    """
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_float_dtype(series):
+            columns[col] = series.astype('float64')
+        elif pd.api.types.is_integer_dtype(series) and not series.isna().any():
+            columns[col] = series.astype('int64')
+        else:
+            columns[col] = series.astype(object).where(series.notna(), None)
+    return pd.DataFrame(columns, index=df.index)
+
+
+def memory_mb(df):
+    """
+    返回数据表的内存占用（MB，包含字符串对象本身）
+    """
+    return df.memory_usage(deep=True).sum() / 1024 / 1024
+
+
+def as_float64(values):
+    """
+    数值列转换为float64数组。紧凑类型中的浮点列（坐标、卖力值）本身就是float64，
+    整数列转换为float64不损失精度，因此Excel与列式缓存两种来源得到的数值完全相同
+    """
+    return values.to_numpy(dtype=float, na_value=np.nan)
+
+
+def canonical_column(series):
+    """
+    将一列转换为与来源和存储类型无关的形式（数值列为float64，其他列为字符串），
+    用于计算可跨Excel/缓存比较的哈希
+    """
+    values = series.astype(series.cat.categories.dtype) if isinstance(series.dtype, pd.CategoricalDtype) else series
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        return pd.Series(as_float64(values), index=values.index)
+    return values.astype(str).where(values.notna())
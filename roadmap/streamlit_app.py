@@ -7,6 +7,8 @@ from streamlit.components.v1 import html
 import plotly.express as px
 import plotly.graph_objects as go
 
+from data_loader import DATA_FILE, dataset_version, load_store_data
+
 # 设置页面配置
 st.set_page_config(
     page_title="黑龙江门店数据分析平台",
@@ -41,10 +43,10 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 @st.cache_data
-def load_data():
-    """加载Excel数据"""
+def load_data(version):
+    """加载门店数据（version变化时重新加载）"""
     try:
-        df = pd.read_excel("黑龙江数据V20250609.xlsx")
+        df = load_store_data(DATA_FILE)
         return df
     except Exception as e:
         st.error(f"数据加载失败: {e}")
@@ -161,7 +163,7 @@ def main():
     st.markdown('<h1 class="main-header">🏪 黑龙江门店数据分析平台</h1>', unsafe_allow_html=True)
     
     # 加载数据
-    df = load_data()
+    df = load_data(dataset_version(DATA_FILE))
     if df is None:
         st.stop()
     
@@ -1,12 +1,31 @@
+import time
+from contextlib import contextmanager
+
 import streamlit as st
 import pandas as pd
-import folium
-from folium import plugins
 import numpy as np
 from streamlit.components.v1 import html
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import plotly.express as px
 import plotly.graph_objects as go
 
+from boundaries import AREA_METRICS, LEVELS, Boundaries, area_stats, find_boundary_files, label_mismatches
+from coverage import DEFAULT_RADIUS_KM, HubCoverage, find_hub_files, load_hubs
+from data_cube import StoreCube, rollup, summarize
+from data_loader import dataset_version
+from density_grid import DensityGrid
+from exporter import EXPORT_FORMATS, export_to_file
+from dataset import StoreDataset
+from filter_index import ALL, FilterIndex
+from instrumentation import HISTORY_SIZE, RerunProfiler, percentiles, profiling_enabled
+import map_builder
+from map_builder import AREA_ZOOMS, CANVAS_AUTO_ROWS, RENDER_MODES, auto_render_mode, heat_levels
+from map_cache import BackgroundRenderer, MapHtmlCache, map_cache_key, prewarm
+from table_view import DISPLAY_COLUMNS, PAGE_SIZES, SortIndex, page_count
+from release_diff import CHANGE_LABELS
+from spatial_index import SpatialIndex, parse_point
+from tile_server import StoreTileIndex, filter_query, register_dataset, start_tile_server, tile_base_url
+
 # 设置页面配置
 st.set_page_config(
     page_title="黑龙江门店数据分析平台",
@@ -40,154 +59,494 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-@st.cache_data
-def load_data():
-    """加载Excel数据"""
+# 同时缓存的数据版本（分区选择）个数：数据和按数据版本构建的各索引使用相同的个数，
+# 多个会话查看不同分区或版本时不会互相淘汰对方的索引
+DATA_VERSIONS = 4
+
+@st.cache_resource
+def get_dataset():
+    """门店数据集（省级工作簿按大区/省分区存储）"""
+    return StoreDataset()
+
+@st.cache_data(max_entries=DATA_VERSIONS)
+def load_data(version, partitions):
+    """只读取所选大区/省的分区数据（version变化时重新加载）"""
     try:
-        df = pd.read_excel("roadmap/黑龙江数据V20250609.xlsx")
-        return df
+        return get_dataset().load(partitions)
     except Exception as e:
         st.error(f"数据加载失败: {e}")
         return None
 
-def create_folium_map(df_filtered):
-    """创建Folium地图"""
-    if df_filtered.empty:
+@st.cache_resource(max_entries=DATA_VERSIONS)
+def get_filter_index(version, partitions):
+    """构建门店筛选索引（每个数据版本一次）"""
+    return FilterIndex(load_data(version, partitions))
+
+@st.cache_resource(max_entries=DATA_VERSIONS)
+def get_sort_index(version, partitions):
+    """构建详细数据表格的排序索引（每个数据版本一次）"""
+    return SortIndex(load_data(version, partitions))
+
+@st.cache_resource(max_entries=DATA_VERSIONS)
+def get_density_grid(version, partitions):
+    """构建卖力值密度网格（每个数据版本一次，各筛选条件的网格在其中缓存）"""
+    return DensityGrid(load_data(version, partitions))
+
+@st.cache_resource(max_entries=DATA_VERSIONS)
+def get_spatial_index(version, partitions):
+    """构建门店空间索引（每个数据版本一次）"""
+    return SpatialIndex(load_data(version, partitions))
+
+@st.cache_data
+def load_hub_data(hub_versions):
+    """读取各类Hub主数据（hub_versions为 (Hub类型, 路径, 文件版本)，文件变化时重新读取）"""
+    return load_hubs({hub_type: path for hub_type, path, _ in hub_versions})
+
+@st.cache_resource(max_entries=DATA_VERSIONS)
+def get_hub_coverage(version, partitions, hub_versions):
+    """为每家门店分配各类型最近的Hub（每个数据版本和Hub版本一次）"""
+    return HubCoverage(load_data(version, partitions), load_hub_data(hub_versions))
+
+@st.cache_resource(max_entries=2)
+def get_boundaries(level, boundary_versions):
+    """读取某一级行政区划边界（boundary_versions为 (路径, 文件版本)，文件变化时重新读取）"""
+    return Boundaries.from_files([path for path, _ in boundary_versions], level)
+
+@st.cache_resource(max_entries=2 * DATA_VERSIONS)
+def get_store_areas(version, partitions, level, boundary_versions):
+    """门店坐标所在行政区域的序号（每个数据版本和边界版本一次）"""
+    df = load_data(version, partitions)
+    return get_boundaries(level, boundary_versions).locate(df['纬度'], df['经度'])
+
+@st.cache_resource
+def get_cube_history():
+    """各分区选择最近构建的 (数据版本, 立方体)，用于版本更新时增量构建"""
+    return {}
+
+@st.cache_resource(max_entries=DATA_VERSIONS)
+def get_data_cube(version, partitions):
+    """构建门店数据立方体（每个数据版本一次）；上一版本的立方体还在时只按变化的门店增量更新"""
+    df = load_data(version, partitions)
+    filter_index = get_filter_index(version, partitions)
+    dataset = get_dataset()
+    history = get_cube_history()
+    previous = history.get(partitions)
+    changes = dataset.changes(partitions)
+    if previous is not None and changes is not None and previous[0] == dataset.previous_version(partitions):
+        cube = previous[1].updated(df, changes.old_rows(), changes.new_rows(), filter_index)
+    else:
+        cube = StoreCube(df, filter_index)
+    history[partitions] = (version, cube)
+    return cube
+
+@st.cache_resource(max_entries=DATA_VERSIONS)
+def get_change_table(version, partitions):
+    """与上一版本相比的变更明细，没有上一版本时返回None"""
+    changes = get_dataset().changes(partitions)
+    if changes is None or changes.empty:
         return None
-    
+    return changes.changes()
+
+@st.cache_resource
+def get_tile_server():
+    """启动本地门店瓦片/查询服务（进程内共享，各数据版本分别注册）"""
+    return start_tile_server()
+
+@st.cache_resource(max_entries=DATA_VERSIONS)
+def get_tile_dataset(version, partitions):
+    """当前数据版本的瓦片查询索引（每个数据版本构建一次）"""
+    return StoreTileIndex(load_data(version, partitions))
+
+def get_tile_service(version, partitions):
+    """当前数据版本的瓦片/查询服务地址；当前浏览器无法访问瓦片服务（应用部署在其他机器上）时返回None"""
+    server = get_tile_server()
+    base_url = tile_base_url(server, st.context.headers.get("Host"))
+    if base_url is None:
+        return None
+    # 每次都注册：瓦片服务已淘汰该版本时重新加入，交给页面的地址一定可以访问
+    return base_url + register_dataset(server, version, get_tile_dataset(version, partitions))
+
+@st.cache_resource
+def get_map_cache():
+    """进程内共享的地图HTML缓存"""
+    return MapHtmlCache()
+
+@st.cache_resource
+def get_map_renderer():
+    """进程内共享的后台地图渲染（渲染结果写入地图HTML缓存）"""
+    return BackgroundRenderer(get_map_cache())
+
+def wait_for_map(renderer, build, poll=0.2):
+    """
+    等待后台地图渲染完成，期间显示占位提示并返回地图HTML。每次更新提示都是Streamlit的让出点：
+    有新的重跑请求时片段在这里被中断，本会话随即放弃这次渲染，新的渲染不必排在它后面
+    """
+    placeholder = st.empty()
+    started = time.perf_counter()
     try:
-        # 计算地图中心点
-        center_lat = df_filtered['纬度'].mean()
-        center_lon = df_filtered['经度'].mean()
-        
-        # 创建地图（使用默认图层）
-        m = folium.Map(
-            location=[center_lat, center_lon],
-            zoom_start=8,
-            tiles="OpenStreetMap"
+        while not build.done.is_set():
+            placeholder.info(f"🗺️ 地图生成中，已用 {time.perf_counter() - started:.1f} 秒……")
+            build.done.wait(poll)
+    finally:
+        if not build.done.is_set():
+            renderer.release(session_id(), build.key)
+    placeholder.empty()
+    return build.html
+
+@st.cache_resource(max_entries=DATA_VERSIONS)
+def carry_over_map_cache(version, partitions):
+    """数据版本更新后，未受变更影响的城市视图直接沿用上一版本渲染好的地图"""
+    dataset = get_dataset()
+    previous, changes = dataset.previous_version(partitions), dataset.changes(partitions)
+    if previous is None or changes is None:
+        return 0
+    affected = changes.cities()
+    # 只有快速图层（门店多时自动改用的画布点图层）的HTML不含服务地址和变化图层，只依赖所在城市的门店
+    return get_map_cache().carry_over(
+        previous, version, lambda key: key[1] in ("vectorized", "canvas") and key[2] != ALL and key[2] not in affected)
+
+def session_id():
+    """当前浏览器会话的编号（剖析日志中区分用户）"""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else None
+
+def add_profile_history(events):
+    """将一次重跑的剖析记录加入本会话的历史（只保留最近HISTORY_SIZE次），返回历史"""
+    history = st.session_state.setdefault("profile_history", [])
+    history.append(events)
+    del history[:-HISTORY_SIZE]
+    return history
+
+def show_profile(profiler):
+    """结束本次重跑的剖析，在侧边栏显示各阶段明细和本会话最近重跑的p50/p95"""
+    events = profiler.finish()
+    history = add_profile_history(events)
+    with st.sidebar.expander("⏱️ 性能剖析", expanded=True):
+        peak = events[-1]['peak_rss_mb']
+        st.caption(f"本次重跑 {events[-1]['ms']:,.0f} ms" + ("" if peak is None else f"，进程内存峰值 {peak:,.0f} MB"))
+        st.dataframe(profiler.table(), use_container_width=True, hide_index=True)
+        st.caption(f"本会话最近 {len(history)} 次重跑")
+        st.dataframe(
+            percentiles(pd.DataFrame([event for rerun in history for event in rerun]))[
+                ['次数', 'p50(ms)', 'p95(ms)', '最大(ms)']],
+            use_container_width=True,
         )
+
+@st.cache_resource(max_entries=DATA_VERSIONS)
+def prewarm_map_cache(version, partitions):
+    """
+    启动时在后台预渲染常用视图：全部门店及每个城市的全部渠道。
+    后台线程中没有页面上下文，直接调用map_builder渲染；返回渲染失败的视图列表 [(缓存键, 异常), ...]，
+    由脚本线程显示
+    """
+    filter_index = get_filter_index(version, partitions)
+    density_grid = get_density_grid(version, partitions)
+    jobs = []
+    for city in ['全部'] + filter_index.values('市'):
+        rows = filter_index.select(city)
+        mode = auto_render_mode("vectorized", filter_index.size if rows is None else len(rows))
+        render = lambda rows=rows, city=city, mode=mode: map_builder.render_map_html(
+            filter_index.take(rows), mode, heat=heat_levels(density_grid, (city,), rows))
+        jobs.append((map_cache_key(version, mode, city), render))
+    errors = []
+    prewarm(get_map_cache(), jobs, errors)
+    return errors
+
+@contextmanager
+def fragment_profile(profiler, parallel=False):
+    """
+    页面片段使用的剖析器：随整页重跑顺序执行时沿用本次重跑的剖析器；片段单独重跑（整页的剖析已经结束）
+    或与整页并行执行（parallel）时另建一个剖析器，片段结束时记为一次fragment，
+    计入本会话的重跑历史并在片段末尾显示耗时
+    """
+    if not profiler.enabled or not (profiler.finished or parallel):
+        yield profiler
+        return
+    alone = profiler.finished
+    fragment = RerunProfiler(True, profiler.session, kind="fragment")
+    yield fragment
+    events = fragment.finish()
+    add_profile_history(events)
+    st.caption(f"⏱️ 本片段{'单独重跑' if alone else '与页面其他部分并行执行'} {events[-1]['ms']:,.0f} ms")
+
+@st.cache_resource(max_entries=16)
+def get_chart_figures(version, partitions, filter_key, _cube_cells):
+    """三张统计图（按数据版本和筛选条件缓存，只改变图层等不影响图表的设置时直接复用）"""
+    data_cube = get_data_cube(version, partitions)
+    
+    # 渠道分布饼图
+    channel_counts = rollup(_cube_cells, '一级渠道')
+    fig_pie = px.pie(
+        values=channel_counts.values,
+        names=channel_counts.index,
+        title="渠道分布"
+    )
+    fig_pie.update_layout(height=400)
+    
+    # 城市级别分布
+    level_counts = rollup(_cube_cells, '城市级别').sort_index()
+    fig_bar = px.bar(
+        x=level_counts.index,
+        y=level_counts.values,
+        title="城市级别分布",
+        labels={'x': '城市级别', 'y': '门店数量'}
+    )
+    fig_bar.update_layout(height=400)
+    
+    # 卖力值分布直方图（只传分箱计数，不传明细数据）
+    bin_starts, bin_width, bin_counts = data_cube.score_histogram(_cube_cells, nbins=20)
+    fig_hist = px.bar(
+        x=bin_starts + bin_width / 2,
+        y=bin_counts,
+        title="卖力值分布",
+        labels={'x': '卖力值', 'y': '门店数量'}
+    )
+    fig_hist.update_traces(width=bin_width)
+    fig_hist.update_layout(height=400, bargap=0)
+    return fig_pie, fig_bar, fig_hist
+
+@st.fragment(parallel=True)
+def map_section(view, profiler):
+    """
+    地图片段：地图选项只影响地图，修改时只重跑本片段，不重新计算指标、图表和表格。
+    整页重跑时本片段与页面其他部分并行执行，地图在后台线程中渲染，指标、图表和表格不必等它
+    """
+    with fragment_profile(profiler, parallel=True) as profiler:
+        version, partitions = view["version"], view["partitions"]
+        selected_city, selected_channel, selected_level, value_range = view["filters"]
+        df_filtered, search, change_table = view["df_filtered"], view["search"], view["change_table"]
         
-        # 添加稳定可靠的地图图层
-        folium.TileLayer('cartodbpositron', name='CartoDB Positron').add_to(m)
-        
-        # 添加全屏插件
-        folium.plugins.Fullscreen(
-            position="topright",
-            title="Expand me",
-            title_cancel="Exit me",
-            force_separate_button=True,
-        ).add_to(m)
-        
-        # 定义渠道颜色
-        channel_colors = {
-            'MM': 'red',
-            'Grocery': 'blue', 
-            'CVS': 'green',
-            'HSM': 'orange'
-        }
+        st.markdown("### 🗺️ 门店地理分布")
         
-        # 为每个渠道创建FeatureGroup
-        channel_groups = {}
-        for channel in df_filtered['一级渠道'].unique():
-            channel_groups[channel] = folium.FeatureGroup(name=f"{channel} 渠道", show=True)
+        option_col1, option_col2, option_col3 = st.columns(3)
+        with option_col1:
+            # 地图渲染模式
+            render_label = st.selectbox("地图渲染模式", list(RENDER_MODES.keys()))
+            render_mode = RENDER_MODES[render_label]
+        with option_col2:
+            # 弹窗按需加载（快速图层模式可选，瓦片/聚合/画布模式始终按需加载）
+            lazy_popups = st.checkbox(
+                "门店弹窗按需加载",
+                value=False,
+                help="页面只携带门店编码，点击门店时再从本地查询服务加载详情，可大幅减小页面体积",
+                disabled=render_mode != "vectorized",
+            )
+        with option_col3:
+            # 版本变化图层
+            show_changes = st.checkbox(
+                "显示与上一版本的变化",
+                value=False,
+                help="在地图上标出新增（绿）、删除（灰）和信息变更（紫）的门店",
+                disabled=change_table is None,
+            )
         
-        # 按渠道分组添加门店标记
-        for channel, group in df_filtered.groupby('一级渠道'):
-            if channel in channel_groups:
-                feature_group = channel_groups[channel]
-                color = channel_colors.get(channel, 'gray')
+        if len(df_filtered) > 0:
+            # 创建地图
+            service_url = None
+            query = filter_query(selected_city, selected_channel, selected_level, value_range, search)
+            if render_mode in ("tiles", "clusters", "canvas") or lazy_popups:
+                service_url = get_tile_service(version, partitions)
+                if service_url is None:
+                    # 浏览器访问不到瓦片服务时改为把门店数据嵌入页面
+                    if render_mode in ("tiles", "clusters"):
+                        st.info("浏览器无法访问瓦片服务，已改用快速图层；"
+                                "可设置环境变量 STORE_TILE_HOST / STORE_TILE_URL 开放瓦片服务")
+                        render_mode = "vectorized"
+                    lazy_popups = False
+            if auto_render_mode(render_mode, len(df_filtered)) != render_mode:
+                # 门店太多时逐个创建圆点很慢，改用画布点图层（弹窗仍按上面的设置嵌入或按需加载）
+                st.caption(f"门店数超过{CANVAS_AUTO_ROWS:,}家，已自动改用画布点图层")
+                render_mode = auto_render_mode(render_mode, len(df_filtered))
+            
+            # 与上一版本的变化按同样的筛选条件过滤
+            changes_filtered = None
+            if show_changes and change_table is not None:
+                changes_filtered = FilterIndex(change_table).apply(
+                    selected_city, selected_channel, selected_level, value_range)
+            
+            # 相同筛选条件直接复用缓存的地图HTML，否则在后台线程中渲染
+            cache_mode = f"{render_mode}+lazy" if lazy_popups and render_mode == "vectorized" else render_mode
+            if service_url is not None:
+                # 页面中的服务地址随浏览器访问的主机名不同
+                cache_mode += f"@{service_url}"
+            if changes_filtered is not None:
+                cache_mode += "+changes"
+            cache_mode += view["layer_key"]
+            map_key = map_cache_key(version, cache_mode, selected_city, selected_channel,
+                                    selected_level, value_range, view["value_bounds"], search)
+            def render(build):
+                with profiler.stage("heat_levels"):
+                    heat = heat_levels(get_density_grid(version, partitions), view["filter_key"], view["filter_rows"])
+                build.check()
+                return map_builder.render_map_html(
+                    df_filtered, render_mode, service_url, query, lazy_popups, changes_filtered, search,
+                    view["coverage"], view["areas"], heat, profiler=profiler, checkpoint=build.check)
+            
+            renderer = get_map_renderer()
+            with profiler.stage("map") as record:
+                # 先进入map阶段再提交，后台线程中的各阶段记在map之下
+                build = renderer.submit(session_id(), map_key, render)
+                record["note"] = "缓存命中" if build.done.is_set() else "后台渲染"
+                map_html = wait_for_map(renderer, build)
+            
+            if build.error is not None:
+                st.error(f"地图创建失败: {build.error}")
+            elif map_html:
+                # 将地图HTML嵌入页面，增加高度
+                with profiler.stage("embed_map") as record:
+                    st.components.v1.html(map_html, height=800)
+                    record["bytes"] = len(map_html.encode("utf-8")) if profiler.enabled else None
                 
-                for idx, row in group.iterrows():
-                    # 检查是否有宝洁SEQ
-                    has_pg_seq = pd.notna(row['宝洁SEQ']) and str(row['宝洁SEQ']).strip() != ''
-                    
-                    # 创建弹窗内容
-                    popup_content = f"""
-                    <div style="width: 300px;">
-                        <h4>{row['门店名称']} {'🚩' if has_pg_seq else ''}</h4>
-                        <p><strong>门店编码:</strong> {row['门店编码']}</p>
-                        <p><strong>地址:</strong> {row['地址']}</p>
-                        <p><strong>城市:</strong> {row['市']} - {row['区县']}</p>
-                        <p><strong>渠道:</strong> {row['一级渠道']}</p>
-                        <p><strong>城市级别:</strong> {row['城市级别']}级</p>
-                        <p><strong>卖力值:</strong> {row['卖力值']}</p>
-                        {f"<p><strong>连锁系统:</strong> {row['所属连锁系统']}</p>" if pd.notna(row['所属连锁系统']) else ""}
-                        {f"<p><strong>宝洁SEQ:</strong> {row['宝洁SEQ']} 🚩</p>" if has_pg_seq else ""}
-                    </div>
-                    """
-                    
-                    # 缩小圆点，根据卖力值决定图标大小
-                    radius = max(2, min(6, row['卖力值'] / 15))
-                    
-                    # 添加门店圆点标记
-                    folium.CircleMarker(
-                        location=[row['纬度'], row['经度']],
-                        radius=radius,
-                        popup=folium.Popup(popup_content, max_width=300),
-                        tooltip=f"{row['门店名称']} - {row['一级渠道']} {'🚩' if has_pg_seq else ''}",
-                        color=color,
-                        fill=True,
-                        fillColor=color,
-                        fillOpacity=0.7,
-                        weight=1
-                    ).add_to(feature_group)
-                    
-                    # 如果有宝洁SEQ，添加更大的小旗子标记
-                    if has_pg_seq:
-                        folium.Marker(
-                            location=[row['纬度'], row['经度']],
-                            icon=folium.DivIcon(
-                                html='<div style="font-size: 18px; text-shadow: 1px 1px 2px rgba(0,0,0,0.5);">🚩</div>',
-                                icon_size=(24, 24),
-                                icon_anchor=(12, 24)
-                            ),
-                            tooltip=f"宝洁覆盖: {row['门店名称']}"
-                        ).add_to(feature_group)
+                # 统计有宝洁SEQ的门店数量
+                pg_seq_count = view["summary"]['seq_count']
                 
-                # 将FeatureGroup添加到地图
-                m.add_child(feature_group)
+                # 显示当前筛选结果和使用说明
+                col_info1, col_info2 = st.columns(2)
+                with col_info1:
+                    st.info(f"🔍 当前数据包含 {len(df_filtered):,} 家门店")
+                with col_info2:
+                    st.info(f"🚩 其中 {pg_seq_count:,} 家门店已有宝洁SEQ覆盖")
+                
+                st.success("🎯 使用地图右上角的图层控制面板可以切换地图样式和开关不同渠道类型的显示")
+            else:
+                st.warning("无法创建地图，请检查筛选条件")
+        else:
+            st.warning("根据当前筛选条件，没有找到匹配的门店数据")
+
+@st.fragment
+def chart_section(view, profiler):
+    """统计图表片段：只依赖筛选条件，图表按筛选条件缓存"""
+    with fragment_profile(profiler) as profiler:
+        st.markdown("### 📊 数据统计")
         
-        # 添加热力图图层（可选）
-        if len(df_filtered) > 10:
-            heat_data = [[row['纬度'], row['经度'], row['卖力值']] for idx, row in df_filtered.iterrows()]
-            heat_group = folium.FeatureGroup(name="卖力值热力图", show=False)
-            plugins.HeatMap(heat_data).add_to(heat_group)
-            m.add_child(heat_group)
+        with profiler.stage("charts") as record:
+            if len(view["df_filtered"]) > 0:
+                figures = get_chart_figures(view["version"], view["partitions"], view["filter_key"], view["cube_cells"])
+                chart_col1, chart_col2, chart_col3 = st.columns(3)
+                for column, title, fig in zip((chart_col1, chart_col2, chart_col3),
+                                              ("渠道分布", "城市级别分布", "卖力值分布"), figures):
+                    with column:
+                        st.markdown(f"#### {title}")
+                        st.plotly_chart(fig, use_container_width=True)
+                
+                if profiler.enabled:
+                    record["bytes"] = sum(len(fig.to_json().encode("utf-8")) for fig in figures)
+
+@st.fragment
+def table_section(view, profiler):
+    """数据表格片段：排序、翻页和导出格式只影响表格，修改时只重跑本片段"""
+    with fragment_profile(profiler) as profiler:
+        df_filtered = view["df_filtered"]
+        selected_city, selected_channel = view["filters"][:2]
         
-        # 添加LayerControl
-        folium.LayerControl(position='topright').add_to(m)
+        st.markdown("### 📋 详细数据")
         
-        return m
+        if len(df_filtered) == 0:
+            return
         
-    except Exception as e:
-        st.error(f"地图创建失败: {e}")
-        return None
+        # 排序和分页设置
+        table_col1, table_col2, table_col3, table_col4 = st.columns(4)
+        with table_col1:
+            sort_column = st.selectbox("排序字段", DISPLAY_COLUMNS, index=DISPLAY_COLUMNS.index('卖力值'))
+        with table_col2:
+            sort_order = st.selectbox("排序方式", ["降序", "升序"])
+        with table_col3:
+            page_size = st.selectbox("每页行数", PAGE_SIZES, index=PAGE_SIZES.index(100))
+        
+        total_pages = page_count(len(df_filtered), page_size)
+        # 筛选条件变化后页数可能变少
+        if st.session_state.get("table_page", 1) > total_pages:
+            st.session_state["table_page"] = total_pages
+        with table_col4:
+            page = st.number_input("页码", min_value=1, max_value=total_pages, step=1, key="table_page")
+        
+        # 数据表格（只取当前页，排序使用预建的排序索引）
+        with profiler.stage("table") as record:
+            page_df = get_sort_index(view["version"], view["partitions"]).page(
+                view["filter_key"], view["filter_rows"], sort_column, sort_order == "升序", int(page), page_size)
+            st.dataframe(
+                page_df,
+                use_container_width=True,
+                height=400
+            )
+            record["rows"] = len(page_df)
+        
+        st.caption(f"第 {int(page)} / {total_pages} 页，共 {len(df_filtered):,} 条记录")
+        
+        # 下载按钮（点击时才分块生成导出文件）
+        export_format = st.selectbox("导出格式", list(EXPORT_FORMATS.keys()))
+        export_info = EXPORT_FORMATS[export_format]
+        
+        def export_data():
+            # 点击下载时在单独的请求中执行，剖析结果单独记为一次download
+            export_profiler = RerunProfiler(profiler.enabled, profiler.session, kind="download")
+            with export_profiler.stage("export", rows=len(df_filtered), note=export_format) as record:
+                fileobj = export_to_file(df_filtered, export_format)
+                record["bytes"] = fileobj.seek(0, 2)
+                fileobj.seek(0)
+            export_profiler.finish()
+            return fileobj
+        
+        # data传入函数时点击后才生成文件（需要Streamlit 1.52及以上）
+        st.download_button(
+            label=f"📥 下载筛选后的数据 ({export_format})",
+            data=export_data,
+            file_name=f"门店数据_{selected_city}_{selected_channel}{export_info['suffix']}",
+            mime=export_info['mime'],
+            on_click="ignore"
+        )
 
 def main():
+    # 性能剖析（页面地址加 ?profile=1 或设置环境变量 STORE_APP_PROFILE=1 时开启）
+    profiler = RerunProfiler(profiling_enabled(st.query_params), session_id())
+    
     # 页面标题
     st.markdown('<h1 class="main-header">🏪 黑龙江门店数据分析平台</h1>', unsafe_allow_html=True)
     
-    # 加载数据
-    df = load_data()
-    if df is None:
-        st.stop()
+    # 同步省级工作簿（只解析新增或修改过的文件）
+    dataset = get_dataset()
+    with profiler.stage("refresh"):
+        dataset.refresh()
     
     # 侧边栏筛选器
     st.sidebar.markdown("## 📊 数据筛选")
     
+    # 大区/省筛选决定读取哪些分区
+    selected_region = st.sidebar.selectbox("选择大区", [ALL] + dataset.regions())
+    selected_province = st.sidebar.selectbox("选择省份", [ALL] + dataset.provinces(selected_region))
+    partitions = dataset.select(selected_region, selected_province)
+    
+    # 加载数据
+    version = dataset.version(partitions)
+    with profiler.stage("load_data") as record:
+        df = load_data(version, partitions)
+        record["rows"] = None if df is None else len(df)
+    if df is None:
+        st.stop()
+    with profiler.stage("indexes"):
+        filter_index = get_filter_index(version, partitions)
+        data_cube = get_data_cube(version, partitions)
+        map_cache = get_map_cache()
+        carry_over_map_cache(version, partitions)
+        prewarm_errors = prewarm_map_cache(version, partitions)
+        change_table = get_change_table(version, partitions)
+    hub_versions = tuple(
+        (hub_type, str(path), dataset_version(path)) for hub_type, path in find_hub_files().items())
+    boundary_versions = tuple((str(path), dataset_version(path)) for path in find_boundary_files())
+    
     with st.sidebar:
         st.markdown('<div class="filter-container">', unsafe_allow_html=True)
         
         # 城市筛选
-        cities = ['全部'] + sorted(df['市'].unique().tolist())
+        cities = ['全部'] + filter_index.values('市')
         selected_city = st.selectbox("选择城市", cities)
         
         # 渠道筛选
-        channels = ['全部'] + sorted(df['一级渠道'].unique().tolist())
+        channels = ['全部'] + filter_index.values('一级渠道')
         selected_channel = st.selectbox("选择渠道", channels)
         
         # 城市级别筛选
-        city_levels = ['全部'] + sorted(df['城市级别'].unique().tolist())
+        city_levels = ['全部'] + filter_index.values('城市级别')
         selected_level = st.selectbox("城市级别", city_levels)
         
         # 卖力值范围筛选
@@ -200,28 +559,109 @@ def main():
             value=(min_value, max_value),
             step=0.1
         )
+        # 滑块返回的浮点数可能带有误差，按数据精度取整
+        value_range = (round(value_range[0], 2), round(value_range[1], 2))
+        
+        # 周边门店查询（仍叠加上面的筛选条件）
+        search = None
+        if st.checkbox("按位置查询周边门店", value=False):
+            center_text = st.text_input(
+                "中心点（纬度, 经度）",
+                value=f"{df['纬度'].mean():.5f}, {df['经度'].mean():.5f}",
+                help="可直接输入，或点击地图复制该处坐标后粘贴",
+            )
+            search_mode = st.radio("查询方式", ["半径范围内", "最近的门店"], horizontal=True)
+            if search_mode == "半径范围内":
+                search_value = {"radius": st.slider("半径（千米）", min_value=0.5, max_value=100.0, value=5.0, step=0.5)}
+            else:
+                search_value = {"k": int(st.number_input("门店数", min_value=1, max_value=1000, value=20, step=1))}
+            center = parse_point(center_text)
+            if center is None:
+                st.warning("中心点格式应为：纬度, 经度")
+            else:
+                search = {"lat": center[0], "lon": center[1], **search_value}
+        
+        # Hub覆盖分析（每家门店分配到各类型最近的Hub）
+        hub_coverage = hub_type = None
+        show_coverage = st.checkbox(
+            "显示Hub覆盖",
+            value=False,
+            help="按Hub主数据（HQ/SBO/DCP）为每家门店分配最近的Hub，统计各Hub的平均/最大距离和覆盖情况",
+            disabled=not hub_versions,
+        )
+        if show_coverage and hub_versions:
+            hub_coverage = get_hub_coverage(version, partitions, hub_versions)
+            if hub_coverage.types:
+                hub_type = st.selectbox("Hub类型", hub_coverage.types)
+                cover_radius = st.slider(
+                    "覆盖半径（千米）", min_value=1.0, max_value=200.0, value=DEFAULT_RADIUS_KM, step=1.0)
+        
+        # 区域分布图（按行政区划边界聚合门店）
+        area_level = None
+        show_areas = st.checkbox(
+            "显示区域分布图",
+            value=False,
+            help="按区县/市边界汇总门店数、平均卖力值和SEQ渗透率，并检查门店的区县/市标签是否与坐标一致",
+            disabled=not boundary_versions,
+        )
+        if show_areas and boundary_versions:
+            area_level = st.selectbox("区域级别", list(LEVELS))
+            area_metric = st.selectbox("区域指标", AREA_METRICS)
         
         st.info("💡 地图图层和渠道类型都可以通过地图右上角的图层控制面板进行选择和开关")
         st.info("🔍 点击地图右上角的全屏按钮可以让地图全屏显示，方便详细查看")
         
         st.markdown('</div>', unsafe_allow_html=True)
     
-    # 应用筛选条件
-    df_filtered = df.copy()
+    # 应用筛选条件（通过预建索引求交集，不复制整表）
+    with profiler.stage("filter") as record:
+        filter_rows = filter_index.select(selected_city, selected_channel, selected_level, value_range)
+        df_filtered = filter_index.take(filter_rows)
+        filter_key = (selected_city, selected_channel, selected_level, value_range)
+        record["rows"] = len(df_filtered)
     
-    if selected_city != '全部':
-        df_filtered = df_filtered[df_filtered['市'] == selected_city]
+    # 周边查询：在满足筛选条件的门店中按空间索引查找
+    search_rows = search_distance = None
+    if search is not None:
+        with profiler.stage("search") as record:
+            search_rows, search_distance = get_spatial_index(version, partitions).search(
+                search['lat'], search['lon'], search.get('radius'), search.get('k'),
+                filter_index.mask(selected_city, selected_channel, selected_level, value_range))
+            filter_rows = np.sort(search_rows)
+            df_filtered = filter_index.take(filter_rows)
+            filter_key += (tuple(sorted(search.items())),)
+            record["rows"] = len(df_filtered)
     
-    if selected_channel != '全部':
-        df_filtered = df_filtered[df_filtered['一级渠道'] == selected_channel]
+    # 当前门店的Hub覆盖统计
+    coverage = None
+    if hub_type is not None:
+        with profiler.stage("coverage"):
+            coverage = (
+                hub_type,
+                hub_coverage.hub_stats(hub_type, cover_radius, filter_rows),
+                hub_coverage.links(hub_type, cover_radius, filter_rows),
+            )
     
-    if selected_level != '全部':
-        df_filtered = df_filtered[df_filtered['城市级别'] == selected_level]
+    # 区域统计（门店按坐标归入行政区域）
+    areas = None
+    if area_level is not None:
+        with profiler.stage("areas"):
+            boundaries = get_boundaries(area_level, boundary_versions)
+            store_areas = get_store_areas(version, partitions, area_level, boundary_versions)
+            if len(boundaries):
+                # 边界按AREA_ZOOMS各级别分别简化（首次简化后缓存在磁盘上），地图缩放时切换
+                levels = {zoom: boundaries.simplified(zoom) for zoom in AREA_ZOOMS}
+                areas = (levels, area_stats(df, boundaries, store_areas, filter_rows), area_metric)
     
-    df_filtered = df_filtered[
-        (df_filtered['卖力值'] >= value_range[0]) & 
-        (df_filtered['卖力值'] <= value_range[1])
-    ]
+    # 指标卡片和统计图表从数据立方体汇总，不再扫描明细数据
+    with profiler.stage("cube") as record:
+        if search is None:
+            cube_cells = data_cube.select(selected_city, selected_channel, selected_level, value_range)
+        else:
+            cube_cells = data_cube.select_rows(filter_rows)
+        summary = summarize(cube_cells)
+        record["rows"] = len(cube_cells)
+    total = data_cube.total
     
     # 主要指标展示
     col1, col2, col3, col4 = st.columns(4)
@@ -229,145 +669,164 @@ def main():
     with col1:
         st.metric(
             label="📍 门店总数",
-            value=f"{len(df_filtered):,}",
-            delta=f"占总数 {len(df_filtered)/len(df)*100:.1f}%"
+            value=f"{summary['count']:,}",
+            delta=f"占总数 {summary['count']/total['count']*100:.1f}%"
         )
     
     with col2:
-        avg_score = df_filtered['卖力值'].mean() if len(df_filtered) > 0 else 0
         st.metric(
             label="📈 平均卖力值",
-            value=f"{avg_score:.2f}",
-            delta=f"vs 总体 {df['卖力值'].mean():.2f}"
+            value=f"{summary['avg_score']:.2f}",
+            delta=f"vs 总体 {total['avg_score']:.2f}"
         )
     
     with col3:
-        unique_cities = df_filtered['市'].nunique()
         st.metric(
             label="🏙️ 覆盖城市",
-            value=f"{unique_cities}",
-            delta=f"总共 {df['市'].nunique()} 城市"
+            value=f"{summary['cities']}",
+            delta=f"总共 {total['cities']} 城市"
         )
     
     with col4:
-        unique_districts = df_filtered['区县'].nunique()
         st.metric(
             label="🏘️ 覆盖区县",
-            value=f"{unique_districts}",
-            delta=f"总共 {df['区县'].nunique()} 区县"
+            value=f"{summary['districts']}",
+            delta=f"总共 {total['districts']} 区县"
         )
     
+    # 地图、统计图表和数据表格各是一个页面片段：片段内的控件（地图选项、排序、翻页、导出格式）
+    # 变化时只重跑该片段；侧边栏筛选条件变化时整页重跑，各片段按筛选条件复用缓存的结果
+    layer_key = ""
+    if areas is not None:
+        boundary_key = ",".join(boundary_version for _, boundary_version in boundary_versions)
+        layer_key += f"+areas={area_level}/{area_metric}/{boundary_key}"
+    if coverage is not None:
+        hub_key = ",".join(hub_version for _, _, hub_version in hub_versions)
+        layer_key += f"+hub={hub_type}@{cover_radius:g}km/{hub_key}"
+    view = {
+        "version": version,
+        "partitions": partitions,
+        "filters": (selected_city, selected_channel, selected_level, value_range),
+        "value_bounds": (min_value, max_value),
+        "search": search,
+        "filter_key": filter_key,
+        "filter_rows": filter_rows,
+        "df_filtered": df_filtered,
+        "cube_cells": cube_cells,
+        "summary": summary,
+        "change_table": change_table,
+        "coverage": coverage,
+        "areas": areas,
+        "layer_key": layer_key,
+    }
+    
     # 地图全屏展示
-    st.markdown("### 🗺️ 门店地理分布")
+    map_section(view, profiler)
     
-    if len(df_filtered) > 0:
-        # 创建地图
-        folium_map = create_folium_map(df_filtered)
-        
-        if folium_map:
-            # 将地图保存为HTML并嵌入，增加高度
-            map_html = folium_map._repr_html_()
-            st.components.v1.html(map_html, height=800)
-            
-            # 统计有宝洁SEQ的门店数量
-            pg_seq_count = df_filtered['宝洁SEQ'].notna().sum()
-            
-            # 显示当前筛选结果和使用说明
-            col_info1, col_info2 = st.columns(2)
-            with col_info1:
-                st.info(f"🔍 当前数据包含 {len(df_filtered):,} 家门店")
-            with col_info2:
-                st.info(f"🚩 其中 {pg_seq_count:,} 家门店已有宝洁SEQ覆盖")
-            
-            st.success("🎯 使用地图右上角的图层控制面板可以切换地图样式和开关不同渠道类型的显示")
-        else:
-            st.warning("无法创建地图，请检查筛选条件")
-    else:
-        st.warning("根据当前筛选条件，没有找到匹配的门店数据")
+    # 周边查询结果（按距离排序）
+    if search is not None:
+        with st.sidebar.expander("📍 周边门店", expanded=True):
+            st.caption(f"找到 {len(search_rows):,} 家门店")
+            nearby = filter_index.take(search_rows[:100])[['门店名称', '市', '一级渠道', '卖力值']]
+            st.dataframe(
+                nearby.assign(**{'距离(千米)': np.round(search_distance[:100], 2)}),
+                use_container_width=True,
+                hide_index=True,
+            )
     
-    # 数据统计图表 - 三列布局
-    st.markdown("### 📊 数据统计")
+    # 区域统计及标签与坐标不符的门店
+    if areas is not None:
+        with st.sidebar.expander("🗾 区域统计", expanded=True):
+            area_table = areas[1]
+            area_rows = store_areas if filter_rows is None else store_areas[filter_rows]
+            mismatched = label_mismatches(df_filtered, boundaries, area_rows)
+            st.caption(
+                f"{int((area_table['门店数'] > 0).sum())} 个{area_level}有门店；"
+                f"{int(mismatched.sum()):,} 家门店的{area_level}与坐标所在区域不一致，"
+                f"{int((area_rows < 0).sum()):,} 家门店不在任何区域内"
+            )
+            st.dataframe(
+                area_table[area_table['门店数'] > 0].drop(columns='id').sort_values(area_metric, ascending=False),
+                use_container_width=True,
+                hide_index=True,
+            )
+            if mismatched.any():
+                st.markdown(f"**{area_level}与坐标不一致的门店**")
+                names = pd.Series(boundaries.names, dtype=object)
+                st.dataframe(
+                    df_filtered[mismatched][['门店编码', '门店名称', '市', '区县']].head(100).assign(
+                        坐标所在区域=names.iloc[area_rows[mismatched][:100]].to_numpy()),
+                    use_container_width=True,
+                    hide_index=True,
+                )
     
-    if len(df_filtered) > 0:
-        chart_col1, chart_col2, chart_col3 = st.columns(3)
-        
-        with chart_col1:
-            # 渠道分布饼图
-            st.markdown("#### 渠道分布")
-            channel_counts = df_filtered['一级渠道'].value_counts()
-            fig_pie = px.pie(
-                values=channel_counts.values,
-                names=channel_counts.index,
-                title="渠道分布"
+    # Hub覆盖统计
+    if coverage is not None:
+        with st.sidebar.expander("🏭 Hub覆盖", expanded=True):
+            hub_stats, hub_links = coverage[1], coverage[2]
+            covered_count = int(hub_links['已覆盖'].sum())
+            st.caption(
+                f"{hub_type} Hub {len(hub_stats):,} 个；{cover_radius:g} 千米内门店 {covered_count:,} 家"
+                f"（{covered_count / max(len(hub_links), 1) * 100:.1f}%），未覆盖 {len(hub_links) - covered_count:,} 家"
             )
-            fig_pie.update_layout(height=400)
-            st.plotly_chart(fig_pie, use_container_width=True)
-        
-        with chart_col2:
-            # 城市级别分布
-            st.markdown("#### 城市级别分布")
-            level_counts = df_filtered['城市级别'].value_counts().sort_index()
-            fig_bar = px.bar(
-                x=level_counts.index,
-                y=level_counts.values,
-                title="城市级别分布",
-                labels={'x': '城市级别', 'y': '门店数量'}
+            st.dataframe(
+                hub_stats[['Hub名称', '门店数', '覆盖门店数', '平均距离', '最大距离']].sort_values('门店数', ascending=False),
+                use_container_width=True,
+                hide_index=True,
             )
-            fig_bar.update_layout(height=400)
-            st.plotly_chart(fig_bar, use_container_width=True)
-        
-        with chart_col3:
-            # 卖力值分布直方图
-            st.markdown("#### 卖力值分布")
-            fig_hist = px.histogram(
-                df_filtered,
-                x='卖力值',
-                nbins=20,
-                title="卖力值分布",
-                labels={'x': '卖力值', 'y': '门店数量'}
+            uncovered = hub_links[~hub_links['已覆盖']].sort_values('距离', ascending=False)
+            if not uncovered.empty:
+                st.markdown("**未覆盖门店**")
+                st.dataframe(
+                    uncovered[['门店名称', 'Hub名称', '距离']].head(100).round({'距离': 2}),
+                    use_container_width=True,
+                    hide_index=True,
+                )
+    
+    # 地图缓存统计
+    with st.sidebar.expander("⚡ 地图缓存统计", expanded=bool(prewarm_errors)):
+        stats = map_cache.stats()
+        st.caption(
+            f"命中 {stats['hits']} 次 / 未命中 {stats['misses']} 次（命中率 {stats['hit_rate']*100:.0f}%）\n\n"
+            f"缓存 {stats['entries']} 个视图，{stats['size_mb']:.1f} / {stats['budget_mb']:.0f} MB，"
+            f"已淘汰 {stats['evictions']} 个，后台渲染中 {get_map_renderer().pending()} 个"
+        )
+        # 后台预渲染失败的视图（打开时会重新渲染，出错时在地图位置显示错误）
+        for key, error in list(prewarm_errors):
+            st.warning(f"预渲染失败（{key[2]}）: {error}")
+    
+    # 与上一版本相比的变化
+    if change_table is not None:
+        with st.sidebar.expander("🆕 与上一版本的变化"):
+            kinds = change_table['变更类型'].astype(str).value_counts()
+            st.caption("，".join(f"{label} {kinds.get(kind, 0):,} 家" for kind, label in CHANGE_LABELS.items()))
+            st.dataframe(
+                change_table[['门店编码', '门店名称', '市', '变更类型', '变更字段']].assign(
+                    变更类型=change_table['变更类型'].astype(str).map(CHANGE_LABELS)),
+                use_container_width=True,
+                hide_index=True,
             )
-            fig_hist.update_layout(height=400)
-            st.plotly_chart(fig_hist, use_container_width=True)
     
-    # 详细数据表格
-    st.markdown("### 📋 详细数据")
+    # 数据统计图表 - 三列布局
+    chart_section(view, profiler)
     
-    if len(df_filtered) > 0:
-        # 选择要显示的列
-        display_columns = [
-            '门店编码', '门店名称', '市', '区县', '地址', 
-            '一级渠道', '城市级别', '卖力值', '所属连锁系统'
-        ]
-        
-        # 数据表格
-        st.dataframe(
-            df_filtered[display_columns].head(100),
-            use_container_width=True,
-            height=400
-        )
-        
-        if len(df_filtered) > 100:
-            st.info(f"表格仅显示前100条记录，总共有 {len(df_filtered):,} 条记录")
-        
-        # 下载按钮
-        csv = df_filtered.to_csv(index=False, encoding='utf-8-sig')
-        st.download_button(
-            label="📥 下载筛选后的数据 (CSV)",
-            data=csv,
-            file_name=f"门店数据_{selected_city}_{selected_channel}.csv",
-            mime="text/csv"
-        )
+    # 详细数据表格
+    table_section(view, profiler)
     
-    # 页脚信息
+    # 页脚信息（数据更新时间取自所选分区工作簿的版本日期）
+    release_date = dataset.release_date(partitions)
     st.markdown("---")
     st.markdown(
-        """
+        f"""
         <div style="text-align: center; color: #666; padding: 1rem;">
-            📊 黑龙江门店数据分析平台 | 数据更新时间: 2025-06-09
+            📊 黑龙江门店数据分析平台 | 数据更新时间: {release_date.isoformat() if release_date else '未知'}
         </div>
         """,
         unsafe_allow_html=True
     )
+    
+    if profiler.enabled:
+        show_profile(profiler)
 
 if __name__ == "__main__":
     main() 
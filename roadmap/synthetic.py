@@ -0,0 +1,182 @@
+import numpy as np
+import pandas as pd
+
+from store_schema import STORE_SCHEMA, apply_schema
+
+# 各市的门店分布画像，取自黑龙江数据V20250609：
+# 市, 大区, 省, 城市级别, 门店数, 中心纬度, 中心经度, 纬度离散度, 经度离散度（度）, 区县数
+CITY_PROFILE = [
+    ('哈尔滨市', '东北地区', '黑龙江省', 2, 4465, 45.743, 126.643, 0.24, 0.63, 18),
+    ('佳木斯市', '东北地区', '黑龙江省', 4, 1147, 46.813, 130.398, 0.42, 1.04, 10),
+    ('牡丹江市', '东北地区', '黑龙江省', 4, 979, 44.581, 129.621, 0.31, 0.56, 10),
+    ('大庆市', '东北地区', '黑龙江省', 3, 927, 46.589, 125.015, 0.34, 0.19, 9),
+    ('绥化市', '东北地区', '黑龙江省', 4, 916, 46.681, 126.857, 0.43, 0.66, 10),
+    ('齐齐哈尔市', '东北地区', '黑龙江省', 4, 854, 47.354, 123.964, 0.42, 0.83, 16),
+    ('呼伦贝尔市', '华北地区', '内蒙古自治区', 5, 749, 49.210, 120.725, 0.82, 2.17, 14),
+    ('鸡西市', '东北地区', '黑龙江省', 5, 503, 45.304, 130.981, 0.19, 0.69, 9),
+    ('黑河市', '东北地区', '黑龙江省', 5, 424, 49.165, 126.566, 0.87, 0.86, 6),
+    ('伊春市', '东北地区', '黑龙江省', 5, 375, 47.726, 128.901, 0.52, 0.56, 10),
+    ('双鸭山市', '东北地区', '黑龙江省', 5, 331, 46.653, 131.165, 0.18, 0.72, 8),
+    ('七台河市', '东北地区', '黑龙江省', 5, 232, 45.772, 131.012, 0.03, 0.21, 4),
+    ('鹤岗市', '东北地区', '黑龙江省', 5, 214, 47.332, 130.542, 0.11, 0.66, 8),
+    ('大兴安岭地区', '东北地区', '黑龙江省', 5, 177, 51.724, 124.146, 1.00, 1.15, 4),
+]
+
+# 各渠道的门店占比和卖力值分布：占比, 均值, 标准差, 最小值
+CHANNEL_PROFILE = {
+    'MM': (0.465, 77.7, 9.2, 55.07),
+    'Grocery': (0.407, 85.7, 2.5, 82.35),
+    'CVS': (0.065, 71.8, 16.1, 47.09),
+    'HSM': (0.063, 87.2, 8.7, 55.08),
+}
+
+# 各渠道的门店名称后缀
+CHANNEL_SUFFIX = {'MM': '超市', 'Grocery': '商店', 'CVS': '便利店', 'HSM': '购物中心'}
+
+# 卖力值上限
+MAX_SCORE = 99.01
+
+# 有宝洁SEQ和属于连锁系统的门店比例
+SEQ_RATE = 0.14
+CHAIN_RATE = 0.11
+
+# 连锁系统（连锁门店的名称以系统名开头）
+CHAINS = ['微利', '新天地', '中央红小月亮', '昆仑好客', '京东便利店', '比优特', '易捷', '家得乐', '好又多', '华辰超市']
+
+# 非连锁门店的名称前缀、街道名
+NAME_PREFIXES = ['惠万家', '新盛达', '富贵', '宝源', '鑫源', '百佳', '家乐', '福满多', '金鑫', '万隆', '利民', '佳佳']
+STREETS = ['建设路', '新华街', '中山路', '人民路', '解放路', '和平街', '友谊路', '胜利街', '文化街', '光明路', '长江路', '黄河路']
+
+# 每个区县的乡镇数、每个乡镇的村/街道数（平均值）
+TOWNS_PER_DISTRICT = 6
+STREETS_PER_TOWN = 3
+
+# 区县内门店相对区县中心的离散度（度），按对数正态分布抽取
+DISTRICT_SPREAD = (0.035, 0.057)
+
+# 县级区县的序号
+NUMERALS = '一二三四五六七八九十'
+
+
+def _district_names(city, count):
+    """
+    生成区县名称：前三个为市辖区，其余为县
+    """
+    stem = city[:-2] if city.endswith('地区') else city[:-1]
+    names = []
+    for i in range(count):
+        numeral = NUMERALS[i % 10] + ('' if i < 10 else str(i // 10))
+        names.append(f"{stem}{numeral}{'区' if i < 3 else '县'}")
+    return names
+
+
+def _districts(rng, profile=CITY_PROFILE):
+    """
+    展开各市的区县：每个区县的名称、所在市的序号、门店权重、中心坐标和区县内离散度。
+    区县权重按名次递减（市区集中、外县稀疏），中心围绕城市中心按城市离散度分布
+    """
+    rows = []
+    for city_id, (city, _, _, _, stores, lat, lon, spread_lat, spread_lon, count) in enumerate(profile):
+        weights = 1.0 / np.arange(1, count + 1) ** 1.2
+        weights = weights / weights.sum() * stores
+        # 第一个区县位于城市中心，其余按离散度散开
+        offsets = rng.normal(size=(count, 2)) * [spread_lat, spread_lon]
+        offsets[0] = 0.0
+        spread = rng.lognormal(0.0, 0.6, size=count)[:, None] * DISTRICT_SPREAD
+        for i, name in enumerate(_district_names(city, count)):
+            rows.append((name, city_id, weights[i], lat + offsets[i, 0], lon + offsets[i, 1], *spread[i]))
+    return pd.DataFrame(rows, columns=['区县', 'city', 'weight', 'lat', 'lon', 'spread_lat', 'spread_lon'])
+
+
+def _codes(rng, n, prefix, digits):
+    """
+    生成n个不重复的编码（前缀加定长数字）
+    """
+    low = 10 ** (digits - 1)
+    values = rng.choice(9 * low, size=n, replace=False) + low
+    return [f"{prefix}{v}" for v in values]
+
+
+def _category(codes, categories):
+    return pd.Categorical.from_codes(codes, categories=list(categories))
+
+
+def generate_stores(n, seed=0, profile=CITY_PROFILE):
+    """
+    生成n家与真实门店表结构一致（STORE_SCHEMA的18列、紧凑类型）的合成门店：
+    市按真实门店数占比抽取，门店聚集在各区县中心附近，渠道占比、各渠道卖力值分布、
+    宝洁SEQ比例（14%）和连锁比例与真实数据相近；渠道高潜排名为渠道内按卖力值的名次。
+    相同的n和seed总是生成相同的数据
+    """
+    rng = np.random.default_rng(seed)
+    districts = _districts(rng, profile)
+    cities = pd.DataFrame(profile, columns=['市', '大区', '省', '城市级别', 'stores', 'lat', 'lon', 'slat', 'slon', 'count'])
+
+    # 区县 → 乡镇 → 村/街道
+    district = rng.choice(len(districts), size=n, p=(districts['weight'] / districts['weight'].sum()).to_numpy())
+    city = districts['city'].to_numpy()[district]
+    town_in_district = rng.geometric(1.0 / TOWNS_PER_DISTRICT * 2, size=n).clip(1, TOWNS_PER_DISTRICT * 4) - 1
+    street_in_town = rng.integers(0, STREETS_PER_TOWN, size=n)
+
+    # 坐标：区县中心加正态扰动
+    lat = districts['lat'].to_numpy()[district] + rng.normal(size=n) * districts['spread_lat'].to_numpy()[district]
+    lon = districts['lon'].to_numpy()[district] + rng.normal(size=n) * districts['spread_lon'].to_numpy()[district]
+
+    # 渠道和卖力值
+    channels = list(CHANNEL_PROFILE)
+    shares = np.array([CHANNEL_PROFILE[c][0] for c in channels])
+    channel = rng.choice(len(channels), size=n, p=shares / shares.sum())
+    mean, std, low = (np.array([CHANNEL_PROFILE[c][i] for c in channels])[channel] for i in (1, 2, 3))
+    score = np.round(np.clip(rng.normal(mean, std), low, MAX_SCORE), 2)
+    # 渠道高潜排名：渠道内卖力值从高到低的名次
+    order = np.lexsort((-score, channel))
+    rank = np.empty(n, dtype=np.int64)
+    starts = np.searchsorted(channel[order], np.arange(len(channels)))
+    rank[order] = np.arange(n) - starts[channel[order]] + 1
+
+    # 连锁系统和门店名称
+    chained = rng.random(n) < CHAIN_RATE
+    chain = np.where(chained, rng.integers(0, len(CHAINS), size=n), -1)
+    prefix = rng.integers(0, len(NAME_PREFIXES), size=n)
+    number = rng.integers(1, 400, size=n)
+    chain_names = np.array(CHAINS, dtype=object)
+    suffix = np.array([CHANNEL_SUFFIX[c] for c in channels], dtype=object)[channel]
+    brand = np.where(chained, chain_names[np.maximum(chain, 0)], np.array(NAME_PREFIXES, dtype=object)[prefix])
+
+    # 乡镇按 (区县, 序号) 编号，每个乡镇只用其中几条街道
+    district_names = districts['区县'].to_numpy()
+    town_key = district * (TOWNS_PER_DISTRICT * 4) + town_in_district
+    towns, town_code = np.unique(town_key, return_inverse=True)
+    town_names = [
+        f"{district_names[k // (TOWNS_PER_DISTRICT * 4)][:-1]}第{k % (TOWNS_PER_DISTRICT * 4) + 1}街道" for k in towns
+    ]
+    street = (town_key * 7 + street_in_town) % len(STREETS)
+    street_names = np.array(STREETS, dtype=object)[street]
+    villages, village_code = np.unique(town_code * len(STREETS) + street, return_inverse=True)
+    village_names = [f"{town_names[k // len(STREETS)][:-2]}{STREETS[k % len(STREETS)]}" for k in villages]
+
+    seq = np.full(n, None, dtype=object)
+    has_seq = rng.random(n) < SEQ_RATE
+    seq[has_seq] = _codes(rng, int(has_seq.sum()), '6', 8)
+
+    df = pd.DataFrame({
+        '门店编码': _codes(rng, n, 'W', 9),
+        '门店名称': [f"{b}{s}({st}店)" for b, s, st in zip(brand, suffix, street_names)],
+        '大区': cities['大区'].to_numpy()[city],
+        '省': cities['省'].to_numpy()[city],
+        '市': _category(city, cities['市']),
+        '区县': _category(district, district_names),
+        '乡镇': _category(town_code, town_names),
+        '村/街道': _category(village_code, village_names),
+        '地址': [f"{st}{num}号" for st, num in zip(street_names, number)],
+        '经度': lon,
+        '纬度': lat,
+        '城市级别': cities['城市级别'].to_numpy()[city],
+        '一级渠道': _category(channel, channels),
+        '所属连锁系统': pd.Categorical.from_codes(chain, categories=CHAINS),
+        '网点状态名称': 1,
+        '渠道高潜排名': rank,
+        '卖力值': score,
+        '宝洁SEQ': seq,
+    })
+    return apply_schema(df)[list(STORE_SCHEMA)]
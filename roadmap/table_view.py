@@ -0,0 +1,81 @@
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# 详细数据表格显示的列
+DISPLAY_COLUMNS = [
+    '门店编码', '门店名称', '市', '区县', '地址',
+    '一级渠道', '城市级别', '卖力值', '所属连锁系统'
+]
+
+# 每页行数选项
+PAGE_SIZES = [50, 100, 200, 500]
+
+
+class SortIndex:
+    """
+    表格排序索引：为每个显示列预先计算排序键和排序排列，
+    全量数据的任意一页直接对排列切片；筛选后的视图排序一次后缓存，翻页只做切片
+    """
+
+    def __init__(self, df, columns=DISPLAY_COLUMNS, cache_size=32):
+        self.df = df
+        self.sort_keys = {}
+        self.permutations = {}
+        self.unique_counts = {}
+        for col in columns:
+            codes, uniques = pd.factorize(df[col], sort=True)
+            # 空值的排序键为取值个数，排在最后
+            codes = np.where(codes < 0, len(uniques), codes)
+            self.unique_counts[col] = len(uniques)
+            self.sort_keys[col] = codes
+            self.permutations[col] = np.argsort(codes, kind="stable")
+        self._views = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    def _descending_key(self, col):
+        codes = self.sort_keys[col]
+        n = self.unique_counts[col]
+        # 降序时空值仍排在最后
+        return np.where(codes == n, n, n - 1 - codes)
+
+    def ordered_rows(self, view_key, rows, column, ascending=True):
+        """
+        返回按指定列排序后的行号；rows为None表示全部数据
+        """
+        cache_key = (view_key, column, ascending)
+        with self._lock:
+            cached = self._views.get(cache_key)
+            if cached is not None:
+                self._views.move_to_end(cache_key)
+                return cached
+
+        if rows is None and ascending:
+            ordered = self.permutations[column]
+        else:
+            if rows is None:
+                rows = np.arange(len(self.df))
+            key = self.sort_keys[column] if ascending else self._descending_key(column)
+            ordered = rows[np.argsort(key[rows], kind="stable")]
+
+        with self._lock:
+            self._views[cache_key] = ordered
+            if len(self._views) > self._cache_size:
+                self._views.popitem(last=False)
+        return ordered
+
+    def page(self, view_key, rows, column, ascending=True, page=1, page_size=100, columns=DISPLAY_COLUMNS):
+        """
+        返回第page页（从1开始）的数据，只取出该页的行
+        """
+        ordered = self.ordered_rows(view_key, rows, column, ascending)
+        start = (page - 1) * page_size
+        return self.df.iloc[ordered[start:start + page_size]][columns]
+
+
+def page_count(total, page_size):
+    return max(1, math.ceil(total / page_size))
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from cluster_index import MAX_ZOOM, SINGLE_ZOOM, ClusterIndex
+from synthetic import generate_stores
+
+
+@pytest.fixture(scope="module")
+def index():
+    return ClusterIndex(generate_stores(20_000, seed=1))
+
+
+def grouped(index, z, x, y, mask=None):
+    """
+    逐门店分组得到的聚合结果（门店数 -> 质心、卖力值合计、SEQ门店数），以及单个门店行号
+    """
+    rows = index.tile_rows(z, x, y, mask)
+    keys = index.codes[rows] >> np.uint64(2 * (MAX_ZOOM - z))
+    _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    lat = np.bincount(inverse, index.lat[rows]) / counts
+    score_sum = np.bincount(inverse, index.score[rows])
+    seq_count = np.bincount(inverse, index.seq[rows].astype(float))
+    multi = counts > 1
+    clusters = sorted(zip(counts[multi], lat[multi].round(6), score_sum[multi].round(2), seq_count[multi]))
+    return clusters, sorted(rows[counts[inverse] == 1].tolist())
+
+
+@pytest.mark.parametrize("masked", [False, True])
+def test_clusters_match_grouping(index, masked):
+    rng = np.random.default_rng(0)
+    mask = rng.random(len(index.codes)) < 0.3 if masked else None
+    levels = index.levels(mask) if masked else None
+    for row in rng.choice(len(index.codes), 20, replace=False):
+        for z in range(SINGLE_ZOOM):
+            x, y = int(index.mx[row] * (1 << z)), int(index.my[row] * (1 << z))
+            clusters, single_rows = index.clusters(z, x, y, mask, levels)
+            actual = sorted(zip(clusters["count"], clusters["lat"], clusters["score_sum"], clusters["seq_count"]))
+            expected, expected_rows = grouped(index, z, x, y, mask)
+            assert [(c, s) for c, _, _, s in actual] == [(c, s) for c, _, _, s in expected]
+            np.testing.assert_allclose([a[1:3] for a in actual], [e[1:3] for e in expected], atol=0.011)
+            assert sorted(single_rows.tolist()) == expected_rows
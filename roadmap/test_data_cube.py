@@ -0,0 +1,61 @@
+import pandas as pd
+import pytest
+
+from data_cube import StoreCube, summarize
+from filter_index import ALL
+from synthetic import generate_stores
+
+
+@pytest.fixture(scope="module")
+def cube():
+    return StoreCube(generate_stores(20_000, seed=1))
+
+
+@pytest.fixture
+def cells_only(cube, monkeypatch):
+    """
+    禁止逐行重新聚合，select只能由立方体单元回答
+    """
+    def fail(*args, **kwargs):
+        raise AssertionError("select fell back to re-aggregating rows")
+
+    monkeypatch.setattr(cube, "_aggregate", fail)
+    return cube
+
+
+def expected(cube, city=ALL, channel=ALL, level=ALL, value_range=None):
+    return StoreCube._aggregate(cube, cube.filter_index.apply(city, channel, level, value_range))
+
+
+def test_default_range_served_from_cells(cube, cells_only):
+    # 侧边栏滑块默认范围即全部门店的卖力值最小值和最大值，一般不落在分箱边界上
+    value_range = (cube.score_min, cube.score_max)
+    assert (round(value_range[0] * 100) - cube.min_cents) % 10 or (round(value_range[1] * 100) - cube.min_cents) % 10
+    assert summarize(cube.select(value_range=value_range)) == cube.total
+
+
+@pytest.mark.parametrize("value_range", [
+    lambda cube: (cube.score_min - 0.03, cube.score_max + 0.07),
+    lambda cube: (cube.score_min - 5, cube.bin_start(30).item()),
+    lambda cube: (cube.bin_start(12).item(), cube.score_max + 1),
+])
+def test_out_of_range_bounds_served_from_cells(cube, cells_only, value_range):
+    value_range = value_range(cube)
+    channel = cube.df['一级渠道'].iloc[0]
+    selected = cube.select(channel=channel, value_range=value_range)
+    assert summarize(selected) == summarize(expected(cube, channel=channel, value_range=value_range))
+
+
+def test_missing_city_rows_counted():
+    # 市/区县缺失的门店也计入立方体，合计与筛选后的行数一致
+    df = generate_stores(2_000, seed=2).copy(deep=True)
+    df.loc[df.index[:7], '市'] = None
+    df.loc[df.index[5:12], '区县'] = None
+    cube = StoreCube(df)
+    assert summarize(cube.select())["count"] == len(df)
+
+    # 增量更新缺失市的门店后合计不变
+    removed = df.iloc[:3]
+    added = removed.assign(卖力值=removed['卖力值'] + 0.1)
+    updated = cube.updated(pd.concat([added, df.iloc[3:]]), removed, added)
+    assert summarize(updated.select())["count"] == len(df)
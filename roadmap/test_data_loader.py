@@ -0,0 +1,28 @@
+import shutil
+
+import pandas as pd
+import pytest
+
+from data_loader import DATA_FILE, cache_path, load_store_data, read_workbook
+
+
+@pytest.fixture(scope="module")
+def workbook(tmp_path_factory):
+    """
+    工作簿副本，首次加载时写入自己的列式缓存
+    """
+    path = tmp_path_factory.mktemp("loader") / "加载测试.xlsx"
+    shutil.copy(DATA_FILE, path)
+    yield path
+    cache_path(path).unlink(missing_ok=True)
+
+
+def test_cached_frame_matches_workbook(workbook):
+    parsed = read_workbook(workbook)
+    first = load_store_data(workbook)
+    assert cache_path(workbook).exists()
+    cached = load_store_data(workbook)
+
+    for frame in (first, cached):
+        assert frame.dtypes.to_dict() == parsed.dtypes.to_dict()
+        pd.testing.assert_frame_equal(frame, parsed)
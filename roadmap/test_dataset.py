@@ -0,0 +1,66 @@
+import os
+
+import pandas as pd
+import pytest
+
+from data_loader import DATA_FILE
+from dataset import StoreDataset
+
+SERIES = "测试数据"
+
+
+@pytest.fixture(scope="module")
+def source():
+    return pd.read_excel(DATA_FILE, nrows=201)
+
+
+@pytest.fixture
+def releases(tmp_path, source):
+    """
+    同一系列的两个版本：第二版删除1家、新增1家、修改1家门店的卖力值
+    """
+    source_dir = tmp_path / "source"
+    source_dir.mkdir()
+    first = source_dir / f"{SERIES}V20250101.xlsx"
+    source.iloc[:200].to_excel(first, index=False)
+    second = source.iloc[1:].copy()
+    second.loc[second.index[0], '卖力值'] = second['卖力值'].iloc[0] + 1
+    return source_dir, first, second
+
+
+def test_same_release_keeps_changes(tmp_path, releases):
+    source_dir, first, second = releases
+    dataset = StoreDataset(source_dir, tmp_path / "partitions", jobs=1)
+    assert dataset.refresh()
+    assert dataset.sources[SERIES]["changes"] is None
+
+    latest = source_dir / f"{SERIES}V20250201.xlsx"
+    second.to_excel(latest, index=False)
+    assert dataset.refresh()
+    entry = dict(dataset.sources[SERIES])
+    assert entry["summary"] == {"added": 1, "removed": 1, "changed": 1}
+    assert entry["previous_release"] == "2025-01-01"
+
+    # 同一版本重新保存（修改时间变化）后重新解析，沿用与上一版本的比较结果
+    stat = latest.stat()
+    os.utime(latest, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert dataset.refresh()
+    kept = dataset.sources[SERIES]
+    assert kept["version"] != entry["version"]
+    for key in ("previous_version", "previous_release", "changes", "summary"):
+        assert kept[key] == entry[key]
+    assert (dataset.partition_dir / kept["changes"]).exists()
+    assert dataset.changes().summary() == entry["summary"]
+
+
+def test_no_diff_across_schema_versions(tmp_path, releases):
+    source_dir, first, second = releases
+    dataset = StoreDataset(source_dir, tmp_path / "partitions", jobs=1)
+    dataset.refresh()
+    # 模拟上一版本的分区按旧的表结构写入
+    dataset.sources[SERIES]["schema"] -= 1
+
+    second.to_excel(source_dir / f"{SERIES}V20250201.xlsx", index=False)
+    assert dataset.refresh()
+    assert dataset.sources[SERIES]["changes"] is None
+    assert dataset.previous_version() is None
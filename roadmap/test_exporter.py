@@ -0,0 +1,47 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_loader import DATA_FILE, load_store_data
+from exporter import EXPORT_FORMATS, export_to_file
+
+# 导出后按源数据逐列比较的数值列
+NUMERIC_COLUMNS = ['经度', '纬度', '城市级别', '渠道高潜排名', '卖力值']
+
+
+@pytest.fixture(scope="module")
+def source():
+    return pd.read_excel(DATA_FILE)
+
+
+@pytest.fixture(scope="module")
+def stores():
+    return load_store_data()
+
+
+def read_export(fileobj, export_format):
+    data = io.BytesIO(fileobj.read())
+    if export_format == "CSV":
+        return pd.read_csv(data, encoding="utf-8-sig", float_precision="round_trip")
+    if export_format == "Parquet":
+        return pd.read_parquet(data)
+    return pd.read_excel(data)
+
+
+@pytest.mark.parametrize("export_format", list(EXPORT_FORMATS))
+def test_export_round_trip(source, stores, export_format):
+    with export_to_file(stores, export_format) as fileobj:
+        exported = read_export(fileobj, export_format)
+
+    assert list(exported.columns) == list(source.columns)
+    assert len(exported) == len(source)
+    assert exported['门店编码'].astype(str).tolist() == source['门店编码'].astype(str).tolist()
+    for col in NUMERIC_COLUMNS:
+        actual, expected = exported[col].to_numpy(dtype=float), source[col].to_numpy(dtype=float)
+        if export_format == "Excel (xlsx)":
+            # openpyxl按16位有效数字写出数值（Excel本身只保留15位）
+            np.testing.assert_allclose(actual, expected, rtol=1e-15, atol=0, err_msg=col)
+        else:
+            np.testing.assert_array_equal(actual, expected, err_msg=col)
@@ -0,0 +1,16 @@
+import json
+
+import instrumentation
+from instrumentation import RerunProfiler, percentiles, read_log
+
+
+def test_profiling_without_resource_module(monkeypatch):
+    # Windows上没有resource模块：不记录进程内存峰值，其他统计照常
+    monkeypatch.setattr(instrumentation, "resource", None)
+    profiler = RerunProfiler(enabled=True, session="test")
+    with profiler.stage("load", rows=3):
+        pass
+    events = profiler.finish()
+    assert events[-1]["peak_rss_mb"] is None
+    table = percentiles(read_log([json.dumps(event) for event in events]))
+    assert set(table.index) == {"load", "(重跑总计)"}
@@ -3,11 +3,14 @@ import pandas as pd
 import folium
 from streamlit.components.v1 import html
 
+from data_loader import load_store_data
+from map_layers import CanvasPointLayer
+
 def test_map():
     st.title("地图测试")
     
     # 读取数据
-    df = pd.read_excel("黑龙江数据V20250609.xlsx")
+    df = load_store_data()
     
     if len(df) > 0:
         # 计算地图中心点
@@ -24,17 +27,8 @@ def test_map():
             tiles="OpenStreetMap"
         )
         
-        # 只添加前100个门店避免过载
-        for idx, row in df.head(100).iterrows():
-            folium.CircleMarker(
-                location=[row['纬度'], row['经度']],
-                radius=5,
-                popup=row['门店名称'],
-                color='red',
-                fill=True,
-                fillColor='red',
-                fillOpacity=0.7
-            ).add_to(m)
+        # 全部门店画在一个画布图层上，不逐个创建标记
+        CanvasPointLayer(df).add_to(m)
         
         # 显示地图
         map_html = m._repr_html_()
@@ -0,0 +1,49 @@
+import warnings
+
+import pandas as pd
+import pytest
+
+from data_loader import load_store_data
+from map_builder import AREA_ZOOMS, CANVAS_AUTO_ROWS, auto_render_mode, create_folium_map
+
+
+@pytest.fixture(scope="module")
+def stores():
+    return load_store_data()
+
+
+def render(df, mode, **kwargs):
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", category=UserWarning, module="folium")
+        return create_folium_map(df, mode, **kwargs).get_root().render()
+
+
+@pytest.mark.parametrize("mode", ["vectorized", "canvas", "tiles"])
+def test_popup_functions_emitted_once(stores, mode):
+    # 每个渠道一个图层，弹窗公共函数只输出一份
+    html = render(stores.head(2000), mode, service_url="http://127.0.0.1:8000/datasets/test")
+    assert html.count("function storePopupHtml(") == 1
+    assert html.count("function bindLazyPopup(") == 1
+
+
+def test_auto_render_mode():
+    assert auto_render_mode("vectorized", CANVAS_AUTO_ROWS) == "vectorized"
+    assert auto_render_mode("vectorized", CANVAS_AUTO_ROWS + 1) == "canvas"
+    assert auto_render_mode("markers", CANVAS_AUTO_ROWS + 1) == "markers"
+
+
+def test_area_levels_embedded_once(stores):
+    # 每个缩放级别一份边界（方块一角的纬度随级别不同），两个区域只有两种门店数
+    def square(i, zoom):
+        ring = [[126 + i, 45], [127 + i, 45], [127 + i, 46], [126 + i, 46.0 + zoom / 1000], [126 + i, 45]]
+        return {"type": "Feature", "id": str(i), "properties": {"name": f"区{i}"},
+                "geometry": {"type": "MultiPolygon", "coordinates": [[ring]]}}
+
+    levels = {zoom: {"type": "FeatureCollection", "features": [square(i, zoom) for i in range(2)]} for zoom in AREA_ZOOMS}
+    table = pd.DataFrame({'id': ['0', '1'], '区域': ['区0', '区1'], '门店数': [3, 5], '平均卖力值': [80.0, None],
+                          'SEQ渗透率': [10.0, 20.0], '标签不符门店数': [0, 1]})
+    html = render(stores.head(100), "vectorized", areas=(levels, table, '门店数'))
+    # 每个级别的边界只嵌入一次（初始级别由Choropleth嵌入，切换脚本中为null）
+    for zoom in AREA_ZOOMS:
+        assert html.count(str(46.0 + zoom / 1000)) == 2
+    assert "layer.addData(levels[level])" in html
@@ -0,0 +1,14 @@
+from map_cache import MapHtmlCache, prewarm
+
+
+def test_prewarm_skips_failed_views():
+    cache = MapHtmlCache()
+
+    def fail():
+        raise ValueError("坏数据")
+
+    errors = []
+    jobs = [("a", lambda: "<a>"), ("b", fail), ("c", lambda: "<c>")]
+    prewarm(cache, jobs, errors).join()
+    assert "a" in cache and "c" in cache and "b" not in cache
+    assert [(key, str(error)) for key, error in errors] == [("b", "坏数据")]
@@ -0,0 +1,66 @@
+import shutil
+
+import pytest
+
+from data_loader import DATA_FILE, _write_cache, cache_path, read_workbook
+from profiler import HeavyHitters, profile_file, profile_files
+
+
+@pytest.fixture(scope="module")
+def workbooks(tmp_path_factory):
+    """
+    两份相同的工作簿副本：一份只有Excel，一份另有列式缓存
+    """
+    tmp_path = tmp_path_factory.mktemp("profile")
+    excel_only = tmp_path / "画像测试Excel.xlsx"
+    cached = tmp_path / "画像测试缓存.xlsx"
+    shutil.copy(DATA_FILE, excel_only)
+    shutil.copy(DATA_FILE, cached)
+    target = cache_path(cached)
+    _write_cache(read_workbook(cached), cached, target)
+    yield excel_only, cached
+    target.unlink(missing_ok=True)
+
+
+def column_summary(profile):
+    return {
+        name: (col.count, col.nulls, col.numeric, col.min, col.max, col.distinct, col.top(10), col.head)
+        for name, col in profile.columns.items()
+    }
+
+
+def test_excel_and_cache_profiles_match(workbooks):
+    excel_only, cached = workbooks
+    assert not cache_path(excel_only).exists()
+    from_excel = profile_file(excel_only)
+    from_cache = profile_file(cached)
+
+    assert from_excel.rows == from_cache.rows
+    assert column_summary(from_excel) == column_summary(from_cache)
+    for name, col in from_excel.columns.items():
+        if col.numeric:
+            assert col.mean == pytest.approx(from_cache.columns[name].mean, rel=1e-12), name
+            assert col.median == from_cache.columns[name].median, name
+    assert from_excel.duplicate_rows() == from_cache.duplicate_rows()
+    assert from_excel.duplicate_keys() == from_cache.duplicate_keys()
+
+
+def test_profiling_both_sources_finds_every_row_duplicated(workbooks):
+    profile = profile_files(list(workbooks))
+    assert profile.duplicate_rows() == profile.rows // 2
+    assert profile.duplicate_keys() == profile.rows // 2
+
+
+def test_heavy_hitters_keep_top_values_when_all_unique():
+    heavy = HeavyHitters(capacity=100)
+    heavy.update([f"门店{i}" for i in range(150)])
+    heavy.update(["门店3"] * 2 + [f"新门店{i}" for i in range(150)])
+    assert not heavy.exact
+    assert len(heavy.counts) == 100
+    assert heavy.top(2) == [("门店3", 3), ("门店0", 1)]
+
+
+def test_distinct_estimate_bounded_by_count(workbooks):
+    column = profile_file(workbooks[0]).columns['门店编码']
+    assert not column.distinct_exact
+    assert column.distinct <= column.count
@@ -0,0 +1,51 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+from synthetic import generate_stores
+from tile_server import STORE_ROUTE, StoreTileIndex, register_dataset, start_tile_server, tile_base_url
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = start_tile_server(port=0)
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture(scope="module")
+def index():
+    return StoreTileIndex(generate_stores(500, seed=1))
+
+
+def fetch_status(url):
+    try:
+        with urllib.request.urlopen(url) as resp:
+            return resp.status
+    except urllib.error.HTTPError as error:
+        return error.code
+
+
+def store_url(server, path, index):
+    code = index.df['门店编码'].iloc[0]
+    return tile_base_url(server) + path + STORE_ROUTE.replace("{code}", str(code))
+
+
+def test_recently_used_dataset_is_not_evicted(server, index):
+    paths = {key: register_dataset(server, key, index, max_datasets=2) for key in ("v1", "v2")}
+    # 访问v1后再注册v3，淘汰的是最久未使用的v2
+    assert fetch_status(store_url(server, paths["v1"], index)) == 200
+    register_dataset(server, "v3", index, max_datasets=2)
+    assert fetch_status(store_url(server, paths["v1"], index)) == 200
+    assert fetch_status(store_url(server, paths["v2"], index)) == 404
+
+    # 再次注册已淘汰的数据集后恢复访问
+    register_dataset(server, "v2", index, max_datasets=2)
+    assert fetch_status(store_url(server, paths["v2"], index)) == 200
+
+
+def test_invalid_tile_returns_400(server, index):
+    path = register_dataset(server, "tiles", index)
+    assert fetch_status(tile_base_url(server) + path + "/tiles/3/8/0.geojson") == 400
+    assert fetch_status(tile_base_url(server) + path + "/tiles/3/7/0.geojson") == 200
@@ -0,0 +1,297 @@
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlencode, urlparse
+
+import numpy as np
+
+from cluster_index import ClusterIndex
+from filter_index import ALL, FilterIndex
+from map_layers import CHANNEL_COLORS, marker_radius, store_columns
+from spatial_index import SpatialIndex
+
+DATASET_PATH = re.compile(r"^/datasets/([^/]+)(/.*)$")
+TILE_PATH = re.compile(r"^/(tiles|clusters)/(\d+)/(\d+)/(\d+)\.geojson$")
+STORE_PATH = re.compile(r"^/stores/([^/]+)\.json$")
+
+# 同一服务中最多保留的数据集索引个数
+MAX_DATASETS = 4
+
+# 服务地址之后的URL模板
+TILE_ROUTE = "/tiles/{z}/{x}/{y}.geojson"
+CLUSTER_ROUTE = "/clusters/{z}/{x}/{y}.geojson"
+STORE_ROUTE = "/stores/{code}.json"
+
+# 瓦片请求允许的最大缩放级别（超过聚合索引的级别时按上级瓦片查询）
+MAX_TILE_ZOOM = 30
+
+# 只能从本机访问的地址
+LOOPBACK_HOSTS = {"127.0.0.1", "localhost", "::1"}
+
+
+def filter_query(city=ALL, channel=ALL, level=ALL, value_range=None, search=None):
+    """
+    将侧边栏筛选条件编码为瓦片URL的查询参数；
+    search为周边查询条件 {"lat", "lon", "radius"} 或 {"lat", "lon", "k"}
+    """
+    params = []
+    if city != ALL:
+        params.append(("city", city))
+    if channel != ALL:
+        params.append(("channel", channel))
+    if level != ALL:
+        params.append(("level", level))
+    if value_range is not None:
+        params.append(("min", value_range[0]))
+        params.append(("max", value_range[1]))
+    if search is not None:
+        params.extend((key, search[key]) for key in ("lat", "lon", "radius", "k") if key in search)
+    return urlencode(params)
+
+
+class StoreTileIndex:
+    """
+    瓦片查询索引：基于层级聚合索引的Morton排序定位瓦片内的门店，
+    再按筛选条件过滤；低缩放级别可返回聚合点
+    """
+
+    def __init__(self, df):
+        self.index = ClusterIndex(df)
+        self.df = self.index.df
+        self.radius = np.round(marker_radius(self.df), 2)
+        self.filters = FilterIndex(self.df)
+        self.spatial = SpatialIndex(self.df)
+        self.code_rows = dict(zip(self.df['门店编码'].astype(str).tolist(), range(len(self.df))))
+        self._filter_mask = lru_cache(maxsize=64)(self._build_filter_mask)
+        # 各筛选条件下的聚合单元表，每组条件只算一次
+        self._cluster_levels = lru_cache(maxsize=16)(self._build_cluster_levels)
+
+    def _build_filter_mask(self, filters):
+        params = dict(filters)
+        value_range = None
+        if 'min' in params or 'max' in params:
+            value_range = (float(params.get('min', '-inf')), float(params.get('max', 'inf')))
+        mask = self.filters.mask(
+            params.get('city', ALL), params.get('channel', ALL), params.get('level', ALL), value_range)
+        if 'lat' in params and 'lon' in params:
+            radius = float(params['radius']) if 'radius' in params else None
+            rows, _ = self.spatial.search(
+                float(params['lat']), float(params['lon']), radius, int(params.get('k', 0)), mask)
+            mask = np.zeros(len(self.df), dtype=bool)
+            mask[rows] = True
+        return mask
+
+    def _build_cluster_levels(self, filters):
+        if not filters:
+            return self.index.all_levels
+        return self.index.levels(self._filter_mask(filters))
+
+    def _mask(self, filters):
+        return self._filter_mask(tuple(sorted(filters)))
+
+    def _store_features(self, rows):
+        sub = self.df.iloc[rows]
+        columns = zip(
+            self.index.lon[rows].round(6).tolist(),
+            self.index.lat[rows].round(6).tolist(),
+            self.radius[rows].tolist(),
+            self.index.seq[rows].tolist(),
+            sub['门店编码'].astype(str).tolist(),
+            sub['门店名称'].astype(str).tolist(),
+            sub['一级渠道'].astype(str).tolist(),
+        )
+        return [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [lon, lat]},
+                "properties": {
+                    "code": code,
+                    "name": name,
+                    "channel": channel,
+                    "r": r,
+                    "seq": int(seq),
+                    "color": CHANNEL_COLORS.get(channel, 'gray'),
+                },
+            }
+            for lon, lat, r, seq, code, name, channel in columns
+        ]
+
+    def query(self, z, x, y, filters=()):
+        """
+        返回瓦片范围内符合筛选条件的门店（GeoJSON FeatureCollection）
+        """
+        rows = self.index.tile_rows(z, x, y, self._mask(filters))
+        return {"type": "FeatureCollection", "features": self._store_features(rows)}
+
+    def query_clusters(self, z, x, y, filters=()):
+        """
+        返回瓦片范围内的聚合点和单个门店（GeoJSON FeatureCollection）
+        """
+        key = tuple(sorted(filters))
+        clusters, single_rows = self.index.clusters(z, x, y, self._filter_mask(key), self._cluster_levels(key))
+        features = [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [lon, lat]},
+                "properties": {
+                    "cluster": 1,
+                    "count": count,
+                    "score_sum": score_sum,
+                    "seq_count": seq_count,
+                },
+            }
+            for lat, lon, count, score_sum, seq_count in zip(
+                clusters["lat"], clusters["lon"], clusters["count"],
+                clusters["score_sum"], clusters["seq_count"])
+        ]
+        features.extend(self._store_features(single_rows))
+        return {"type": "FeatureCollection", "features": features}
+
+    def store_detail(self, code):
+        """
+        按门店编码返回弹窗所需的门店详情，编码不存在时返回None
+        """
+        row = self.code_rows.get(code)
+        if row is None:
+            return None
+        sub = self.df.iloc[[row]]
+        detail = {key: values[0] for key, values in store_columns(sub).items()}
+        detail["channel"] = str(sub['一级渠道'].iloc[0])
+        return detail
+
+
+class _TileHandler(BaseHTTPRequestHandler):
+    index = None
+    datasets = None
+    datasets_lock = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        path, index = url.path, self.index
+
+        # /datasets/{key}/... 访问已注册的数据集，否则访问启动时的默认数据
+        dataset_match = DATASET_PATH.match(path)
+        if dataset_match is not None:
+            index = _lookup_dataset(self.server, unquote(dataset_match.group(1)))
+            path = dataset_match.group(2)
+        if index is None:
+            self.send_error(404)
+            return
+
+        store_match = STORE_PATH.match(path)
+        if store_match is not None:
+            detail = index.store_detail(unquote(store_match.group(1)))
+            if detail is None:
+                self.send_error(404)
+                return
+            self._send_json(detail, "application/json")
+            return
+
+        match = TILE_PATH.match(path)
+        if match is None:
+            self.send_error(404)
+            return
+
+        kind = match.group(1)
+        z, x, y = (int(v) for v in match.groups()[1:])
+        if not valid_tile(z, x, y):
+            self.send_error(400)
+            return
+        filters = [(k, v[0]) for k, v in parse_qs(url.query).items()]
+        query = index.query_clusters if kind == "clusters" else index.query
+        try:
+            payload = query(z, x, y, filters)
+        except ValueError:
+            self.send_error(400)
+            return
+        self._send_json(payload, "application/geo+json")
+
+    def _send_json(self, payload, content_type):
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Cache-Control", "max-age=300")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def valid_tile(z, x, y):
+    """
+    瓦片坐标是否有效：缩放级别不超过MAX_TILE_ZOOM，x/y在该级别的瓦片范围内
+    """
+    return 0 <= z <= MAX_TILE_ZOOM and 0 <= x < (1 << z) and 0 <= y < (1 << z)
+
+
+def start_tile_server(df=None, host=None, port=None):
+    """
+    在后台线程启动瓦片服务，返回server；浏览器访问的地址由 tile_base_url 给出；
+    df为None时只提供通过register_dataset注册的数据集；
+    监听地址和端口可通过环境变量 STORE_TILE_HOST（默认只监听本机）/ STORE_TILE_PORT 指定
+    """
+    if host is None:
+        host = os.environ.get("STORE_TILE_HOST", "127.0.0.1")
+    if port is None:
+        port = int(os.environ.get("STORE_TILE_PORT", 0))
+
+    handler = type("StoreTileHandler", (_TileHandler,), {
+        "index": StoreTileIndex(df) if df is not None else None,
+        "datasets": OrderedDict(),
+        "datasets_lock": threading.Lock(),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def tile_base_url(server, page_host=None):
+    """
+    返回浏览器访问瓦片服务的地址，浏览器无法访问时返回None。
+    设置了环境变量 STORE_TILE_URL（如经反向代理转发）时直接使用；否则使用页面的主机名加服务端口，
+    但服务只监听本机地址时，只有页面也在本机打开（page_host为localhost等）才能访问。
+    page_host为页面请求的Host头，未知时视为本机
+    """
+    configured = os.environ.get("STORE_TILE_URL")
+    if configured:
+        return configured.rstrip("/")
+    hostname = urlparse(f"//{page_host}").hostname if page_host else "localhost"
+    bind_host, port = server.server_address[:2]
+    if bind_host in LOOPBACK_HOSTS and hostname not in LOOPBACK_HOSTS:
+        return None
+    if ":" in hostname:
+        hostname = f"[{hostname}]"
+    return f"http://{hostname}:{port}"
+
+
+def register_dataset(server, key, index, max_datasets=MAX_DATASETS):
+    """
+    在运行中的服务上注册一份数据的瓦片索引（StoreTileIndex），返回该数据集的路径，
+    拼在 tile_base_url 之后即为该数据集的服务地址，再加上 TILE_ROUTE / CLUSTER_ROUTE / STORE_ROUTE
+    即为各接口的URL模板。已注册的数据集再次注册只更新其使用顺序；
+    超过max_datasets时淘汰最久未使用（注册或被访问）的数据集
+    """
+    handler = server.RequestHandlerClass
+    with handler.datasets_lock:
+        handler.datasets[key] = index
+        handler.datasets.move_to_end(key)
+        while len(handler.datasets) > max_datasets:
+            handler.datasets.popitem(last=False)
+    return f"/datasets/{quote(key, safe='')}"
+
+
+def _lookup_dataset(server, key):
+    handler = server.RequestHandlerClass
+    with handler.datasets_lock:
+        index = handler.datasets.get(key)
+        if index is not None:
+            handler.datasets.move_to_end(key)
+    return index